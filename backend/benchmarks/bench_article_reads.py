@@ -0,0 +1,85 @@
+"""Measure article read throughput as reader threads are added.
+
+Loads one ZIM into the registry and calls ``zim_loader.get_article`` from
+1..N threads for a fixed time. ``--locked`` wraps every read in a global
+lock, as the registry did before reads became lock-free, for comparison.
+
+Run from the backend directory:
+
+    SECRET_KEY=x python benchmarks/bench_article_reads.py path/to/file.zim
+"""
+import argparse
+import os
+import sys
+import time
+from threading import Event, Lock, Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes import zim_loader  # noqa: E402
+
+
+def sample_paths(reader, count: int) -> list[str]:
+    """Pick up to *count* HTML article paths spread across the archive."""
+    archive = reader.archive
+    step = max(archive.entry_count // (count * 4), 1)
+    paths = []
+    for idx in range(0, archive.entry_count, step):
+        entry = archive._get_entry_by_id(idx)
+        if not entry.is_redirect and entry.get_item().mimetype.startswith("text/html"):
+            paths.append(entry.path)
+        if len(paths) >= count:
+            break
+    return paths
+
+
+def run(zim_id: str, paths: list[str], threads: int, seconds: float, lock) -> float:
+    stop = Event()
+    counts = [0] * threads
+
+    def worker(n: int):
+        i = n
+        while not stop.is_set():
+            path = paths[i % len(paths)]
+            if lock:
+                with lock:
+                    zim_loader.get_article(zim_id, path)
+            else:
+                zim_loader.get_article(zim_id, path)
+            counts[n] += 1
+            i += threads
+
+    workers = [Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    time.sleep(seconds)
+    stop.set()
+    for w in workers:
+        w.join()
+    return sum(counts) / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("zim")
+    parser.add_argument("--threads", default="1,2,4,8,16")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--paths", type=int, default=2000)
+    parser.add_argument("--locked", action="store_true")
+    args = parser.parse_args()
+
+    reader = zim_loader.ZIMReader(args.zim)
+    zim_id = os.path.basename(args.zim)
+    with zim_loader.ZIM_LOCK:
+        zim_loader._publish({zim_id: {"reader": reader, "meta": {"file": zim_id}}})
+    paths = sample_paths(reader, args.paths)
+    lock = Lock() if args.locked else None
+
+    print(f"{zim_id}: {len(paths)} articles, {'global lock' if lock else 'lock-free'}")
+    for threads in (int(t) for t in args.threads.split(",")):
+        rate = run(zim_id, paths, threads, args.seconds, lock)
+        print(f"{threads:>3} threads: {rate:10.0f} articles/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Compare the tokenizer sanitizer with the old per-request script regex.
+
+Samples HTML articles from a ZIM (ideally a Wikipedia archive with full
+pages) and times both on the same content. Alongside throughput, the
+number of inline event handlers and ``javascript:`` URLs left in the
+output is reported, since the regex only removes ``<script>`` blocks.
+
+Run from the backend directory:
+
+    SECRET_KEY=x python benchmarks/bench_sanitizer.py path/to/wikipedia.zim
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routes.sanitizer import sanitize_html  # noqa: E402
+from routes.zim_loader import ZIMReader  # noqa: E402
+
+SCRIPT_RE = re.compile(r"<script.*?>.*?</script>", re.DOTALL | re.IGNORECASE)
+HANDLER_RE = re.compile(r"""<[^>]*\son[a-z]+\s*=""", re.IGNORECASE)
+JS_URL_RE = re.compile(r"""(?:href|src)\s*=\s*["']?\s*javascript:""", re.IGNORECASE)
+
+
+def regex_sanitize(content: str, zim_id: str, path: str) -> str:
+    return SCRIPT_RE.sub("", content)
+
+
+def sample_pages(reader: ZIMReader, count: int) -> list[tuple[str, str]]:
+    """Return up to *count* ``(path, html)`` pairs spread across the archive."""
+    archive = reader.archive
+    step = max(archive.entry_count // (count * 4), 1)
+    pages = []
+    for idx in range(0, archive.entry_count, step):
+        entry = archive._get_entry_by_id(idx)
+        if entry.is_redirect:
+            continue
+        item = entry.get_item()
+        if item.mimetype.startswith("text/html"):
+            pages.append((entry.path, bytes(item.content).decode("utf-8", "ignore")))
+        if len(pages) >= count:
+            break
+    return pages
+
+
+def measure(fn, zim_id: str, pages, rounds: int):
+    timings = []
+    leftovers = [0, 0]
+    for _ in range(rounds):
+        for path, content in pages:
+            start = time.perf_counter()
+            out = fn(content, zim_id, path)
+            timings.append(time.perf_counter() - start)
+    for path, content in pages:
+        out = fn(content, zim_id, path)
+        leftovers[0] += len(HANDLER_RE.findall(out))
+        leftovers[1] += len(JS_URL_RE.findall(out))
+    return timings, leftovers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("zim", help="ZIM file to sample articles from")
+    parser.add_argument("--pages", type=int, default=200, help="articles to sample")
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the sample")
+    args = parser.parse_args()
+
+    reader = ZIMReader(args.zim)
+    zim_id = os.path.basename(args.zim)
+    pages = sample_pages(reader, args.pages)
+    if not pages:
+        sys.exit("No HTML articles found")
+    total_mb = sum(len(c.encode("utf-8")) for _, c in pages) / 1e6
+    largest = max(len(c) for _, c in pages) / 1e6
+    print(f"{len(pages)} pages, {total_mb:.1f} MB total, largest {largest:.2f} MB")
+
+    for name, fn in (("regex", regex_sanitize), ("tokenizer", sanitize_html)):
+        timings, (handlers, js_urls) = measure(fn, zim_id, pages, args.rounds)
+        timings.sort()
+        elapsed = sum(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1] * 1000
+        print(
+            f"{name:>9}: {total_mb * args.rounds / elapsed:7.1f} MB/s  "
+            f"mean {elapsed / len(timings) * 1000:6.2f} ms  p95 {p95:6.2f} ms  "
+            f"left: {handlers} handlers, {js_urls} javascript: URLs"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Compare per-request connections with the pooled read connections.
+
+Builds the title shard of a synthetic archive and runs the search query
+from many concurrent threads, first opening a fresh connection per query
+(the old behaviour) and then through ``READ_POOL``. Prints p50/p99
+latencies. The archive is cached under ``benchmarks/data`` like the suite's.
+
+Run from the backend directory:
+
+    SECRET_KEY=x python benchmarks/bench_search_pool.py --concurrency 200
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from routes import zim_loader  # noqa: E402
+from routes.fts_pool import ReadPool  # noqa: E402
+from routes.search import SHARD_QUERY, shard_query_args  # noqa: E402
+from run_suite import fixture  # noqa: E402
+from synthetic_zim import Corpus  # noqa: E402
+
+# Titles are made of these words, so queries are as selective as real ones
+WORDS = Corpus().words
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run(label: str, query_once, concurrency: int, total: int):
+    params = [random.choice(WORDS) for _ in range(total)]
+
+    def timed(q):
+        start = time.perf_counter()
+        query_once(q)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(timed, params))
+        wall = time.perf_counter() - start
+    print(
+        f"{label:>8}: p50={percentile(latencies, 50) * 1000:7.2f} ms "
+        f"p99={percentile(latencies, 99) * 1000:7.2f} ms "
+        f"throughput={total / wall:8.0f} q/s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--body-words", type=int, default=20, help="median words per article")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=20_000)
+    args = parser.parse_args()
+
+    reader = zim_loader.ZIMReader(fixture(args.entries, 0, args.body_words))
+    workdir = tempfile.mkdtemp(prefix="mnemo-bench-")
+    zim_loader.SHARD_DIR = workdir
+    options = {"batch_size": 5000, "content": False, "content_max_bytes": 0}
+    titles = zim_loader.rebuild_search_index("bench.zim", reader, options)
+    path = zim_loader.shard_path("bench.zim")
+    # The old code switched the database to WAL, so give it its own copy
+    legacy_path = os.path.join(workdir, "legacy.db")
+    shutil.copy(path, legacy_path)
+
+    def fresh_connection(q):
+        conn = sqlite3.connect(legacy_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        conn.execute(SHARD_QUERY, shard_query_args(q)).fetchall()
+        conn.close()
+
+    pool = ReadPool(max_idle=args.concurrency)
+
+    def pooled(q):
+        with pool.connection(path) as conn:
+            conn.execute(SHARD_QUERY, shard_query_args(q)).fetchall()
+
+    print(f"{titles} titles, {args.concurrency} threads, {args.queries} queries")
+    run("before", fresh_connection, args.concurrency, args.queries)
+    run("after", pooled, args.concurrency, args.queries)
+    shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
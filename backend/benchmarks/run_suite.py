@@ -0,0 +1,404 @@
+"""Run the benchmark suite on a synthetic archive and save JSON results.
+
+The archive comes from ``synthetic_zim.py`` and is cached under
+``benchmarks/data`` by entry count and seed, so repeated runs and runs on
+other commits measure the same input. Each run measures:
+
+* indexing: rows per second and peak RSS of a shard build
+* startup: time until the server answers and until search works, cold
+  (no caches or shards) and warm (after the cold run)
+* search: ``/search`` latency and throughput at each concurrency level
+* stream: ``/search/stream`` time to first hit and to the end event
+* articles: ``/article`` latency for uncached and cached pages
+* server peak RSS after the load phases
+
+The server runs under uvicorn in a scratch directory. Results are written
+to ``benchmarks/results/<timestamp>-<commit>.json``; compare two runs with
+``--compare``.
+
+Run from the backend directory:
+
+    SECRET_KEY=x python benchmarks/run_suite.py --entries 100000
+    python benchmarks/run_suite.py --compare results/old.json results/new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from synthetic_zim import Corpus, generate  # noqa: E402
+
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+ZIM_NAME = "bench.zim"
+# Seconds to wait for the server to answer, or for indexing to finish
+STARTUP_TIMEOUT = 120
+INDEX_TIMEOUT = 3600
+
+
+def percentiles(samples: list[float]) -> dict:
+    """Summarize latencies in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+def fixture(entries: int, seed: int, body_words: int) -> str:
+    """Return the path of the cached synthetic archive, generating it if needed."""
+    path = os.path.join(DATA_DIR, f"synthetic-{entries}-{seed}-{body_words}.zim")
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        print(f"Generating {path}...", flush=True)
+        seconds = generate(path, entries, seed, body_words)
+        print(f"Generated in {seconds:.0f}s", flush=True)
+    return path
+
+
+def prepare_workdir(zim_path: str, content: bool) -> str:
+    """Create a scratch server directory whose ZIM folder holds the archive."""
+    workdir = tempfile.mkdtemp(prefix="mnemo-bench-")
+    zim_dir = os.path.join(workdir, "zim")
+    os.makedirs(zim_dir)
+    os.makedirs(os.path.join(workdir, "data"))
+    os.symlink(zim_path, os.path.join(zim_dir, ZIM_NAME))
+    with open(os.path.join(workdir, "data", "config.json"), "w") as f:
+        # The SQLite backend is what indexing benchmarks need to exercise
+        json.dump(
+            {"zim_dir": zim_dir, "search_backend": "sqlite", "index_content": content}, f
+        )
+    return workdir
+
+
+def child_index(workdir: str):
+    """Build the shard in this process and print rows/s and peak RSS."""
+    os.chdir(workdir)
+    from routes import zim_loader
+    from routes.config import load_config
+
+    options = zim_loader.index_options(load_config())
+    options["scan_workers"] = os.cpu_count() or 1
+    reader = zim_loader.ZIMReader(os.path.join(workdir, "zim", ZIM_NAME))
+    start = time.perf_counter()
+    rows = zim_loader.rebuild_search_index(ZIM_NAME, reader, options)
+    seconds = time.perf_counter() - start
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    print(json.dumps({
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "rows_per_s": round(rows / seconds, 1),
+        "peak_rss_mb": round(peak / 1024, 1),
+        "shard_mb": round(os.path.getsize(zim_loader.shard_path(ZIM_NAME)) / 1e6, 1),
+    }))
+
+
+def measure_indexing(workdir: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, __file__, "--child-index", workdir],
+        capture_output=True, text=True, check=True,
+    )
+    shutil.rmtree(os.path.join(workdir, "cache"), ignore_errors=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """A uvicorn process serving the backend from a scratch directory."""
+
+    def __init__(self, workdir: str):
+        self.workdir = workdir
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.log = open(os.path.join(workdir, "server.log"), "ab")
+        self.started = time.perf_counter()
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+                "--port", str(self.port), "--log-level", "warning",
+            ],
+            cwd=workdir, stdout=self.log, stderr=subprocess.STDOUT,
+            env={**os.environ, "SECRET_KEY": os.environ.get("SECRET_KEY", "bench")},
+        )
+
+    def wait(self, path: str, ready, timeout: float) -> float:
+        """Poll *path* until ``ready(response)`` holds; return seconds since start."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited, see {self.log.name}")
+            try:
+                response = httpx.get(self.url + path, timeout=5)
+                if ready(response):
+                    return round(time.perf_counter() - self.started, 3)
+            except httpx.TransportError:
+                pass
+            time.sleep(0.05)
+        raise TimeoutError(f"{path} not ready after {timeout}s")
+
+    def peak_rss_mb(self) -> float | None:
+        """Return the high-water RSS of the server process (Linux only)."""
+        try:
+            with open(f"/proc/{self.process.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+        return None
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+
+
+def measure_startup(server: Server, query: str) -> dict:
+    answered = server.wait("/zim/list", lambda r: r.status_code == 200, STARTUP_TIMEOUT)
+    searchable = server.wait(
+        f"/search?q={query}",
+        lambda r: r.status_code == 200 and r.json()["results"],
+        INDEX_TIMEOUT,
+    )
+    return {"ready_s": answered, "search_ready_s": searchable}
+
+
+async def _load(url: str, paths: list[str], concurrency: int) -> dict:
+    """Request every path with *concurrency* clients; return latency stats."""
+    latencies = []
+    errors = 0
+    queue = list(reversed(paths))
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+
+        async def worker():
+            nonlocal errors
+            while queue:
+                path = queue.pop()
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                errors += response.status_code >= 400
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        **percentiles(latencies),
+    }
+
+
+async def _stream(url: str, queries: list[str], concurrency: int) -> dict:
+    """Time first hit and end event of ``/search/stream`` requests."""
+    first_hits, ends = [], []
+    queue = list(reversed(queries))
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+
+        async def worker():
+            while queue:
+                query = queue.pop()
+                start = time.perf_counter()
+                first = None
+                async with client.stream("GET", "/search/stream", params={"q": query}) as r:
+                    async for line in r.aiter_lines():
+                        if first is None and line.startswith("data:"):
+                            first = time.perf_counter() - start
+                        if line.startswith("event: end"):
+                            break
+                ends.append(time.perf_counter() - start)
+                if first is not None:
+                    first_hits.append(first)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {
+        "requests": len(ends),
+        "first_hit": percentiles(first_hits),
+        "end": percentiles(ends),
+    }
+
+
+def run_suite(args) -> dict:
+    corpus = Corpus(args.seed, args.body_words)
+    zim_path = fixture(args.entries, args.seed, args.body_words)
+    rng = random.Random(args.seed)
+    # Queries are words of real titles, so every query has hits
+    queries = [
+        rng.choice(corpus.title(rng.randrange(args.entries)).split())
+        for _ in range(args.requests)
+    ]
+    articles = [
+        f"/article/{ZIM_NAME}/{corpus.path(corpus.title(rng.randrange(args.entries)))}"
+        for _ in range(args.requests)
+    ]
+    hot_articles = articles[:50] * (args.requests // 50 + 1)
+
+    workdir = prepare_workdir(zim_path, args.content)
+    results = {}
+    try:
+        print("Indexing...", flush=True)
+        results["indexing"] = measure_indexing(workdir)
+
+        print("Cold startup...", flush=True)
+        server = Server(workdir)
+        try:
+            results["startup_cold"] = measure_startup(server, queries[0])
+        finally:
+            server.stop()
+
+        print("Warm startup and load...", flush=True)
+        server = Server(workdir)
+        try:
+            results["startup_warm"] = measure_startup(server, queries[0])
+            results["search"], results["stream"], results["articles"] = {}, {}, {}
+            for level in args.concurrency:
+                key = f"c{level}"
+                paths = [f"/search?q={q}" for q in queries]
+                results["search"][key] = asyncio.run(_load(server.url, paths, level))
+                results["stream"][key] = asyncio.run(_stream(server.url, queries, level))
+            level = max(args.concurrency)
+            results["articles"]["uncached"] = asyncio.run(_load(server.url, articles, level))
+            results["articles"]["cached"] = asyncio.run(
+                _load(server.url, hot_articles[: args.requests], level)
+            )
+            results["server_peak_rss_mb"] = server.peak_rss_mb()
+        finally:
+            server.stop()
+    finally:
+        if args.keep:
+            print(f"Kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _flatten(data: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(old_path: str, new_path: str):
+    """Print every metric of two result files with its relative change."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    if old["params"] != new["params"]:
+        print("Warning: the runs used different parameters")
+    before, after = _flatten(old["results"]), _flatten(new["results"])
+    print(f"{'metric':<40} {old['commit']:>12} {new['commit']:>12}   change")
+    for name in sorted(before.keys() | after.keys()):
+        a, b = before.get(name), after.get(name)
+        change = f"{(b - a) / a * 100:+7.1f}%" if a and b is not None else ""
+        print(f"{name:<40} {a if a is not None else '-':>12} {b if b is not None else '-':>12}   {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=10000, help="articles in the archive")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--body-words", type=int, default=400, help="median words per article")
+    parser.add_argument("--content", action="store_true", help="index article text too")
+    parser.add_argument(
+        "--concurrency", type=lambda s: [int(n) for n in s.split(",")], default=[1, 8, 32],
+        help="comma-separated client counts for the load phases",
+    )
+    parser.add_argument("--requests", type=int, default=500, help="requests per load phase")
+    parser.add_argument("--output", help="result file (default: results/<time>-<commit>.json)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch server directory")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    parser.add_argument("--child-index", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_index:
+        child_index(args.child_index)
+        return
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "params": {
+            "entries": args.entries,
+            "seed": args.seed,
+            "body_words": args.body_words,
+            "content": args.content,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+        },
+        "results": run_suite(args),
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["results"], indent=2))
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main()
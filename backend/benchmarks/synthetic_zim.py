@@ -0,0 +1,204 @@
+"""Generate a reproducible synthetic ZIM archive for benchmarks.
+
+Articles look like encyclopedia pages: two to four word titles, an
+infobox, sections of paragraphs whose words follow a Zipf distribution,
+links to other articles, images, a stylesheet and a script. About one
+article in ten also gets a redirect. The same entry count, seed and
+options always produce the same entries.
+
+Run from the backend directory:
+
+    python benchmarks/synthetic_zim.py data/bench.zim --entries 100000
+"""
+import argparse
+import itertools
+import os
+import random
+import time
+
+from libzim.writer import Creator, Hint, Item, StringProvider
+
+SYLLABLES = "ka lo mi nu ra se ti vo za be do fu gi ha je ku an el or us".split()
+VOCABULARY_SIZE = 4000
+# Title cores are two vocabulary words picked by a bijection of the id,
+# which bounds the number of distinct titles.
+MAX_ENTRIES = VOCABULARY_SIZE * VOCABULARY_SIZE
+_SCRAMBLE = 2654435761
+_MIX = 0x9E3779B97F4A7C15
+IMAGE_COUNT = 64
+REDIRECT_EVERY = 10
+# Words per inline link in article text
+LINK_EVERY = 40
+# Zipf-distributed words drawn once and indexed by a hash of the entry id
+_TITLE_POOL = 1 << 16
+
+
+def vocabulary(seed: int) -> list[str]:
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    words = sorted(words)
+    # Shuffled so the most frequent words are not all alphabetically first
+    rng.shuffle(words)
+    return words
+
+
+class Corpus:
+    """Deterministic titles and pages for entry ids of one archive."""
+
+    def __init__(self, seed: int = 0, body_words: int = 400):
+        self.seed = seed
+        self.body_words = body_words
+        self.words = vocabulary(seed)
+        # Zipf weights: the n-th most common word appears ~1/n as often
+        self.cum_weights = list(
+            itertools.accumulate(1 / n for n in range(1, len(self.words) + 1))
+        )
+        self.title_pool = random.Random(seed).choices(
+            self.words, cum_weights=self.cum_weights, k=_TITLE_POOL
+        )
+
+    def title(self, entry: int) -> str:
+        core = (entry * _SCRAMBLE) % MAX_ENTRIES
+        words = [self.words[core % VOCABULARY_SIZE], self.words[core // VOCABULARY_SIZE]]
+        mixed = ((entry + self.seed * MAX_ENTRIES) * _MIX) & 0xFFFFFFFFFFFFFFFF
+        for i in range((mixed >> 60) % 3):
+            words.append(self.title_pool[(mixed >> (16 * i)) & (_TITLE_POOL - 1)])
+        return " ".join(words).title()
+
+    @staticmethod
+    def path(title: str) -> str:
+        return title.replace(" ", "_")
+
+    def link(self, rng: random.Random, entries: int) -> str:
+        title = self.title(rng.randrange(entries))
+        return f'<a href="{self.path(title)}">{title}</a>'
+
+    def paragraph(self, rng: random.Random, count: int, entries: int) -> str:
+        words = rng.choices(self.words, cum_weights=self.cum_weights, k=count)
+        for _ in range(count // LINK_EVERY + (rng.random() < 0.5)):
+            words[rng.randrange(count)] = self.link(rng, entries)
+        # Sentences of 6 to 24 words
+        pos = 0
+        while pos < count:
+            words[pos] = words[pos].capitalize()
+            pos += rng.randint(6, 24)
+            words[min(pos, count) - 1] += "."
+        return "<p>" + " ".join(words) + "</p>"
+
+    def page(self, entry: int, entries: int) -> str:
+        rng = random.Random(-(self.seed * MAX_ENTRIES + entry) - 1)
+        title = self.title(entry)
+        # Page lengths vary widely, like real encyclopedia articles
+        budget = max(20, int(rng.lognormvariate(0, 0.8) * self.body_words))
+        parts = [
+            '<!DOCTYPE html><html><head><meta charset="utf-8">',
+            f"<title>{title}</title>",
+            '<link rel="stylesheet" href="-/style.css"><script src="-/app.js"></script>',
+            f'</head><body><h1>{title}</h1><table class="infobox">',
+        ]
+        for _ in range(rng.randint(2, 6)):
+            key, value = rng.choices(self.words, cum_weights=self.cum_weights, k=2)
+            parts.append(f"<tr><th>{key.title()}</th><td>{value}</td></tr>")
+        parts.append("</table>")
+        if rng.random() < 0.5:
+            parts.append(f'<img src="I/image_{rng.randrange(IMAGE_COUNT)}.png" alt="{title}">')
+        section = 0
+        while budget > 0:
+            if section:
+                heading = " ".join(rng.choices(self.words, cum_weights=self.cum_weights, k=2))
+                parts.append(f"<h2>{heading.title()}</h2>")
+            section += 1
+            for _ in range(rng.randint(1, 4)):
+                count = rng.randint(30, 120)
+                parts.append(self.paragraph(rng, count, entries))
+                budget -= count
+        parts.append('<script>init()</script></body></html>')
+        return "".join(parts)
+
+
+class _Entry(Item):
+    def __init__(self, path: str, title: str, content, mimetype: str, front: bool):
+        super().__init__()
+        self.path = path
+        self.title = title
+        self.content = content
+        self.mimetype = mimetype
+        self.front = front
+
+    def get_path(self):
+        return self.path
+
+    def get_title(self):
+        return self.title
+
+    def get_mimetype(self):
+        return self.mimetype
+
+    def get_contentprovider(self):
+        return StringProvider(self.content)
+
+    def get_hints(self):
+        return {Hint.FRONT_ARTICLE: self.front}
+
+
+def generate(
+    path: str, entries: int, seed: int = 0, body_words: int = 400,
+    fulltext: bool = False, language: str = "eng",
+) -> float:
+    """Write a synthetic archive of *entries* articles to *path*.
+
+    Returns the seconds taken. With *fulltext* libzim also builds its
+    Xapian indexes, which takes much longer.
+    """
+    if not 0 < entries <= MAX_ENTRIES:
+        raise ValueError(f"entries must be between 1 and {MAX_ENTRIES}")
+    corpus = Corpus(seed, body_words)
+    rng = random.Random(seed)
+    start = time.monotonic()
+    tmp_path = path + ".tmp"
+    creator = Creator(tmp_path).config_indexing(fulltext, language)
+    creator.config_nbworkers(os.cpu_count() or 1)
+    with creator:
+        creator.set_mainpath(corpus.path(corpus.title(0)))
+        for name, value in {
+            "Title": f"Synthetic {entries}", "Name": f"synthetic_{entries}_{seed}",
+            "Language": language, "Creator": "Mnemo benchmarks", "Publisher": "Mnemo",
+            "Date": "2024-01-01", "Description": "Synthetic benchmark archive",
+        }.items():
+            creator.add_metadata(name, value)
+        creator.add_item(_Entry("-/style.css", "", "body{font-family:serif}" * 200, "text/css", False))
+        creator.add_item(_Entry("-/app.js", "", "function init(){}" * 100, "application/javascript", False))
+        for i in range(IMAGE_COUNT):
+            data = b"\x89PNG\r\n\x1a\n" + rng.randbytes(rng.randint(2000, 40000))
+            creator.add_item(_Entry(f"I/image_{i}.png", "", data, "image/png", False))
+        for entry in range(entries):
+            title = corpus.title(entry)
+            page_path = corpus.path(title)
+            creator.add_item(_Entry(page_path, title, corpus.page(entry, entries), "text/html", True))
+            if entry % REDIRECT_EVERY == 0:
+                creator.add_redirection(
+                    f"{page_path}_(redirect)", f"{title} (redirect)", page_path,
+                    {Hint.FRONT_ARTICLE: False},
+                )
+    os.replace(tmp_path, path)
+    return time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="path of the ZIM file to write")
+    parser.add_argument("--entries", type=int, default=10000, help="number of articles")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--body-words", type=int, default=400, help="median words per article")
+    parser.add_argument("--fulltext", action="store_true", help="build libzim's Xapian index too")
+    args = parser.parse_args()
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    seconds = generate(args.output, args.entries, args.seed, args.body_words, args.fulltext)
+    size = os.path.getsize(args.output) / 1e6
+    print(f"Wrote {args.output}: {args.entries} articles, {size:.1f} MB in {seconds:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
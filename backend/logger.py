@@ -1,14 +1,34 @@
 import logging
 import os
+from logging.handlers import RotatingFileHandler, WatchedFileHandler
 
 LOG_FILE = "./data/server.log"
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+# The log is rotated at LOG_MAX_MB, keeping LOG_BACKUPS older files
+LOG_MAX_BYTES = int(float(os.getenv("LOG_MAX_MB", "10")) * 1024 * 1024)
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "5"))
+# Pid of the process that rotates the log, inherited by the processes it starts
+LOG_OWNER_ENV = "MNEMO_LOG_OWNER"
+
+
+def file_handler() -> logging.Handler:
+    """Return the handler writing this process's records to ``LOG_FILE``.
+
+    Only the server rotates the log. Indexing processes append to the same
+    file and reopen it once the server has rotated it, since two processes
+    renaming the file at once would lose the records of one of them.
+    """
+    pid = str(os.getpid())
+    if os.environ.setdefault(LOG_OWNER_ENV, pid) == pid:
+        return RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+    return WatchedFileHandler(LOG_FILE)
+
 
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
     handlers=[
-        logging.FileHandler(LOG_FILE),
+        file_handler(),
         logging.StreamHandler()
     ]
 )
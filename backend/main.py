@@ -1,16 +1,28 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes.config import router as config_router
 from routes.search import router as search_router
 from routes.zim_routes import router as zim_router
 from routes.translate import router as translate_router
-from routes.llm import router as llm_router
+from routes.llm import router as llm_router, close_client as close_llm_client
 from routes.auth import router as auth_router
 from routes.logs import router as logs_router
-from routes.zim_loader import load_zim_files
+from routes.index_routes import router as index_router
+from routes.metrics import MetricsMiddleware
+from routes.metrics_routes import router as metrics_router
+from routes.zim_loader import load_zim_files, start_zim_watcher
 from logger import logger
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close pooled upstream connections on shutdown
+    await close_llm_client()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS for frontend access
 app.add_middleware(
@@ -20,6 +32,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Times every routed request for /metrics
+app.add_middleware(MetricsMiddleware)
 
 # Mount all routers
 app.include_router(config_router)
@@ -29,7 +43,10 @@ app.include_router(translate_router)
 app.include_router(llm_router)
 app.include_router(auth_router)
 app.include_router(logs_router)
+app.include_router(index_router)
+app.include_router(metrics_router)
 
 # Load ZIMs on startup without blocking on indexing
 logger.info("Mnemo server starting up")
 load_zim_files(blocking=False)
+start_zim_watcher()
@@ -1,11 +1,14 @@
 # config.py - Admin configurable settings (ZIM directory)
 from fastapi import APIRouter, Request, HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
+import hashlib
 import json
 import os
 import shutil
-import argostranslate.package as argos_pkg
+from collections import defaultdict
 from threading import Thread
 from .auth import get_session_username
 from logger import logger
@@ -15,6 +18,16 @@ router = APIRouter()
 
 # Track Argos installation progress
 ARGOS_PROGRESS = {"total": 0, "done": 0}
+
+# ZIM uploads are written in fixed-size chunks to a hidden ".part" file
+UPLOAD_CHUNK = 1024 * 1024
+# Track ZIM upload progress per file name
+UPLOAD_PROGRESS = {}
+# Running sha256 of sequential uploads: filename -> (offset, hasher)
+_UPLOAD_HASHES = {}
+# Requests writing to the same upload run one at a time
+_UPLOAD_LOCKS = defaultdict(asyncio.Lock)
+ZIM_MAGIC = b"ZIM\x04"
 
 class ConfigModel(BaseModel):
     zim_dir: str
@@ -27,6 +40,22 @@ class ConfigModel(BaseModel):
     ldap_url: str | None = None
     sso_url: str | None = None
     zim_overrides: dict[str, dict[str, str]] = {}
+    index_batch_size: int = 5000
+    index_content: bool = False
+    index_content_max_mb: int = 1024
+    index_workers: int = 0
+    index_nice: int = 10
+    index_max_rows_per_sec: int = 0
+    index_latency_target_ms: int = 250
+    search_backend: str = "auto"
+    article_cache_mb: int = 256
+    zim_watch_interval: int = 10
+    llm_timeout: int = 120
+    llm_max_concurrent: int = 2
+    llm_context_tokens: int = 2048
+    llm_context_chunks: int = 6
+    translation_cache_mb: int = 1024
+    pdf_cache_mb: int = 512
 
 
 class ConfigUpdateRequest(ConfigModel):
@@ -49,6 +78,22 @@ def load_config():
         "ldap_url": None,
         "sso_url": None,
         "zim_overrides": {},
+        "index_batch_size": 5000,
+        "index_content": False,
+        "index_content_max_mb": 1024,
+        "index_workers": 0,
+        "index_nice": 10,
+        "index_max_rows_per_sec": 0,
+        "index_latency_target_ms": 250,
+        "search_backend": "auto",
+        "article_cache_mb": 256,
+        "zim_watch_interval": 10,
+        "llm_timeout": 120,
+        "llm_max_concurrent": 2,
+        "llm_context_tokens": 2048,
+        "llm_context_chunks": 6,
+        "translation_cache_mb": 1024,
+        "pdf_cache_mb": 512,
     }
 
     if not os.path.exists(CONFIG_PATH):
@@ -63,6 +108,22 @@ def load_config():
     data.setdefault("sso_url", None)
     data.setdefault("icon_dir", defaults["icon_dir"])
     data.setdefault("session_timeout", 30)
+    data.setdefault("index_batch_size", defaults["index_batch_size"])
+    data.setdefault("index_content", defaults["index_content"])
+    data.setdefault("index_content_max_mb", defaults["index_content_max_mb"])
+    data.setdefault("index_workers", defaults["index_workers"])
+    data.setdefault("index_nice", defaults["index_nice"])
+    data.setdefault("index_max_rows_per_sec", defaults["index_max_rows_per_sec"])
+    data.setdefault("index_latency_target_ms", defaults["index_latency_target_ms"])
+    data.setdefault("search_backend", defaults["search_backend"])
+    data.setdefault("article_cache_mb", defaults["article_cache_mb"])
+    data.setdefault("zim_watch_interval", defaults["zim_watch_interval"])
+    data.setdefault("llm_timeout", defaults["llm_timeout"])
+    data.setdefault("llm_max_concurrent", defaults["llm_max_concurrent"])
+    data.setdefault("llm_context_tokens", defaults["llm_context_tokens"])
+    data.setdefault("llm_context_chunks", defaults["llm_context_chunks"])
+    data.setdefault("translation_cache_mb", defaults["translation_cache_mb"])
+    data.setdefault("pdf_cache_mb", defaults["pdf_cache_mb"])
 
     if env_zim:
         data["zim_dir"] = env_zim
@@ -130,6 +191,11 @@ def update_argos(request: Request):
     session = get_session_username(request)
     if session != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
+    # Imported here so index workers, which load this module for
+    # load_config, do not import Argos
+    import argostranslate.package as argos_pkg
+    from routes.translation_engine import TRANSLATORS
+
     def run_install():
         try:
             argos_pkg.update_package_index()
@@ -139,6 +205,8 @@ def update_argos(request: Request):
             for p in packages:
                 p.install()
                 ARGOS_PROGRESS["done"] += 1
+            # Drop loaded translators so updated models are picked up
+            TRANSLATORS.clear()
             logger.info("Argos packages updated")
         except Exception as e:
             logger.error(f"Argos update failed: {e}")
@@ -177,21 +245,173 @@ async def upload_icon(file: UploadFile, request: Request):
     return {"message": "Icon uploaded", "filename": filename}
 
 
-@router.post("/admin/upload-zim")
-async def upload_zim(file: UploadFile, request: Request):
+def _require_admin(request: Request):
     session = get_session_username(request)
     if session != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
+
+
+def _zim_upload_paths(filename: str) -> tuple[str, str, str]:
+    """Return ``(name, part_path, final_path)`` for an uploaded ZIM."""
     config = load_config()
     directory = config.get("zim_dir", "./data/zim")
     if not os.path.exists(directory):
         raise HTTPException(status_code=400, detail="ZIM directory missing")
-    filename = os.path.basename(file.filename)
-    if not filename.endswith(".zim"):
+    name = os.path.basename(filename or "")
+    if not name.endswith(".zim") or name.startswith("."):
         raise HTTPException(status_code=400, detail="Invalid file type")
-    with open(os.path.join(directory, filename), "wb") as f:
-        f.write(await file.read())
-    logger.info(f"Uploaded ZIM {filename}")
+    return name, os.path.join(directory, f".{name}.part"), os.path.join(directory, name)
+
+
+def _append_chunk(part_path: str, offset: int, chunk: bytes) -> int:
+    with open(part_path, "r+b" if offset else "wb") as f:
+        f.seek(offset)
+        f.write(chunk)
+    return offset + len(chunk)
+
+
+async def _receive_chunks(name: str, part_path: str, offset: int, chunks, total: int | None):
+    """Write an async stream of byte chunks into the part file at *offset*.
+
+    The sha256 is updated as data arrives for as long as the upload stays
+    sequential; out-of-order resumes are hashed again on completion.
+    """
+    current = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    # Offset 0 always restarts the upload from scratch
+    if offset not in (0, current):
+        raise HTTPException(
+            status_code=409, detail={"message": "Offset mismatch", "offset": current}
+        )
+    if offset == 0:
+        _UPLOAD_HASHES[name] = (0, hashlib.sha256())
+    hashed_to, hasher = _UPLOAD_HASHES.get(name, (None, None))
+    if hashed_to != offset:
+        hasher = None
+    UPLOAD_PROGRESS[name] = {"received": offset, "total": total}
+
+    buffer = bytearray()
+    async for data in chunks:
+        buffer += data
+        if len(buffer) >= UPLOAD_CHUNK:
+            chunk = bytes(buffer)
+            buffer.clear()
+            offset = await run_in_threadpool(_append_chunk, part_path, offset, chunk)
+            if hasher:
+                hasher.update(chunk)
+            UPLOAD_PROGRESS[name]["received"] = offset
+    if buffer or not os.path.exists(part_path):
+        chunk = bytes(buffer)
+        offset = await run_in_threadpool(_append_chunk, part_path, offset, chunk)
+        if hasher:
+            hasher.update(chunk)
+        UPLOAD_PROGRESS[name]["received"] = offset
+    if hasher:
+        _UPLOAD_HASHES[name] = (offset, hasher)
+    return offset
+
+
+def _finalize_zim(name: str, part_path: str, final_path: str, sha256: str | None) -> str:
+    """Validate, fsync and atomically publish an uploaded ZIM.
+
+    Returns the hex sha256 of the file.
+    """
+    size = os.path.getsize(part_path)
+    hashed_to, hasher = _UPLOAD_HASHES.pop(name, (None, None))
+    with open(part_path, "rb") as f:
+        header = f.read(8)
+        if hashed_to != size:
+            f.seek(0)
+            hasher = hashlib.sha256()
+            for block in iter(lambda: f.read(UPLOAD_CHUNK), b""):
+                hasher.update(block)
+        os.fsync(f.fileno())
+    digest = hasher.hexdigest()
+    major = int.from_bytes(header[4:6], "little") if len(header) >= 6 else 0
+    if header[:4] != ZIM_MAGIC or major not in (5, 6):
+        os.remove(part_path)
+        raise HTTPException(status_code=400, detail="Not a valid ZIM file")
+    if sha256 and sha256.lower() != digest:
+        os.remove(part_path)
+        raise HTTPException(status_code=400, detail="Checksum mismatch")
+    os.replace(part_path, final_path)
+    dir_fd = os.open(os.path.dirname(final_path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return digest
+
+
+async def _publish_zim(name: str, part_path: str, final_path: str, sha256: str | None):
+    try:
+        digest = await run_in_threadpool(_finalize_zim, name, part_path, final_path, sha256)
+    finally:
+        UPLOAD_PROGRESS.pop(name, None)
+    logger.info(f"Uploaded ZIM {name} (sha256 {digest})")
     from routes.zim_loader import load_zim_files
-    load_zim_files()
-    return {"message": "ZIM uploaded", "filename": filename}
+    await run_in_threadpool(load_zim_files)
+    return {"message": "ZIM uploaded", "filename": name, "sha256": digest}
+
+
+@router.post("/admin/upload-zim")
+async def upload_zim(file: UploadFile, request: Request, sha256: str | None = None):
+    """Store a ZIM sent as a multipart form in one request.
+
+    Starlette spools the form to a temporary file before this runs, so
+    large archives should use the resumable ``PUT`` upload instead.
+    """
+    _require_admin(request)
+    name, part_path, final_path = _zim_upload_paths(file.filename)
+
+    async def chunks():
+        while data := await file.read(UPLOAD_CHUNK):
+            yield data
+
+    async with _UPLOAD_LOCKS[name]:
+        await _receive_chunks(name, part_path, 0, chunks(), file.size)
+        return await _publish_zim(name, part_path, final_path, sha256)
+
+
+@router.get("/admin/upload-zim/{filename}")
+def upload_zim_status(filename: str, request: Request):
+    """Return how many bytes of a resumable upload have been stored."""
+    _require_admin(request)
+    name, part_path, _ = _zim_upload_paths(filename)
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    return {"filename": name, "offset": offset}
+
+
+@router.put("/admin/upload-zim/{filename}")
+async def upload_zim_chunk(filename: str, request: Request, offset: int = 0, total: int | None = None):
+    """Append the raw request body to a resumable upload at *offset*.
+
+    A mismatched offset returns 409 with the stored size so the client can
+    resume from there. The body is written as it arrives.
+    """
+    _require_admin(request)
+    name, part_path, _ = _zim_upload_paths(filename)
+    async with _UPLOAD_LOCKS[name]:
+        offset = await _receive_chunks(name, part_path, offset, request.stream(), total)
+    return {"filename": name, "offset": offset}
+
+
+@router.post("/admin/upload-zim/{filename}/complete")
+async def upload_zim_complete(filename: str, request: Request, sha256: str | None = None):
+    """Finish a resumable upload and load the archive."""
+    _require_admin(request)
+    name, part_path, final_path = _zim_upload_paths(filename)
+    async with _UPLOAD_LOCKS[name]:
+        if not os.path.exists(part_path):
+            raise HTTPException(status_code=404, detail="Upload not found")
+        return await _publish_zim(name, part_path, final_path, sha256)
+
+
+@router.get("/admin/upload-progress")
+def upload_progress(request: Request):
+    _require_admin(request)
+    progress = {}
+    for name, state in UPLOAD_PROGRESS.items():
+        total = state.get("total")
+        percent = int(state["received"] * 100 / total) if total else None
+        progress[name] = {**state, "progress": percent}
+    return {"uploads": progress}
@@ -0,0 +1,92 @@
+# fts_pool.py - Pooled read-only SQLite connections for the search shards
+import os
+import sqlite3
+from contextlib import contextmanager
+from threading import Lock
+from urllib.parse import quote
+
+# Idle connections kept per shard database
+POOL_MAX_IDLE = 16
+POOL_MMAP_SIZE = 256 * 1024 * 1024
+POOL_CACHED_STATEMENTS = 256
+
+
+class ReadPool:
+    """Thread-safe pool of long-lived read-only SQLite connections.
+
+    Connections are opened with ``mode=ro`` and ``query_only`` and keep
+    their prepared statement cache between requests. A connection is used
+    by one thread at a time but may move between threadpool workers.
+
+    Shards are replaced atomically when an archive is re-indexed, so each
+    connection remembers the inode it was opened on and is discarded once
+    the file on disk changes.
+    """
+
+    def __init__(self, max_idle: int = POOL_MAX_IDLE, mmap_size: int = POOL_MMAP_SIZE):
+        self.max_idle = max_idle
+        self.mmap_size = mmap_size
+        self._idle: dict[str, list[tuple[int, sqlite3.Connection]]] = {}
+        self._lock = Lock()
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{quote(os.path.abspath(path))}?mode=ro",
+            uri=True,
+            timeout=30,
+            check_same_thread=False,
+            cached_statements=POOL_CACHED_STATEMENTS,
+        )
+        conn.execute("PRAGMA query_only=1")
+        conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _acquire(self, path: str) -> tuple[int, sqlite3.Connection]:
+        try:
+            inode = os.stat(path).st_ino
+        except OSError as e:
+            # Shards are missing before their first build and after pruning;
+            # callers handle this like any database that cannot be opened
+            raise sqlite3.OperationalError(f"unable to open database file {path}") from e
+        stale = []
+        conn = None
+        with self._lock:
+            idle = self._idle.get(path, [])
+            while idle:
+                conn_inode, candidate = idle.pop()
+                if conn_inode == inode:
+                    conn = candidate
+                    break
+                stale.append(candidate)
+        for old in stale:
+            old.close()
+        return inode, conn or self._open(path)
+
+    def _release(self, path: str, inode: int, conn: sqlite3.Connection):
+        with self._lock:
+            idle = self._idle.setdefault(path, [])
+            if len(idle) < self.max_idle:
+                idle.append((inode, conn))
+                return
+        conn.close()
+
+    @contextmanager
+    def connection(self, path: str):
+        """Borrow a read-only connection to the database at *path*."""
+        inode, conn = self._acquire(path)
+        try:
+            yield conn
+        finally:
+            # Query errors such as bad MATCH syntax leave the connection usable
+            self._release(path, inode, conn)
+
+    def invalidate(self, path: str):
+        """Close the idle connections of a database that was replaced or removed."""
+        with self._lock:
+            idle = self._idle.pop(path, [])
+        for _, conn in idle:
+            conn.close()
+
+
+READ_POOL = ReadPool()
@@ -0,0 +1,25 @@
+# html_text.py - Plain-text extraction from ZIM article HTML
+import html
+import re
+
+_DROP_BLOCKS = re.compile(
+    r"<(head|script|style|noscript|template)\b[^>]*>.*?</\1\s*>",
+    re.DOTALL | re.IGNORECASE,
+)
+_COMMENTS = re.compile(r"<!--.*?-->", re.DOTALL)
+_TAGS = re.compile(r"<[^>]+>")
+_SPACES = re.compile(r"\s+")
+
+
+def html_to_text(content: str, limit: int | None = None) -> str:
+    """Strip markup from *content* and return whitespace-collapsed text.
+
+    When *limit* is given the result is truncated to that many characters.
+    """
+    text = _DROP_BLOCKS.sub(" ", content)
+    text = _COMMENTS.sub(" ", text)
+    text = _TAGS.sub(" ", text)
+    text = _SPACES.sub(" ", html.unescape(text)).strip()
+    if limit is not None:
+        text = text[:limit]
+    return text
@@ -0,0 +1,76 @@
+# index_routes.py - Admin status and controls of the indexing scheduler
+from fastapi import APIRouter, HTTPException, Request
+from .auth import get_session_username
+from routes.zim_loader import SCHEDULER, index_progress
+
+router = APIRouter()
+
+
+def _require_admin(request: Request):
+    if get_session_username(request) != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+
+def _progress(job: dict, info: dict | None) -> dict:
+    """Return rows done, progress, rate and ETA of a job from its checkpoint."""
+    if info is None:
+        done = job["state"] == "done"
+        return {
+            "rows": job["rows"] or 0,
+            "progress": 1.0 if done else 0.0,
+            "rate": None,
+            "eta_seconds": 0 if done else None,
+        }
+    scanned = info["last_entry"] + 1
+    entries = max(info["entries"], scanned)
+    # Not every entry is an article, so remaining rows follow the share so far
+    remaining = (entries - scanned) * info["rows"] / scanned
+    running = job["state"] == "running" and info["rate"] > 0
+    return {
+        "rows": info["rows"],
+        "progress": round(scanned / entries, 4) if entries else 0.0,
+        "rate": info["rate"],
+        "eta_seconds": round(remaining / info["rate"]) if running else None,
+    }
+
+
+@router.get("/admin/index-status")
+def index_status(request: Request):
+    """Return the indexing queue in run order with progress per archive."""
+    _require_admin(request)
+    jobs = SCHEDULER.snapshot()
+    # Cancelled and failed builds keep their checkpoint too
+    progress = index_progress([job["zim"] for job in jobs])
+    archives = [{**job, **_progress(job, progress.get(job["zim"]))} for job in jobs]
+    return {
+        "paused": SCHEDULER.paused,
+        "backoff": SCHEDULER.throttle,
+        "archives": archives,
+    }
+
+
+@router.post("/admin/index/pause")
+def pause_index(request: Request, zim: str | None = None):
+    """Pause indexing of *zim*, or of every archive."""
+    _require_admin(request)
+    if not SCHEDULER.pause(zim):
+        raise HTTPException(status_code=404, detail="Archive is not being indexed")
+    return {"message": "Indexing paused"}
+
+
+@router.post("/admin/index/resume")
+def resume_index(request: Request, zim: str | None = None):
+    """Resume indexing of *zim*, or of every archive."""
+    _require_admin(request)
+    if not SCHEDULER.resume(zim):
+        raise HTTPException(status_code=404, detail="Archive has no indexing job")
+    return {"message": "Indexing resumed"}
+
+
+@router.post("/admin/index/cancel")
+def cancel_index(request: Request, zim: str | None = None):
+    """Cancel indexing of *zim*, or of every archive."""
+    _require_admin(request)
+    if not SCHEDULER.cancel(zim):
+        raise HTTPException(status_code=404, detail="Archive is not being indexed")
+    return {"message": "Indexing cancelled"}
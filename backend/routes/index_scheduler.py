@@ -0,0 +1,450 @@
+# index_scheduler.py - Prioritized, throttled and controllable shard builds
+import ctypes
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from multiprocessing import get_context
+from pathlib import Path
+from threading import Condition, Thread
+from logger import logger
+from routes.metrics import REQUEST_SECONDS
+
+# Commands to a running build, one shared byte per pool slot
+RUN, PAUSE, CANCEL = 0, 1, 2
+# Job states; queued and running jobs count as active
+ACTIVE = ("queued", "running")
+# Seconds between latency checks, and between command checks in builds
+CONTROL_INTERVAL = 2.0
+PAUSE_POLL = 0.25
+# Routes whose latency users feel while indexing competes for the machine
+LATENCY_ROUTES = frozenset({
+    "/article/{zim_id}/{path:path}",
+    "/resource/{zim_id}/{path:path}",
+    "/search",
+    "/search/suggest",
+})
+# An interval with fewer requests says nothing about latency
+LATENCY_MIN_REQUESTS = 5
+# Builds back off in steps of idle time per second of work, up to the
+# maximum, so indexing never drops below a fifth of its speed.
+BACKOFF_STEP = 0.25
+MAX_BACKOFF = 4.0
+# Linux ioprio_set(2): the idle class only gets disk time nobody else wants
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_SET = {"x86_64": 251, "i686": 289, "aarch64": 30, "armv7l": 314, "riscv64": 30}
+
+
+class IndexCancelled(Exception):
+    """Raised inside a build whose job was cancelled."""
+
+
+# Set in pool processes by _init_worker and _run_job
+_CONTROL = None
+_THROTTLE = None
+_SLOT = None
+
+
+def _set_idle_io() -> bool:
+    """Move this process to the idle I/O class where Linux supports it."""
+    number = _IOPRIO_SET.get(platform.machine())
+    if not number or not sys.platform.startswith("linux"):
+        return False
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        value = IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT
+        return libc.syscall(number, IOPRIO_WHO_PROCESS, 0, value) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def _init_worker(control, throttle, nice: int):
+    global _CONTROL, _THROTTLE
+    _CONTROL = control
+    _THROTTLE = throttle
+    if nice > 0 and hasattr(os, "nice"):
+        os.nice(nice)
+        # Builds read whole archives; keep them off the disk while requests need it
+        if not _set_idle_io():
+            logger.debug("Idle I/O priority is not available for index builds")
+
+
+def _run_job(slot: int, build, *args):
+    """Run *build* in a pool process, obeying the commands of *slot*."""
+    global _SLOT
+    _SLOT = slot
+    try:
+        return build(*args)
+    finally:
+        _SLOT = None
+
+
+def pace(busy: float, rows: int, max_rate: float = 0) -> float:
+    """Throttle a build that just wrote *rows* after *busy* seconds of work.
+
+    Sleeps long enough to stay under *max_rate* rows per second and to
+    idle the scheduler's backoff share of *busy*, and blocks while the job
+    is paused. Raises ``IndexCancelled`` once the job is cancelled.
+    Outside a scheduler process only the rate cap applies.
+
+    Returns the seconds spent paused.
+    """
+    delay = rows / max_rate - busy if max_rate > 0 else 0.0
+    if _SLOT is None:
+        if delay > 0:
+            time.sleep(delay)
+        return 0.0
+    deadline = time.monotonic() + max(delay, busy * _THROTTLE.value)
+    paused = 0.0
+    while True:
+        command = _CONTROL[_SLOT]
+        if command == CANCEL:
+            raise IndexCancelled()
+        if command == PAUSE:
+            time.sleep(PAUSE_POLL)
+            paused += PAUSE_POLL
+            continue
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return paused
+        time.sleep(min(remaining, PAUSE_POLL))
+
+
+class IndexJob:
+    """The build of one archive's shard, from queueing to its outcome."""
+
+    def __init__(self, zim_path: Path, options: dict, on_done):
+        stat = zim_path.stat()
+        self.name = zim_path.name
+        self.path = str(zim_path)
+        self.options = options
+        self.on_done = on_done
+        self.size = stat.st_size
+        self.stamp = (stat.st_size, stat.st_mtime)
+        self.state = "queued"
+        self.paused = False
+        self.cancelled = False
+        # Article views while queued; the most wanted archive goes first
+        self.requests = 0
+        self.slot = None
+        self.pool = None
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.rows = None
+        self.error = None
+
+    def priority(self) -> tuple:
+        return (-self.requests, self.size, self.queued_at)
+
+
+class IndexScheduler:
+    """Run shard builds in a process pool, one queue ordered by priority.
+
+    Archives that users open while waiting go first, then the smallest,
+    so most archives become searchable early. A control thread starts
+    builds as slots free up and backs them off while requests to
+    ``LATENCY_ROUTES`` are slower than the configured target. Builds call
+    :func:`pace` after every committed batch, which is where throttling,
+    pausing and cancellation take effect; a cancelled build keeps its
+    checkpoint and resumes from it when started again.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        self.jobs = {}
+        self.paused = False
+        self.workers = 0
+        self.nice = 0
+        self.latency_target = 0.0
+        self.throttle = 0.0
+        self._cond = Condition()
+        self._pool = None
+        self._control = None
+        self._throttle = None
+        self._free = set()
+        self._thread = None
+        self._latency = None
+
+    def configure(self, config: dict):
+        with self._cond:
+            self.workers = int(config.get("index_workers", 0))
+            self.nice = int(config.get("index_nice", 10))
+            self.latency_target = config.get("index_latency_target_ms", 250) / 1000
+            self._cond.notify_all()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """Return the build pool, one process per core. Needs the lock."""
+        if self._pool is None:
+            size = os.cpu_count() or 1
+            # spawn avoids forking the server while its threads hold locks
+            context = get_context("spawn")
+            self._control = context.RawArray("b", size)
+            self._throttle = context.RawValue("d", self.throttle)
+            self._free = set(range(size))
+            self._pool = ProcessPoolExecutor(
+                max_workers=size,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self._control, self._throttle, self.nice),
+            )
+        return self._pool
+
+    def submit(self, zim_path: Path, options: dict, on_done) -> bool:
+        """Queue a build of *zim_path*; ``on_done(future)`` gets its outcome.
+
+        Returns False if the archive is already queued or being indexed,
+        or if its build was cancelled and the file has not changed since.
+        """
+        job = IndexJob(zim_path, options, on_done)
+        with self._cond:
+            current = self.jobs.get(job.name)
+            if current and (
+                current.state in ACTIVE
+                or (current.state == "cancelled" and current.stamp == job.stamp)
+            ):
+                return False
+            self.jobs[job.name] = job
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name="index-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return True
+
+    def wait(self, names):
+        """Block until none of the archives *names* is queued or indexing."""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: all(
+                    self.jobs[name].state not in ACTIVE for name in names if name in self.jobs
+                )
+            )
+
+    def active(self) -> set:
+        """Return the names of the archives queued or being indexed."""
+        return {name for name, job in list(self.jobs.items()) if job.state in ACTIVE}
+
+    def note_request(self, zim_name: str):
+        """Count a request for an archive, which raises it in the queue."""
+        job = self.jobs.get(zim_name)
+        if job is not None and job.state == "queued":
+            job.requests += 1
+
+    def _command(self, job: IndexJob) -> int:
+        if job.cancelled:
+            return CANCEL
+        return PAUSE if job.paused or self.paused else RUN
+
+    def _signal(self):
+        """Send every running build its current command. Needs the lock."""
+        for job in self.jobs.values():
+            if job.slot is not None and job.pool is self._pool:
+                self._control[job.slot] = self._command(job)
+
+    def _select(self, name: str | None) -> list[IndexJob]:
+        if name is None:
+            return list(self.jobs.values())
+        job = self.jobs.get(name)
+        return [job] if job else []
+
+    def pause(self, name: str | None = None) -> bool:
+        """Pause one archive, or with no *name* the whole queue.
+
+        Running builds stop at their next batch and hold their process.
+        """
+        with self._cond:
+            if name is None:
+                self.paused = True
+            else:
+                jobs = [job for job in self._select(name) if job.state in ACTIVE]
+                if not jobs:
+                    return False
+                jobs[0].paused = True
+            self._signal()
+        logger.info(f"Indexing paused: {name or 'all archives'}")
+        return True
+
+    def resume(self, name: str | None = None) -> bool:
+        """Resume one paused archive, or with no *name* the whole queue.
+
+        Naming a cancelled or failed archive queues it again.
+        """
+        with self._cond:
+            if name is None:
+                self.paused = False
+            jobs = self._select(name)
+            if name is not None and not jobs:
+                return False
+            for job in jobs:
+                job.paused = False
+                if name is not None and job.state in ("cancelled", "failed"):
+                    job.state = "queued"
+                    job.cancelled = False
+                    job.error = None
+                    job.queued_at = time.time()
+            self._signal()
+            self._cond.notify_all()
+        logger.info(f"Indexing resumed: {name or 'all archives'}")
+        return True
+
+    def cancel(self, name: str | None = None) -> bool:
+        """Cancel one archive, or with no *name* every queued and running build."""
+        with self._cond:
+            jobs = [job for job in self._select(name) if job.state in ACTIVE]
+            if name is not None and not jobs:
+                return False
+            for job in jobs:
+                job.cancelled = True
+                if job.state == "queued":
+                    job.state = "cancelled"
+                    job.finished_at = time.time()
+            self._signal()
+            self._cond.notify_all()
+        logger.info(f"Indexing cancelled: {name or 'all archives'}")
+        return True
+
+    def snapshot(self) -> list[dict]:
+        """Return the jobs in the order they run or will run."""
+        with self._cond:
+            jobs = sorted(
+                self.jobs.values(),
+                key=lambda job: (
+                    ("running", "queued").index(job.state) if job.state in ACTIVE else 2,
+                    job.priority(),
+                ),
+            )
+            result = []
+            for job in jobs:
+                state = job.state
+                if state == "running" and job.cancelled:
+                    state = "cancelling"
+                elif state in ACTIVE and (job.paused or self.paused):
+                    state = "paused"
+                result.append({
+                    "zim": job.name,
+                    "state": state,
+                    "size": job.size,
+                    "requests": job.requests,
+                    "queued_at": job.queued_at,
+                    "started_at": job.started_at,
+                    "finished_at": job.finished_at,
+                    "rows": job.rows,
+                    "error": job.error,
+                })
+            return result
+
+    def _run(self):
+        while True:
+            with self._cond:
+                started = self._dispatch()
+                if not started:
+                    self._cond.wait(CONTROL_INTERVAL)
+            if not started:
+                self._adjust_throttle()
+            # A build that already finished runs its callback right away,
+            # which takes the lock and calls on_done, so register outside it
+            for job, future in started:
+                future.add_done_callback(partial(self._finished, job))
+
+    def _dispatch(self) -> list:
+        """Start the highest priority queued builds on free slots. Needs the lock.
+
+        Returns the started jobs with their futures.
+        """
+        started = []
+        if self.paused:
+            return started
+        cores = os.cpu_count() or 1
+        limit = min(self.workers or cores, cores)
+        running = sum(job.state == "running" for job in self.jobs.values())
+        queued = sorted(
+            (job for job in self.jobs.values() if job.state == "queued" and not job.paused),
+            key=IndexJob.priority,
+        )
+        # Archives indexed on their own may split their scan over the idle cores
+        scan_workers = max(1, cores // max(1, min(limit, running + len(queued))))
+        for job in queued:
+            if running >= limit:
+                break
+            pool = self._get_pool()
+            if not self._free:
+                break
+            slot = self._free.pop()
+            self._control[slot] = RUN
+            options = {**job.options, "scan_workers": scan_workers}
+            try:
+                future = pool.submit(_run_job, slot, self.build, job.path, job.name, options)
+            except BrokenProcessPool:
+                self._pool = None
+                break
+            job.state = "running"
+            job.slot = slot
+            job.pool = pool
+            job.started_at = time.time()
+            running += 1
+            started.append((job, future))
+            logger.info(f"Indexing {job.name} started")
+        return started
+
+    def _finished(self, job: IndexJob, future):
+        error = future.exception()
+        if error is None or not isinstance(error, IndexCancelled):
+            # Record the outcome before waiters see the job as finished
+            job.on_done(future)
+        else:
+            logger.info(f"Indexing {job.name} cancelled; progress is kept")
+        with self._cond:
+            if job.pool is self._pool:
+                self._free.add(job.slot)
+            job.slot = None
+            job.pool = None
+            job.finished_at = time.time()
+            if error is None:
+                job.state = "done"
+                job.rows = future.result()
+            elif isinstance(error, IndexCancelled):
+                job.state = "cancelled"
+            else:
+                job.state = "failed"
+                job.error = str(error) or type(error).__name__
+                if isinstance(error, BrokenProcessPool) and self._pool is not None:
+                    self._pool.shutdown(wait=False)
+                    self._pool = None
+            self._cond.notify_all()
+
+    def _adjust_throttle(self):
+        """Back builds off while user-facing requests are slower than the target.
+
+        Compares the mean latency of ``LATENCY_ROUTES`` since the last
+        check with the target; the idle share doubles while it is above
+        and halves while it is below.
+        """
+        total, count = 0.0, 0
+        for labels, cell in REQUEST_SECONDS.totals().items():
+            if labels[0] in LATENCY_ROUTES:
+                total += cell[-2]
+                count += cell[-1]
+        last, self._latency = self._latency, (total, count)
+        requests = count - last[1] if last else 0
+        slow = (
+            self.latency_target > 0
+            and requests >= LATENCY_MIN_REQUESTS
+            and (total - last[0]) / requests > self.latency_target
+        )
+        with self._cond:
+            if slow and any(job.state == "running" for job in self.jobs.values()):
+                throttle = min(MAX_BACKOFF, max(BACKOFF_STEP, self.throttle * 2))
+            else:
+                throttle = self.throttle / 2 if self.throttle > BACKOFF_STEP else 0.0
+            if throttle and not self.throttle:
+                logger.info("Indexing backs off: request latency is above target")
+            elif self.throttle and not throttle:
+                logger.info("Indexing back to full speed")
+            self.throttle = throttle
+            if self._throttle is not None:
+                self._throttle.value = throttle
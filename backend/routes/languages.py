@@ -0,0 +1,67 @@
+# languages.py - Language codes of ZIM archives and sampled language detection
+from langdetect import DetectorFactory, LangDetectException, detect
+
+# Make language detection deterministic across requests
+DetectorFactory.seed = 0
+
+# Characters of article text used for language detection
+LANG_SAMPLE_CHARS = 2000
+
+# ZIM metadata uses ISO 639-3 codes; Argos and langdetect use ISO 639-1.
+# The ISO 639-2/B bibliographic variants are included as well.
+ISO639_3_TO_1 = {
+    "afr": "af", "amh": "am", "ara": "ar", "aze": "az", "bel": "be",
+    "ben": "bn", "bos": "bs", "bul": "bg", "cat": "ca", "ces": "cs",
+    "cym": "cy", "dan": "da", "deu": "de", "ell": "el", "eng": "en",
+    "epo": "eo", "est": "et", "eus": "eu", "fas": "fa", "fin": "fi",
+    "fra": "fr", "gle": "ga", "glg": "gl", "guj": "gu", "heb": "he",
+    "hin": "hi", "hrv": "hr", "hun": "hu", "hye": "hy", "ind": "id",
+    "isl": "is", "ita": "it", "jpn": "ja", "kan": "kn", "kat": "ka",
+    "kaz": "kk", "khm": "km", "kor": "ko", "lat": "la", "lav": "lv",
+    "lit": "lt", "mal": "ml", "mar": "mr", "mkd": "mk", "msa": "ms",
+    "mya": "my", "nep": "ne", "nld": "nl", "nob": "nb", "nor": "no",
+    "pan": "pa", "pol": "pl", "por": "pt", "ron": "ro", "rus": "ru",
+    "sin": "si", "slk": "sk", "slv": "sl", "som": "so", "spa": "es",
+    "sqi": "sq", "srp": "sr", "swa": "sw", "swe": "sv", "tam": "ta",
+    "tel": "te", "tgl": "tl", "tha": "th", "tur": "tr", "ukr": "uk",
+    "urd": "ur", "uzb": "uz", "vie": "vi", "xho": "xh", "yor": "yo",
+    "zho": "zh", "zul": "zu",
+    "alb": "sq", "arm": "hy", "baq": "eu", "bur": "my", "chi": "zh",
+    "cze": "cs", "dut": "nl", "fre": "fr", "geo": "ka", "ger": "de",
+    "gre": "el", "ice": "is", "mac": "mk", "may": "ms", "per": "fa",
+    "rum": "ro", "slo": "sk", "wel": "cy",
+}
+
+
+def single_language(value: str | None) -> str | None:
+    """Return the ISO 639-1 code of a single-language archive, or None.
+
+    *value* is the ZIM ``Language`` metadata, a comma-separated list of
+    ISO 639-3 codes. Archives listing several languages, or a code with
+    no two-letter equivalent, return None.
+    """
+    codes = {code.strip().lower() for code in (value or "").split(",") if code.strip()}
+    if len(codes) != 1:
+        return None
+    code = codes.pop()
+    if len(code) == 2:
+        return code
+    return ISO639_3_TO_1.get(code)
+
+
+def detect_language(
+    text: str, default: str = "en", sample_chars: int = LANG_SAMPLE_CHARS
+) -> str:
+    """Detect the language of *text* from a sample of its start and middle.
+
+    langdetect's cost grows with the input, and a couple of thousand
+    characters are as reliable as a whole article.
+    """
+    if len(text) > sample_chars:
+        half = sample_chars // 2
+        middle = len(text) // 2
+        text = text[:half] + " " + text[middle : middle + half]
+    try:
+        return detect(text)
+    except LangDetectException:
+        return default
@@ -1,49 +1,216 @@
-from fastapi import APIRouter
+import asyncio
+import json
+import httpx
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import requests
-from routes.zim_loader import get_article
+from routes.retrieval import retrieve
 from routes.config import load_config
+from logger import logger
 
 router = APIRouter()
 
+# Keep-alive connections kept open to the LLM server
+LLM_KEEPALIVE = 4
+# Seconds a question may wait for a free generation slot
+LLM_QUEUE_TIMEOUT = 30
+
+_CLIENT = None
+_LIMIT = None
+
 
 class LLMQuery(BaseModel):
     query: str
     context_path: str | None = None
     zim_id: str | None = None
 
-@router.post("/llm/query")
-def llm_query(data: LLMQuery):
-    config = load_config()
-    if not config.get("llm_enabled"):
-        return {"answer": ""}
-    llm_url = config.get("llm_url", "http://localhost:11434/api/generate")
-    llm_model = config.get("llm_model", "llama3")
-    api_key = config.get("llm_api_key")
-    context = ""
-
-    if data.zim_id and data.context_path:
-        article = get_article(data.zim_id, data.context_path)
-        if article:
-            context = article.content or ""
-
-    payload = {
-        "model": llm_model,
-        "prompt": f"{context}\n\nUser question: {data.query}",
-        "stream": False
-    }
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared HTTP client used to reach the LLM server."""
+    global _CLIENT
+    if _CLIENT is None:
+        _CLIENT = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=None, max_keepalive_connections=LLM_KEEPALIVE
+            )
+        )
+    return _CLIENT
+
+
+async def close_client():
+    global _CLIENT
+    if _CLIENT is not None:
+        await _CLIENT.aclose()
+        _CLIENT = None
+
+
+def _get_limit(config: dict) -> asyncio.Semaphore:
+    """Return the semaphore capping concurrent generations.
+
+    A new semaphore is created when ``llm_max_concurrent`` changes;
+    requests holding the old one release it as usual.
+    """
+    global _LIMIT
+    size = max(1, int(config.get("llm_max_concurrent", 2)))
+    if _LIMIT is None or _LIMIT[0] != size:
+        _LIMIT = (size, asyncio.Semaphore(size))
+    return _LIMIT[1]
+
+
+async def _acquire(limit: asyncio.Semaphore):
+    try:
+        await asyncio.wait_for(limit.acquire(), LLM_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="LLM is busy, try again later")
+
+
+def _is_openai(url: str) -> bool:
+    """Whether *url* is an OpenAI-compatible chat completions endpoint."""
+    return url.rstrip("/").endswith("/chat/completions")
+
+
+def _parse_chunk(line: str) -> tuple[str, bool]:
+    """Return the token carried by one line of an upstream stream and
+    whether the stream is finished.
+
+    OpenAI-compatible servers send ``data:`` events ending with
+    ``data: [DONE]``; Ollama sends one JSON object per line.
+    """
+    line = line.strip()
+    if line.startswith("data:"):
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return "", True
+        choice = (json.loads(data).get("choices") or [{}])[0]
+        return (choice.get("delta") or {}).get("content") or choice.get("text") or "", False
+    if not line.startswith("{"):
+        # Blank lines, comments and other SSE fields
+        return "", False
+    chunk = json.loads(line)
+    return chunk.get("response", ""), bool(chunk.get("done"))
+
+
+def _answer(result: dict) -> str:
+    """Return the text of a complete, non-streamed LLM response."""
+    if "choices" in result:
+        choice = (result["choices"] or [{}])[0]
+        return (choice.get("message") or {}).get("content") or choice.get("text") or ""
+    return result.get("response", "")
+
+
+async def _build_request(data: LLMQuery, config: dict, stream: bool):
+    """Return the URL, payload, headers, timeout and sources of an LLM request.
+
+    The prompt only carries the passages picked by retrieval, not whole
+    articles, so it stays within ``llm_context_tokens``.
+    """
+    context, sources = await run_in_threadpool(
+        retrieve,
+        data.query,
+        int(config.get("llm_context_tokens", 2048)),
+        int(config.get("llm_context_chunks", 6)),
+        data.zim_id,
+        data.context_path,
+    )
+    prompt = f"User question: {data.query}"
+    if context:
+        prompt = (
+            "Answer the question using the numbered passages below and cite "
+            f"them as [n].\n\n{context}\n\n{prompt}"
+        )
+
+    url = config.get("llm_url", "http://localhost:11434/api/generate")
+    payload = {"model": config.get("llm_model", "llama3"), "stream": stream}
+    if _is_openai(url):
+        payload["messages"] = [{"role": "user", "content": prompt}]
+    else:
+        payload["prompt"] = prompt
 
     headers = {}
+    api_key = config.get("llm_api_key")
     if api_key:
         headers["Authorization"] = f"Bearer {api_key}"
 
+    # The read timeout applies between chunks, so long streamed answers
+    # are fine as long as tokens keep arriving.
+    timeout = httpx.Timeout(float(config.get("llm_timeout", 120)), connect=10.0)
+    return url, payload, headers, timeout, sources
+
+
+@router.post("/llm/query")
+async def llm_query(data: LLMQuery):
+    config = load_config()
+    if not config.get("llm_enabled"):
+        return {"answer": ""}
+    url, payload, headers, timeout, sources = await _build_request(
+        data, config, stream=False
+    )
+
+    limit = _get_limit(config)
+    await _acquire(limit)
     try:
-        res = requests.post(llm_url, json=payload, headers=headers)
+        res = await get_client().post(url, json=payload, headers=headers, timeout=timeout)
         result = res.json()
         return {
-            "answer": result.get("response", "").strip(),
-            "source_titles": [],
-            "source_urls": []
+            "answer": _answer(result).strip(),
+            "source_titles": [s["title"] for s in sources],
+            "source_urls": [s["url"] for s in sources]
         }
     except Exception as e:
         return {"answer": f"LLM query failed: {str(e)}"}
+    finally:
+        limit.release()
+
+
+@router.post("/llm/stream")
+async def llm_stream(data: LLMQuery):
+    """Stream the answer as server-sent ``data: {"token": ...}`` events.
+
+    A ``sources`` event listing the retrieved articles comes first.
+
+    The upstream server may send Ollama's newline-delimited JSON chunks or
+    OpenAI-compatible ``data:`` events. When the client disconnects the
+    response task is cancelled, which closes the upstream request as well.
+    """
+    config = load_config()
+    if not config.get("llm_enabled"):
+        raise HTTPException(status_code=404, detail="LLM is disabled")
+    url, payload, headers, timeout, sources = await _build_request(
+        data, config, stream=True
+    )
+
+    limit = _get_limit(config)
+
+    async def generate():
+        # The slot is taken inside the generator so that it is always
+        # released, even if the client leaves before streaming starts.
+        try:
+            await _acquire(limit)
+        except HTTPException as e:
+            yield f"event: error\ndata: {json.dumps(e.detail)}\n\n"
+            yield "event: end\ndata: done\n\n"
+            return
+        try:
+            yield f"event: sources\ndata: {json.dumps(sources)}\n\n"
+            async with get_client().stream(
+                "POST", url, json=payload, headers=headers, timeout=timeout
+            ) as res:
+                res.raise_for_status()
+                async for line in res.aiter_lines():
+                    token, done = _parse_chunk(line)
+                    if token:
+                        yield f"data: {json.dumps({'token': token})}\n\n"
+                    if done:
+                        break
+        except (asyncio.CancelledError, GeneratorExit):
+            logger.info("LLM stream cancelled by client")
+            raise
+        except Exception as e:
+            logger.warning(f"LLM stream failed: {e}")
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+        finally:
+            limit.release()
+        yield "event: end\ndata: done\n\n"
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
@@ -1,18 +1,229 @@
-from fastapi import APIRouter, Request, HTTPException
+# logs.py - Admin log viewer: tail reads, filters and live streaming
+import asyncio
+import json
 import os
+import re
+from datetime import datetime
+from fastapi import APIRouter, Request, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from .auth import get_session_username
-
-LOG_FILE = "./data/server.log"
+from logger import LOG_BACKUPS, LOG_FILE
 
 router = APIRouter()
 
-@router.get("/admin/logs")
-def read_logs(request: Request):
-    session = get_session_username(request)
-    if session != "admin":
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+# Records start with "2024-01-01 12:00:00,000 [LEVEL] "; other lines, such
+# as tracebacks, continue the record above them.
+_RECORD = re.compile(r"(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),\d{3} \[(\w+)\] ")
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Bytes read per step when reading the log backwards or following it
+TAIL_CHUNK = 64 * 1024
+TAIL_MAX_LINES = 5000
+# Seconds between checks for new lines, and between keepalive comments
+# which also detect clients that went away
+STREAM_POLL = 0.5
+STREAM_KEEPALIVE = 15
+
+
+def _require_admin(request: Request):
+    if get_session_username(request) != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
+
+
+def _min_level(level: str | None) -> int:
+    if level is None:
+        return 0
+    try:
+        return LEVELS[level.upper()]
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"Unknown log level {level}")
+
+
+def _timestamp(value: datetime | None) -> str | None:
+    """Format *value* like the log's timestamps, which are local time."""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.strftime(_TIME_FORMAT)
+
+
+def _reverse_lines(f, end: int):
+    """Yield the lines of *f* before offset *end*, last line first.
+
+    Blocks are read backwards from *end*, so the cost follows the number
+    of lines consumed rather than the size of the file.
+    """
+    pos = end
+    rest = b""
+    while pos > 0:
+        step = min(TAIL_CHUNK, pos)
+        pos -= step
+        f.seek(pos)
+        lines = (f.read(step) + rest).split(b"\n")
+        # The first piece may continue in the block before this one
+        rest = lines.pop(0)
+        for line in reversed(lines):
+            if line:
+                yield line.decode("utf-8", "replace")
+    if rest:
+        yield rest.decode("utf-8", "replace")
+
+
+def _reverse_records(current, end: int):
+    """Yield ``(time, level, text)`` of log records, newest first.
+
+    Reads *current*, the open log file, up to *end* and then the rotated
+    backups from newest to oldest.
+    """
+    pending = []
+    sources = [(current, end)] + [
+        (f"{LOG_FILE}.{i}", None) for i in range(1, LOG_BACKUPS + 1)
+    ]
+    for source, stop in sources:
+        if isinstance(source, str):
+            try:
+                f = open(source, "rb")
+            except FileNotFoundError:
+                break
+            stop = f.seek(0, os.SEEK_END)
+        else:
+            f = source
+        try:
+            for line in _reverse_lines(f, stop):
+                pending.append(line)
+                match = _RECORD.match(line)
+                if match:
+                    text = "\n".join(reversed(pending))
+                    pending = []
+                    yield match[1], LEVELS.get(match[2], 0), text
+        finally:
+            if f is not current:
+                f.close()
+
+
+def tail_records(
+    f, end: int, limit: int, min_level: int = 0,
+    since: str | None = None, until: str | None = None,
+) -> list[str]:
+    """Return the last *limit* records matching the filters, oldest first.
+
+    Reading stops at the first record older than *since*, so a time range
+    bounds the work even when few records match the level.
+    """
+    records = []
+    for stamp, level, text in _reverse_records(f, end):
+        if since is not None and stamp < since:
+            break
+        if until is not None and stamp > until:
+            continue
+        if level >= min_level:
+            records.append(text)
+            if len(records) >= limit:
+                break
+    records.reverse()
+    return records
+
+
+def _read_tail(limit: int, min_level: int, since=None, until=None) -> tuple[list[str], object]:
+    """Return the tail of the log and the open file, positioned at its end."""
+    f = open(LOG_FILE, "rb")
+    try:
+        end = f.seek(0, os.SEEK_END)
+        records = tail_records(f, end, limit, min_level, since, until) if limit else []
+        f.seek(end)
+    except BaseException:
+        f.close()
+        raise
+    return records, f
+
+
+@router.get("/admin/logs")
+def read_logs(
+    request: Request,
+    lines: int = Query(200, ge=1, le=TAIL_MAX_LINES),
+    level: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+):
+    """Return the last *lines* log records at *level* or above.
+
+    *since* and *until* limit the records to a time range; rotated log
+    files are searched too.
+    """
+    _require_admin(request)
+    min_level = _min_level(level)
     if not os.path.exists(LOG_FILE):
         return {"logs": ""}
-    with open(LOG_FILE) as f:
-        lines = f.readlines()
-    return {"logs": "".join(lines[-200:])}
+    records, f = _read_tail(lines, min_level, _timestamp(since), _timestamp(until))
+    f.close()
+    return {"logs": "".join(record + "\n" for record in records)}
+
+
+def _rotated(f) -> bool:
+    try:
+        return not os.path.samestat(os.stat(LOG_FILE), os.fstat(f.fileno()))
+    except FileNotFoundError:
+        # Between the rename and the first write to the new file
+        return False
+
+
+@router.get("/admin/logs/stream")
+async def stream_logs(
+    request: Request,
+    lines: int = Query(200, ge=0, le=TAIL_MAX_LINES),
+    level: str | None = None,
+):
+    """Stream log lines at *level* or above as they are written.
+
+    Starts with the last *lines* records. Each ``data`` event is a JSON
+    list of lines; records keep their traceback lines. Rotation is
+    followed, so the stream continues in the new file.
+    """
+    _require_admin(request)
+    min_level = _min_level(level)
+    if not os.path.exists(LOG_FILE):
+        raise HTTPException(status_code=404, detail="No log file")
+    backlog, f = await run_in_threadpool(_read_tail, lines, min_level)
+
+    async def follow():
+        nonlocal f
+        rest = b""
+        # Whether lines continuing the current record are sent
+        keep = min_level == 0
+        idle = 0.0
+        try:
+            if backlog:
+                backlog_lines = [line for record in backlog for line in record.split("\n")]
+                yield f"data: {json.dumps(backlog_lines)}\n\n"
+            while True:
+                data = await run_in_threadpool(f.read, TAIL_CHUNK)
+                if not data:
+                    if _rotated(f):
+                        # The old file is read to its end before switching
+                        f.close()
+                        f = open(LOG_FILE, "rb")
+                        continue
+                    idle += STREAM_POLL
+                    if idle >= STREAM_KEEPALIVE:
+                        idle = 0.0
+                        yield ": keepalive\n\n"
+                    await asyncio.sleep(STREAM_POLL)
+                    continue
+                idle = 0.0
+                *complete, rest = (rest + data).split(b"\n")
+                sent = []
+                for raw in complete:
+                    line = raw.decode("utf-8", "replace")
+                    match = _RECORD.match(line)
+                    if match:
+                        keep = LEVELS.get(match[2], 0) >= min_level
+                    if keep and line:
+                        sent.append(line)
+                if sent:
+                    yield f"data: {json.dumps(sent)}\n\n"
+        finally:
+            f.close()
+
+    return StreamingResponse(follow(), media_type="text/event-stream")
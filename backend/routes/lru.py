@@ -0,0 +1,64 @@
+# lru.py - Thread-safe LRU cache bounded by the size of its values
+from collections import OrderedDict
+from threading import Lock
+
+
+class SizedLRU:
+    """LRU mapping whose capacity is measured in bytes rather than entries.
+
+    *sizeof* returns the cost of a value and defaults to ``len``. Values
+    larger than the whole cache are not stored.
+    """
+
+    def __init__(self, max_bytes: int, sizeof=len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self.current_bytes -= self._data.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._data[key] = (value, size)
+            self.current_bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._data:
+            _, (_, size) = self._data.popitem(last=False)
+            self.current_bytes -= size
+
+    def resize(self, max_bytes: int):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def discard(self, predicate):
+        """Remove every entry whose key satisfies *predicate*."""
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                self.current_bytes -= self._data.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,237 @@
+# metrics.py - Low-overhead histograms and Prometheus text exposition
+import bisect
+import threading
+import time
+import weakref
+
+# Latency buckets in seconds, from sub-millisecond reads to slow LLM calls
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+# Histograms and collector functions rendered by ``render``
+REGISTRY = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def format_metric(name: str, kind: str, help: str, samples) -> list[str]:
+    """Return exposition lines for *samples* of ``(labels_dict, value)``."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+    return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_TIMER = _NoTimer()
+
+
+class Histogram:
+    """Histogram whose observations take no lock.
+
+    Every thread counts into its own cells and a scrape adds the cells of
+    all threads up, so a value may be a moment old but is never lost. Cells
+    of finished threads are folded into a shared total on the next scrape.
+
+    With *sample* above one, :meth:`time` only measures every *sample*-th
+    call of each thread, for paths too hot to time on every call.
+    """
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS, sample: int = 1):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.sample = sample
+        self._local = threading.local()
+        self._threads = []
+        self._retired = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _cells(self) -> dict:
+        cells = getattr(self._local, "cells", None)
+        if cells is None:
+            cells = self._local.cells = {}
+            self._local.calls = 0
+            # Registering a thread is the only step that takes the lock
+            with self._lock:
+                self._threads.append((weakref.ref(threading.current_thread()), cells))
+        return cells
+
+    def observe(self, value: float, *labels):
+        cells = self._cells()
+        cell = cells.get(labels)
+        if cell is None:
+            # One count per bucket and +Inf, then the sum and the count
+            cell = cells[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def time(self, *labels):
+        """Return a context manager that observes the duration of its block."""
+        if self.sample > 1:
+            self._cells()
+            self._local.calls += 1
+            if self._local.calls % self.sample:
+                return _NO_TIMER
+        return _Timer(self, labels)
+
+    def _merge(self, into: dict, cells: dict):
+        for labels, cell in cells.copy().items():
+            total = into.setdefault(labels, [0] * len(cell))
+            for i, value in enumerate(cell):
+                total[i] += value
+
+    def totals(self) -> dict:
+        """Return ``{labels: cell}`` summed over all threads.
+
+        A cell holds the count of each bucket and +Inf, then the sum and
+        the count of observations.
+        """
+        with self._lock:
+            live = []
+            for ref, cells in self._threads:
+                thread = ref()
+                if thread is None or not thread.is_alive():
+                    self._merge(self._retired, cells)
+                else:
+                    live.append((ref, cells))
+            self._threads = live
+            totals = {k: list(v) for k, v in self._retired.items()}
+        for _, cells in live:
+            self._merge(totals, cells)
+        return totals
+
+    def collect(self) -> list[str]:
+        totals = self.totals()
+        help = self.help + (f" (sampled 1 in {self.sample})" if self.sample > 1 else "")
+        lines = [f"# HELP {self.name} {help}", f"# TYPE {self.name} histogram"]
+        for labels in sorted(totals):
+            cell = totals[labels]
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), cell):
+                running += count
+                le = f'le="{_number(float(bound))}"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {running}"
+                )
+            tags = _labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{tags} {_number(cell[-2])}")
+            lines.append(f"{self.name}_count{tags} {cell[-1]}")
+        return lines
+
+
+def register(collector):
+    """Add a function returning exposition lines to every scrape."""
+    REGISTRY.append(collector)
+    return collector
+
+
+def render() -> str:
+    lines = []
+    for item in REGISTRY:
+        lines.extend(item.collect() if isinstance(item, Histogram) else item())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram(
+    "mnemo_http_request_duration_seconds",
+    "Time from receiving a request until its response body is complete",
+    labels=("route", "method", "status"),
+)
+FTS_QUERY_SECONDS = Histogram(
+    "mnemo_fts_query_seconds",
+    "Time spent in SQLite FTS queries against the search shards",
+    labels=("kind",),
+)
+ZIM_READ_SECONDS = Histogram(
+    "mnemo_zim_read_seconds",
+    "Time spent in libzim; lookup finds the entry, content reads and decompresses its cluster",
+    labels=("phase",),
+    sample=4,
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every request that matched a route.
+
+    The route template is used as label so paths of articles do not add
+    series. Streaming responses are timed until their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        state = {"status": 500, "done": False}
+
+        def record():
+            if state["done"]:
+                return
+            state["done"] = True
+            route = scope.get("route")
+            path = getattr(route, "path", None)
+            if path is not None:
+                REQUEST_SECONDS.observe(
+                    time.perf_counter() - start, path, scope["method"], state["status"]
+                )
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                record()
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            record()
@@ -0,0 +1,127 @@
+# metrics_routes.py - Prometheus scrape endpoint and scrape-time gauges
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+import anyio.from_thread
+import anyio.to_thread
+from routes import llm, pdf_export, search, translation_engine
+from routes.metrics import format_metric, register, render
+from routes.zim_loader import ARTICLE_CACHE, SCHEDULER, get_zim_metadata, index_progress
+
+router = APIRouter()
+
+CACHES = {
+    "article": ARTICLE_CACHE,
+    "translator": translation_engine.TRANSLATORS,
+    "search_cursor": search.SESSIONS,
+}
+
+EXECUTORS = {
+    "search": search._POOL,
+    "translate": translation_engine._POOL,
+    "pdf": pdf_export._POOL,
+}
+
+
+@register
+def cache_metrics() -> list[str]:
+    hits, misses, ratio, size, limit = [], [], [], [], []
+    for name, cache in CACHES.items():
+        label = {"cache": name}
+        lookups = cache.hits + cache.misses
+        hits.append((label, cache.hits))
+        misses.append((label, cache.misses))
+        ratio.append((label, cache.hits / lookups if lookups else 0.0))
+        size.append((label, cache.current_bytes))
+        limit.append((label, cache.max_bytes))
+    return (
+        format_metric("mnemo_cache_hits_total", "counter", "Cache lookups that found an entry", hits)
+        + format_metric("mnemo_cache_misses_total", "counter", "Cache lookups that missed", misses)
+        + format_metric("mnemo_cache_hit_ratio", "gauge", "Hits over lookups since start", ratio)
+        + format_metric("mnemo_cache_size_bytes", "gauge", "Cost of the cached entries", size)
+        + format_metric("mnemo_cache_capacity_bytes", "gauge", "Configured cache capacity", limit)
+    )
+
+
+def _executor_stats(pool) -> tuple[int, int, int]:
+    """Return ``(max_workers, busy, queued)`` of a ThreadPoolExecutor."""
+    threads = len(getattr(pool, "_threads", ()))
+    idle = getattr(getattr(pool, "_idle_semaphore", None), "_value", 0)
+    return pool._max_workers, max(threads - idle, 0), pool._work_queue.qsize()
+
+
+@register
+def pool_metrics() -> list[str]:
+    """Report how saturated the worker pools are.
+
+    ``anyio`` runs the synchronous routes, the scrape included, and its
+    limiter belongs to the event loop, so it is looked up from there.
+    """
+    stats = {name: _executor_stats(pool) for name, pool in EXECUTORS.items()}
+    limiter = anyio.from_thread.run_sync(anyio.to_thread.current_default_thread_limiter)
+    stats["anyio"] = (
+        int(limiter.total_tokens),
+        int(limiter.borrowed_tokens),
+        limiter.statistics().tasks_waiting,
+    )
+    if llm._LIMIT is not None:
+        size, semaphore = llm._LIMIT
+        stats["llm"] = (size, size - semaphore._value, len(semaphore._waiters or ()))
+    size, busy, queued = [], [], []
+    for name, (workers, active, waiting) in stats.items():
+        label = {"pool": name}
+        size.append((label, workers))
+        busy.append((label, active))
+        queued.append((label, waiting))
+    return (
+        format_metric("mnemo_pool_workers", "gauge", "Maximum concurrent tasks of a pool", size)
+        + format_metric("mnemo_pool_busy", "gauge", "Tasks currently running in a pool", busy)
+        + format_metric("mnemo_pool_queued", "gauge", "Tasks waiting for a free worker", queued)
+    )
+
+
+@register
+def index_metrics() -> list[str]:
+    articles = [
+        ({"zim": meta["file"]}, meta.get("count", 0)) for meta in get_zim_metadata()
+    ]
+    rows, progress, rate = [], [], []
+    for zim_name, info in index_progress().items():
+        label = {"zim": zim_name}
+        rows.append((label, info["rows"]))
+        done = (info["last_entry"] + 1) / info["entries"] if info["entries"] else 0.0
+        progress.append((label, min(done, 1.0)))
+        rate.append((label, info["rate"]))
+    index_jobs = {}
+    for job in SCHEDULER.snapshot():
+        index_jobs[job["state"]] = index_jobs.get(job["state"], 0) + 1
+    pdf_jobs = {}
+    for job in list(pdf_export.JOBS.values()):
+        pdf_jobs[job.status] = pdf_jobs.get(job.status, 0) + 1
+    return (
+        format_metric("mnemo_zim_articles", "gauge", "Articles searchable per archive", articles)
+        + format_metric("mnemo_index_rows", "gauge", "Rows written by running index builds", rows)
+        + format_metric("mnemo_index_progress_ratio", "gauge", "Share of entries scanned by running index builds", progress)
+        + format_metric("mnemo_index_rows_per_second", "gauge", "Indexing rate of running builds", rate)
+        + format_metric(
+            "mnemo_index_jobs", "gauge", "Index builds by state",
+            [({"state": state}, n) for state, n in sorted(index_jobs.items())],
+        )
+        + format_metric(
+            "mnemo_index_backoff_ratio", "gauge", "Idle time per second of work imposed on builds",
+            [({}, SCHEDULER.throttle)],
+        )
+        + format_metric(
+            "mnemo_pdf_jobs", "gauge", "PDF export jobs by status",
+            [({"status": status}, n) for status, n in sorted(pdf_jobs.items())],
+        )
+    )
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Expose server metrics in the Prometheus text format.
+
+    Collectors read the shard build checkpoints from disk, so the scrape
+    runs in the threadpool rather than on the event loop.
+    """
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,282 @@
+# pdf_export.py - Queued, disk-cached PDF rendering of ZIM articles
+import base64
+import hashlib
+import html
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from urllib.parse import unquote, urljoin
+import pdfkit
+from logger import logger
+
+PDF_CACHE_DIR = "./cache/pdf"
+# wkhtmltopdf is CPU bound, so keep half the cores for serving requests
+PDF_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+# Jobs that may wait or run at once before new exports are refused
+PDF_MAX_PENDING = 32
+# Seconds finished jobs stay available for status polling
+PDF_JOB_TTL = 3600
+PDF_OPTIONS = {
+    "quiet": "",
+    "encoding": "UTF-8",
+    "disable-javascript": "",
+    "disable-local-file-access": "",
+    # Nothing listens on the discard port, so any request that slips past
+    # inline_resources fails instead of reaching the network
+    "proxy": "http://127.0.0.1:9",
+    "load-error-handling": "ignore",
+    "load-media-error-handling": "ignore",
+}
+# Nesting of CSS @import rules followed when inlining stylesheets
+CSS_IMPORT_DEPTH = 4
+
+_POOL = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix="pdf")
+JOBS = {}
+_JOBS_LOCK = Lock()
+
+_SCRIPTS = re.compile(r"<script.*?>.*?</script>", re.DOTALL | re.IGNORECASE)
+# Embedded documents and plugins, removed with their fallback content
+_FRAMES = re.compile(
+    r"<(iframe|object|applet|frameset)\b.*?</\1\s*>", re.DOTALL | re.IGNORECASE
+)
+_STYLE_BLOCK = re.compile(r"(<style\b[^>]*>)(.*?)(</style\s*>)", re.DOTALL | re.IGNORECASE)
+_TAG = re.compile(r"<([a-zA-Z][^\s/>]*)([^>]*?)(/?)>")
+_ATTR = re.compile(
+    r"""(\s+)([^\s"'>/=]+)(?:(\s*=\s*)(?:"([^"]*)"|'([^']*)'|([^\s"'>]+)))?"""
+)
+# Elements that load a document or plugin, or change how URLs resolve
+_DROP_TAGS = {"iframe", "object", "embed", "frame", "frameset", "applet", "base"}
+# Attributes whose URL the renderer would fetch. href only loads
+# something on elements other than links.
+_FETCHED = {"src", "poster", "background", "data", "xlink:href", "href"}
+_LINKS = {"a", "area"}
+_CSS_URL = re.compile(r"""url\(\s*(["']?)(.*?)\1\s*\)""", re.DOTALL | re.IGNORECASE)
+_CSS_IMPORT = re.compile(
+    r"""@import\s+(?:url\(\s*)?(["']?)([^"')\s;]*)\1\s*\)?[^;]*;?""", re.IGNORECASE
+)
+
+
+class PdfQueueFull(Exception):
+    """Raised when too many PDF exports are already pending."""
+
+
+class PdfJob:
+    def __init__(self, job_id: str, zim_id: str, path: str, file_path: str):
+        self.id = job_id
+        self.zim_id = zim_id
+        self.path = path
+        self.file_path = file_path
+        self.status = "queued"
+        self.error = None
+        self.future = None
+        self.finished = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job": self.id,
+            "zim_id": self.zim_id,
+            "path": self.path,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+def pdf_key(meta: dict, path: str) -> str:
+    """Return the cache key of an article in a specific archive version."""
+    fingerprint = f"{meta.get('uuid')}:{meta.get('size')}:{path}"
+    return hashlib.blake2b(fingerprint.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _local_entry(reader, base: str, url: str):
+    """Return the ZIM entry a relative *url* on page *base* points to, or None."""
+    if not url or url.startswith(("data:", "#")):
+        return None
+    target = urljoin("/" + base, url)
+    if not target.startswith("/") or target.startswith("//"):
+        # Absolute URLs point outside the archive
+        return None
+    target = unquote(target.split("#")[0].split("?")[0]).lstrip("/")
+    entry = reader.get_entry(target)
+    if entry is None:
+        return None
+    try:
+        return entry.get_redirect_entry() if entry.is_redirect else entry
+    except Exception:
+        return None
+
+
+def _data_uri(reader, base: str, url: str) -> str | None:
+    """Return *url* as a ``data:`` URI of the archive item it names, or None."""
+    url = url.strip()
+    if url.startswith("data:"):
+        return url
+    entry = _local_entry(reader, base, url)
+    if entry is None:
+        return None
+    item = entry.get_item()
+    data = base64.b64encode(bytes(item.content)).decode("ascii")
+    return f"data:{item.mimetype};base64,{data}"
+
+
+def _inline_css(reader, base: str, css: str, depth: int = 0) -> str:
+    """Resolve the ``@import`` rules and ``url()`` references of *css*.
+
+    Imported stylesheets are inlined and other references become ``data:``
+    URIs, both relative to *base*; anything outside the archive is dropped.
+    """
+
+    def import_rule(match):
+        entry = _local_entry(reader, base, html.unescape(match.group(2)))
+        if entry is None or depth >= CSS_IMPORT_DEPTH:
+            return ""
+        imported = bytes(entry.get_item().content).decode("utf-8", "ignore")
+        return _inline_css(reader, entry.path, imported, depth + 1)
+
+    def url(match):
+        uri = _data_uri(reader, base, html.unescape(match.group(2)))
+        return f'url("{uri}")' if uri else "none"
+
+    return _CSS_URL.sub(url, _CSS_IMPORT.sub(import_rule, css))
+
+
+def inline_resources(reader, path: str, content: str) -> str:
+    """Embed everything an article loads from its archive.
+
+    Images, posters and other fetched attributes become ``data:`` URIs,
+    stylesheets inline ``<style>`` blocks, and CSS references in style
+    blocks and ``style`` attributes are resolved the same way. Frames,
+    plugins and ``srcset`` candidates are removed, and references that
+    cannot be resolved inside the archive are dropped, so the renderer
+    never goes to the network for them.
+    """
+
+    def tag(match):
+        name = match.group(1).lower()
+        if name in _DROP_TAGS:
+            return ""
+        attrs = [m.groups() for m in _ATTR.finditer(match.group(2))]
+        if name == "link":
+            rel = next((a[3] or a[4] or a[5] or "" for a in attrs if a[1].lower() == "rel"), "")
+            href = next((a[3] or a[4] or a[5] or "" for a in attrs if a[1].lower() == "href"), "")
+            entry = _local_entry(reader, path, html.unescape(href))
+            # Icons, preloads and other links would only be fetched
+            if "stylesheet" not in rel.lower().split() or entry is None:
+                return ""
+            css = bytes(entry.get_item().content).decode("utf-8", "ignore")
+            return f"<style>{_inline_css(reader, entry.path, css)}</style>"
+        out = []
+        for space, attr, equals, double, single, bare in attrs:
+            key = attr.lower()
+            value = html.unescape(double if double is not None else single or bare or "")
+            if key == "srcset":
+                continue
+            if key == "style":
+                value = _inline_css(reader, path, value)
+            elif key in _FETCHED and not (key == "href" and name in _LINKS):
+                value = _data_uri(reader, path, value)
+                if value is None:
+                    continue
+            elif equals is None:
+                out.append(f"{space}{attr}")
+                continue
+            out.append(f'{space}{attr}="{html.escape(value)}"')
+        return f"<{match.group(1)}{''.join(out)}{match.group(3)}>"
+
+    def style_block(match):
+        return match.group(1) + _inline_css(reader, path, match.group(2)) + match.group(3)
+
+    content = _SCRIPTS.sub("", content)
+    content = _FRAMES.sub("", content)
+    content = _TAG.sub(tag, content)
+    return _STYLE_BLOCK.sub(style_block, content)
+
+
+def _prune_cache(max_bytes: int):
+    """Delete the least recently used PDFs until the cache fits *max_bytes*."""
+    try:
+        files = [entry for entry in os.scandir(PDF_CACHE_DIR) if entry.name.endswith(".pdf")]
+    except FileNotFoundError:
+        return
+    stats = sorted(((f.stat().st_mtime, f.stat().st_size, f.path) for f in files))
+    total = sum(size for _, size, _ in stats)
+    for _, size, file_path in stats:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(file_path)
+            total -= size
+        except FileNotFoundError:
+            pass
+
+
+def _render(job: PdfJob, reader, cache_bytes: int):
+    job.status = "rendering"
+    start = time.monotonic()
+    tmp_path = job.file_path + ".tmp"
+    try:
+        article = reader.get_article(job.path)
+        if not article:
+            raise ValueError("Article not found")
+        page = inline_resources(reader, job.path, article.content or "")
+        # wkhtmltopdf writes straight to disk; the PDF is never held in memory
+        pdfkit.from_string(page, tmp_path, options=PDF_OPTIONS)
+        os.replace(tmp_path, job.file_path)
+        job.status = "done"
+        logger.info(
+            f"Rendered PDF of {job.zim_id}/{job.path} in {time.monotonic() - start:.1f}s"
+        )
+        _prune_cache(cache_bytes)
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        logger.error(f"PDF export of {job.zim_id}/{job.path} failed: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    finally:
+        job.finished = time.monotonic()
+
+
+def _expire_jobs():
+    """Forget finished jobs older than ``PDF_JOB_TTL``. Needs ``_JOBS_LOCK``."""
+    now = time.monotonic()
+    for job_id in [
+        k for k, job in JOBS.items()
+        if job.finished is not None and now - job.finished > PDF_JOB_TTL
+    ]:
+        del JOBS[job_id]
+
+
+def submit_pdf(reader, meta: dict, zim_id: str, path: str, cache_bytes: int) -> PdfJob:
+    """Return the export job of an article, queueing it if needed.
+
+    Jobs are identified by the cache key, so concurrent requests for the
+    same article share one render and cached PDFs need no render at all.
+    Raises :class:`PdfQueueFull` when ``PDF_MAX_PENDING`` jobs are waiting.
+    """
+    key = pdf_key(meta, path)
+    file_path = os.path.join(PDF_CACHE_DIR, f"{key}.pdf")
+    with _JOBS_LOCK:
+        _expire_jobs()
+        job = JOBS.get(key)
+        if job and job.status != "failed" and (
+            job.status != "done" or os.path.exists(file_path)
+        ):
+            return job
+        if os.path.exists(file_path):
+            job = JOBS[key] = PdfJob(key, zim_id, path, file_path)
+            job.status = "done"
+            job.finished = time.monotonic()
+            return job
+        pending = sum(1 for j in JOBS.values() if j.status in ("queued", "rendering"))
+        if pending >= PDF_MAX_PENDING:
+            raise PdfQueueFull()
+        job = JOBS[key] = PdfJob(key, zim_id, path, file_path)
+        os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+        job.future = _POOL.submit(_render, job, reader, cache_bytes)
+        return job
+
+
+def get_job(job_id: str) -> PdfJob | None:
+    return JOBS.get(job_id)
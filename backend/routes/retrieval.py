@@ -0,0 +1,179 @@
+# retrieval.py - Select article passages to ground LLM answers
+import math
+import re
+import sqlite3
+import time
+from collections import Counter
+from urllib.parse import quote
+from logger import logger
+from routes.html_text import html_to_text
+from routes.search import BACKENDS, search_targets
+from routes.zim_loader import get_article
+
+# Candidate articles fetched from the search indexes per question
+RAG_CANDIDATES = 8
+# Words per passage; passages are the unit that gets ranked and packed
+RAG_PASSAGE_WORDS = 120
+# Characters of plain text read from each candidate article
+RAG_ARTICLE_CHARS = 60000
+# Rough characters per token, used to fit passages into the budget
+CHARS_PER_TOKEN = 4
+
+_WORDS = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i in is it "
+    "of on or that the this to was what when where which who why will with "
+    "you your".split()
+)
+
+
+class Passage:
+    def __init__(self, zim_id: str, title: str, path: str, text: str, pinned: bool):
+        self.zim_id = zim_id
+        self.title = title
+        self.path = path
+        self.text = text
+        self.pinned = pinned
+        self.score = 0.0
+
+
+def query_terms(query: str) -> list[str]:
+    """Return the distinct lowercased content words of *query*."""
+    terms = []
+    for word in _WORDS.findall(query.lower()):
+        if len(word) > 1 and word not in _STOPWORDS and word not in terms:
+            terms.append(word)
+    return terms
+
+
+def _candidates(terms: list[str]) -> list[tuple[str, str, str]]:
+    """Return ``(zim_id, title, path)`` of the best matches across archives.
+
+    Terms are OR-ed so natural-language questions still match, and quoted
+    so punctuation cannot break the FTS5 query syntax.
+    """
+    fts_query = " OR ".join(f'"{term}"' for term in terms)
+    text_query = " ".join(terms)
+    hits = []
+    for zim_id, backend in search_targets():
+        q = fts_query if backend is BACKENDS["sqlite"] else text_query
+        try:
+            hits.extend(backend.search(zim_id, q, RAG_CANDIDATES))
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Retrieval query failed for {zim_id}: {e}")
+    hits.sort(key=lambda r: r["score"])
+    return [(r["zim_id"], r["title"], r["path"]) for r in hits[:RAG_CANDIDATES]]
+
+
+def _passages(zim_id: str, path: str, pinned: bool) -> list[Passage]:
+    """Split the plain text of an article into fixed-size word windows."""
+    article = get_article(zim_id, path)
+    if not article:
+        return []
+    words = html_to_text(article.content, RAG_ARTICLE_CHARS).split()
+    return [
+        Passage(
+            zim_id,
+            article.title,
+            path,
+            " ".join(words[i : i + RAG_PASSAGE_WORDS]),
+            pinned,
+        )
+        for i in range(0, len(words), RAG_PASSAGE_WORDS)
+    ]
+
+
+def _rank(passages: list[Passage], terms: list[str]):
+    """Score passages with BM25 over the candidate set, in place.
+
+    Passages of the article the user is reading get a boost so they win
+    ties against related articles.
+    """
+    k1, b = 1.2, 0.75
+    counts = [Counter(_WORDS.findall(p.text.lower())) for p in passages]
+    lengths = [sum(c.values()) for c in counts]
+    avg_len = sum(lengths) / len(lengths)
+    n = len(passages)
+    for term in terms:
+        df = sum(1 for c in counts if term in c)
+        if not df:
+            continue
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for passage, c, length in zip(passages, counts, lengths):
+            tf = c.get(term, 0)
+            if tf:
+                passage.score += idf * tf * (k1 + 1) / (
+                    tf + k1 * (1 - b + b * length / avg_len)
+                )
+    for passage in passages:
+        if passage.pinned:
+            passage.score = passage.score * 1.5 + 0.1
+
+
+def retrieve(
+    query: str,
+    max_tokens: int,
+    max_chunks: int,
+    zim_id: str | None = None,
+    path: str | None = None,
+) -> tuple[str, list[dict]]:
+    """Return prompt context for *query* and the articles it came from.
+
+    Candidates come from the search indexes of all loaded archives plus
+    the article at *zim_id*/*path* if given. Their text is split into
+    passages, ranked against the query and the best *max_chunks* are
+    packed until *max_tokens* (estimated) is reached.
+    """
+    start = time.monotonic()
+    terms = query_terms(query)
+    candidates = _candidates(terms) if terms else []
+    if zim_id and path:
+        candidates = [(zim_id, "", path)] + [
+            c for c in candidates if (c[0], c[2]) != (zim_id, path)
+        ]
+
+    passages = []
+    for cand_zim, _, cand_path in candidates:
+        pinned = (cand_zim, cand_path) == (zim_id, path)
+        passages.extend(_passages(cand_zim, cand_path, pinned))
+    if not passages:
+        return "", []
+    _rank(passages, terms)
+
+    budget = max_tokens * CHARS_PER_TOKEN
+    chosen = []
+    for passage in sorted(passages, key=lambda p: p.score, reverse=True):
+        if len(chosen) >= max_chunks:
+            break
+        if passage.score <= 0 and not passage.pinned:
+            break
+        if len(passage.text) > budget:
+            continue
+        chosen.append(passage)
+        budget -= len(passage.text)
+
+    # Sources are numbered in order of their best passage
+    numbers = {}
+    sources = []
+    blocks = []
+    for passage in chosen:
+        key = (passage.zim_id, passage.path)
+        if key not in numbers:
+            numbers[key] = len(sources) + 1
+            sources.append(
+                {
+                    "zim_id": passage.zim_id,
+                    "path": passage.path,
+                    "title": passage.title,
+                    "url": f"/article/{passage.zim_id}/{quote(passage.path)}",
+                }
+            )
+        blocks.append(f"[{numbers[key]}] {passage.title}\n{passage.text}")
+
+    context = "\n\n".join(blocks)
+    logger.info(
+        f"Retrieved {len(chosen)} passages from {len(sources)} articles "
+        f"(~{len(context) // CHARS_PER_TOKEN} tokens) in "
+        f"{time.monotonic() - start:.2f}s"
+    )
+    return context, sources
@@ -0,0 +1,196 @@
+# sanitizer.py - Single-pass HTML sanitizer for ZIM article pages
+import html
+import re
+from urllib.parse import quote, urljoin
+
+# Part of the cache key and ETag of sanitized pages. Bump it whenever the
+# output for a page changes, so neither the article cache nor revalidating
+# browsers keep pages cleaned by older rules.
+SANITIZER_VERSION = 2
+# Quotes only delimit a value right after "="; elsewhere, as in an unquoted
+# value like it's, they are ordinary characters. Every branch starts with a
+# different character and is possessive, so matching never backtracks.
+_ATTRS = r"""(?:[^>"'=]++|=\s*+(?:"[^"]*+"|'[^']*+'|[^\s>"'][^\s>]*+)?|["'])*+"""
+# Elements removed together with everything inside them
+_DROP_CONTENT = {"script", "iframe", "object", "frameset", "noembed"}
+# Elements removed on their own; SVG animations could set an href to a
+# javascript: URL after sanitizing
+_DROP_TAGS = {"base", "embed", "frame", "applet", "animate", "set"}
+# Elements whose content is raw text that must not be tokenized
+_RAW_TEXT = {"style", "textarea", "xmp"}
+# Tags that come through unchanged when they have no attributes but simple
+# presentational ones. The token pattern skips them, so the most common
+# tags cost no Python call.
+_PLAIN = (
+    "a", "abbr", "b", "blockquote", "body", "br", "caption", "center", "cite",
+    "code", "dd", "div", "dl", "dt", "em", "figcaption", "figure", "h1", "h2",
+    "h3", "h4", "h5", "h6", "head", "hr", "html", "i", "li", "ol", "p", "pre",
+    "s", "section", "small", "span", "strong", "sub", "sup", "table", "tbody",
+    "td", "tfoot", "th", "thead", "title", "tr", "u", "ul",
+)
+
+
+def _choice(words) -> str:
+    """Return a pattern matching any of *words*, grouped by first letter so
+    the engine rules out most words with one comparison."""
+    groups = {}
+    for word in sorted(words, key=len, reverse=True):
+        groups.setdefault(word[0], []).append(re.escape(word[1:]))
+    return "(?:" + "|".join(f"{first}(?:{'|'.join(rest)})" for first, rest in groups.items()) + ")"
+
+
+_PLAIN_ATTRS = r"""(?:\s+(?:align|class|colspan|dir|id|lang|rowspan|title)="[^"<>&]*+")*+"""
+# Links to a plain relative path, the bulk of the tags on article pages,
+# are also skipped and then rewritten by _PLAIN_LINK with a template. The
+# path has no scheme, dot segment, entity or quote, and no tag rebuilt by
+# the tokenizer has this form, since those hrefs are absolute or empty.
+_PLAIN_HREF = r"""[^"<>&\s:/?.#](?:[^"<>&\s:/]|/(?!\.))*+"""
+_PLAIN_LINK = re.compile(rf"""<a href="({_PLAIN_HREF})">""")
+# One token per other "<": a comment, a doctype or other declaration, a
+# dropped element with its content, a raw text element up to its end tag,
+# a start or end tag, or else a lone "<", which is escaped. A tag left open
+# at the end of the page is dropped, as browsers do, rather than searched
+# again from every later "<". Browsers end raw text at "</name" followed
+# by a space, "/" or ">", so the same ends it here.
+_TOKEN = re.compile(
+    rf"""<(?!/?{_choice(_PLAIN)}{_PLAIN_ATTRS}>|(?-i:a\ href="{_PLAIN_HREF}">))(?:
+    (?P<comment>!--(?:-?>|.*?--!?>|.*))
+    | (?P<decl>[!?][^>]*+>?)
+    | (?P<drop>{"|".join(sorted(_DROP_CONTENT))})(?![^\s/>]){_ATTRS}>
+      .*?(?:</(?P=drop)(?![^\s/>])[^>]*+>?|\Z)
+    | (?P<raw>{"|".join(sorted(_RAW_TEXT))})(?![^\s/>])(?P<rawattrs>{_ATTRS})>
+      (?P<text>.*?)(?=</(?P=raw)(?![^\s/>])|\Z)
+    | (?P<close>/?)(?P<name>[a-zA-Z][^\s/>]*+)(?P<attrs>{_ATTRS})(?:>|\Z)
+    )?""",
+    re.IGNORECASE | re.DOTALL | re.VERBOSE,
+)
+_NAME = re.compile(r"[a-z][a-z0-9:-]*")
+_ATTR = re.compile(r"""([^\s"'>/=]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>][^\s>]*)))?""")
+_SCHEME = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:")
+# Browsers ignore control characters and whitespace inside a URL scheme
+_SCHEME_NOISE = re.compile(r"[\x00-\x20]+")
+
+_URL_ATTRS = {"href", "src", "action", "formaction", "poster", "background", "cite", "xlink:href"}
+_UNSAFE_SCHEMES = ("javascript:", "vbscript:", "data:text/html")
+
+
+def _is_unsafe(value: str) -> bool:
+    return _SCHEME_NOISE.sub("", value).lower().startswith(_UNSAFE_SCHEMES)
+
+
+def _rewrite(url: str, route: str, zim_id: str, base: str) -> str:
+    """Point a relative *url* on page *base* at our article or resource route."""
+    stripped = url.strip()
+    if not stripped or stripped.startswith("#") or stripped.startswith("//"):
+        return url
+    if _SCHEME.match(stripped):
+        return url
+    if stripped[0] not in "/?." and "/." not in stripped:
+        # A plain relative path, the usual case, joins without urljoin
+        folder = base.rpartition("/")[0]
+        joined = f"/{folder}/{stripped}" if folder else f"/{stripped}"
+    else:
+        joined = urljoin("/" + base, stripped)
+    return f"/{route}/{quote(zim_id)}{joined}"
+
+
+def _rewrite_srcset(value: str, zim_id: str, base: str) -> str:
+    candidates = []
+    for candidate in value.split(","):
+        parts = candidate.strip().split(None, 1)
+        if not parts:
+            continue
+        parts[0] = _rewrite(parts[0], "resource", zim_id, base)
+        candidates.append(" ".join(parts))
+    return ", ".join(candidates)
+
+
+def _start_tag(name: str, attrs: str, zim_id: str, base: str) -> str:
+    """Rebuild a start tag keeping only safe attributes."""
+    self_closing = attrs.rstrip().endswith("/")
+    out = [f"<{name}"]
+    seen = set()
+    for match in _ATTR.finditer(attrs.rstrip("/ \t\r\n")):
+        attr = match.group(1).lower()
+        if attr.startswith("on") or attr in seen:
+            continue
+        seen.add(attr)
+        raw = next((g for g in match.group(2, 3, 4) if g is not None), None)
+        if raw is None:
+            out.append(f" {attr}")
+            continue
+        value = html.unescape(raw) if "&" in raw else raw
+        if attr in _URL_ATTRS:
+            if _is_unsafe(value):
+                continue
+            route = "article" if name in ("a", "area") and attr == "href" else "resource"
+            value = _rewrite(value, route, zim_id, base)
+        elif attr == "srcset":
+            value = _rewrite_srcset(value, zim_id, base)
+        elif attr == "style" and ("expression(" in value.lower() or _is_unsafe(value)):
+            continue
+        out.append(f' {attr}="{html.escape(value)}"')
+    if name == "img":
+        # Let the browser defer off-screen images on long pages
+        if "loading" not in seen:
+            out.append(' loading="lazy"')
+        if "decoding" not in seen:
+            out.append(' decoding="async"')
+    out.append(" />" if self_closing else ">")
+    return "".join(out)
+
+
+def _tag(closing: str, name: str, attrs: str, zim_id: str, base: str) -> str:
+    """Return the safe form of a start or end tag, or "" to drop it."""
+    name = name.lower()
+    if not _NAME.fullmatch(name) or name in _DROP_TAGS or name in _DROP_CONTENT:
+        # Stray end tags of dropped elements go too
+        return ""
+    if closing:
+        return f"</{name}>"
+    if name == "meta" and "http-equiv" in attrs.lower():
+        # Refresh and similar directives could redirect the page
+        return ""
+    return _start_tag(name, attrs, zim_id, base)
+
+
+def sanitize_html(content: str, zim_id: str, path: str) -> str:
+    """Return a safe copy of an article page for serving from our routes.
+
+    The page is tokenized once: scripts, frames and plugin elements are
+    removed, ``on*`` handlers and ``javascript:`` URLs are stripped,
+    relative links are rewritten to ``/article`` and embedded resources to
+    ``/resource``, and images are marked for lazy loading. Every tag is
+    rebuilt from its parsed attributes and a ``<`` that does not start a
+    complete tag is escaped, so no markup reaches the page unchecked. The
+    result depends only on the article, so callers should cache it.
+    """
+    # Pages repeat most of their tags, which are rebuilt only once
+    tags = {}
+
+    def token(match):
+        name = match["name"]
+        if name is not None:
+            source = match[0]
+            out = tags.get(source)
+            if out is None and source[-1] != ">":
+                out = ""
+            elif out is None:
+                out = tags[source] = _tag(match["close"], name, match["attrs"], zim_id, path)
+            return out
+        raw = match["raw"]
+        if raw is not None:
+            start = _start_tag(raw.lower(), match["rawattrs"], zim_id, path)
+            return start + match["text"].replace("<", "&lt;")
+        decl = match["decl"]
+        if decl is not None:
+            return "<" + decl if decl[:8].lower() == "!doctype" else ""
+        if match["comment"] is not None or match["drop"] is not None:
+            # Comments can hide conditional markup, so they are dropped
+            return ""
+        return "&lt;"
+
+    folder = path.rpartition("/")[0]
+    prefix = html.escape(f"/article/{quote(zim_id)}/{folder + '/' if folder else ''}")
+    link = '<a href="%s\\1">' % prefix.replace("\\", "\\\\")
+    return _PLAIN_LINK.sub(link, _TOKEN.sub(token, content))
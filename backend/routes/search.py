@@ -1,74 +1,404 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import StreamingResponse
+import os
+import re
+import secrets
 import sqlite3
 import json
+import html
+import heapq
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
 from logger import logger
-from routes.zim_loader import FTS_DB_PATH, get_zim_metadata
+from routes.fts_pool import READ_POOL
+from routes.lru import SizedLRU
+from routes.metrics import FTS_QUERY_SECONDS
+from routes.zim_loader import get_reader, get_zim_metadata, normalize_key, shard_path
 
 router = APIRouter()
 
-@router.get("/search")
-def search_articles(q: str = Query(..., min_length=1)):
-    try:
-        # Allow queries to wait briefly if the index is being updated
-        with sqlite3.connect(FTS_DB_PATH, timeout=30) as conn:
-            conn.execute("PRAGMA journal_mode=WAL")
-            conn.row_factory = sqlite3.Row
-            cur = conn.cursor()
-            cur.execute(
-                """
-            SELECT zim_id, title, path
-            FROM articles
-            WHERE articles MATCH ?
-            LIMIT 50
-            """,
-                (q,),
-            )
-            rows = cur.fetchall()
-    except sqlite3.OperationalError as e:
-        logger.warning(f"Search query failed: {e}")
-        return {"results": []}
+SEARCH_LIMIT = 50
+SUGGEST_LIMIT = 10
+# libzim suggestions read per archive; its title index also matches words
+# inside titles, which are filtered out
+SUGGEST_SCAN = 200
+# Shards queried at once. SQLite and libzim release the GIL while
+# searching, so shard queries overlap even on few cores.
+SEARCH_WORKERS = min(16, (os.cpu_count() or 1) * 4)
+# Bytes of buffered hits kept for result cursors
+SEARCH_SESSION_BYTES = 32 * 1024 * 1024
+
+# Kept as a constant so pooled connections reuse the prepared statement
+SHARD_QUERY = """
+    SELECT title, path,
+           snippet(articles, 2, ?, ?, '…', 16) AS snippet
+    FROM articles
+    WHERE articles MATCH ?
+    ORDER BY rank
+    LIMIT ? OFFSET ?
+"""
+
+SUGGEST_QUERY = """
+    SELECT key, title, path FROM titles
+    WHERE key >= ? AND key < ?
+    ORDER BY key
+    LIMIT ?
+"""
+
+# Private-use markers delimit snippet matches until the text is escaped
+_MARK_OPEN = "\ue000"
+_MARK_CLOSE = "\ue001"
+
+
+def rank_score(rank: int) -> float:
+    """Return the score of the hit at 0-based *rank* within its archive.
+
+    BM25 values depend on each shard's term statistics and libzim exposes
+    no weights at all, so archives are merged by reciprocal rank instead:
+    lower is better and the n-th hit of every archive scores the same.
+    """
+    return -1.0 / (rank + 1)
+
+
+def shard_query_args(q: str, limit: int = SEARCH_LIMIT, offset: int = 0) -> tuple:
+    """Return the parameters of ``SHARD_QUERY`` for a page of hits."""
+    return _MARK_OPEN, _MARK_CLOSE, q, limit, offset
 
-    return {
-        "results": [
+
+def _format_snippet(raw: str | None) -> str:
+    """HTML-escape a snippet and wrap its matches in ``<mark>`` tags."""
+    if not raw:
+        return ""
+    escaped = html.escape(raw)
+    return escaped.replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+
+
+class SqliteBackend:
+    """Search an archive through its FTS5 shard database."""
+
+    name = "sqlite"
+
+    def search(
+        self, zim_id: str, q: str, limit: int = SEARCH_LIMIT, offset: int = 0
+    ) -> list[dict]:
+        """Run a BM25-ranked FTS MATCH query against the shard of one archive."""
+        with READ_POOL.connection(shard_path(zim_id)) as conn, FTS_QUERY_SECONDS.time("search"):
+            rows = conn.execute(SHARD_QUERY, shard_query_args(q, limit, offset)).fetchall()
+        return [
             {
-                "zim_id": row["zim_id"],
+                "zim_id": zim_id,
                 "title": row["title"],
                 "path": row["path"],
+                "score": rank_score(rank),
+                "snippet": _format_snippet(row["snippet"]),
+            }
+            for rank, row in enumerate(rows, offset)
+        ]
+
+    def suggest(self, zim_id: str, prefix: str, limit: int = SUGGEST_LIMIT) -> list[tuple]:
+        """Return ``(key, zim_id, title, path)`` rows whose key starts with *prefix*."""
+        with READ_POOL.connection(shard_path(zim_id)) as conn, FTS_QUERY_SECONDS.time("suggest"):
+            rows = conn.execute(
+                SUGGEST_QUERY, (prefix, prefix + "\U0010ffff", limit)
+            ).fetchall()
+        return [(row["key"], zim_id, row["title"], row["path"]) for row in rows]
+
+
+class LibzimBackend:
+    """Search an archive through the Xapian indexes embedded in the ZIM."""
+
+    name = "libzim"
+
+    def search(
+        self, zim_id: str, q: str, limit: int = SEARCH_LIMIT, offset: int = 0
+    ) -> list[dict]:
+        """Query the archive's embedded index, ranked by Xapian."""
+        reader = get_reader(zim_id)
+        if not reader:
+            return []
+        return [
+            {
+                "zim_id": zim_id,
+                "title": title,
+                "path": path,
+                "score": rank_score(rank),
+                "snippet": "",
             }
-            for row in rows
+            for rank, (title, path) in enumerate(reader.search(q, limit, offset), offset)
         ]
-    }
+
+    def suggest(self, zim_id: str, prefix: str, limit: int = SUGGEST_LIMIT) -> list[tuple]:
+        """Return ``(key, zim_id, title, path)`` rows whose key starts with *prefix*.
+
+        Rows are in the order of the SQLite backend, by key and then path.
+        """
+        reader = get_reader(zim_id)
+        if not reader:
+            return []
+        rows = []
+        for title, path in reader.suggest(prefix, max(limit, SUGGEST_SCAN)):
+            key = normalize_key(title)
+            if key.startswith(prefix):
+                rows.append((key, zim_id, title, path))
+        rows.sort(key=_suggest_order)
+        return rows[:limit]
+
+
+def _suggest_order(row: tuple) -> tuple:
+    """Order of suggestion rows, as in the primary key of a shard's titles."""
+    return row[0], row[3]
+
+
+BACKENDS = {backend.name: backend for backend in (SqliteBackend(), LibzimBackend())}
+
+
+def search_targets() -> list[tuple[str, object]]:
+    """Return ``(zim_id, backend)`` for every loaded archive that can be searched."""
+    targets = []
+    for meta in get_zim_metadata():
+        zim_id = meta["file"]
+        if meta.get("search") == "libzim":
+            targets.append((zim_id, BACKENDS["libzim"]))
+        elif os.path.exists(shard_path(zim_id)):
+            targets.append((zim_id, BACKENDS["sqlite"]))
+    return targets
+
+
+_POOL = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+_TERMS = re.compile(r"\w+")
+# FTS5 query syntax words that are not search terms
+_OPERATORS = {"and", "or", "not", "near"}
+
+
+class _Shard:
+    """Buffered hits of one archive within a search session."""
+
+    def __init__(self, index: int, zim_id: str, backend):
+        self.index = index
+        self.zim_id = zim_id
+        self.backend = backend
+        self.buffer = deque()
+        self.fetched = 0
+        self.done = False
+        self.future = None
+
+
+def _order(hit: dict) -> tuple:
+    """Merge order of hits: by score, then archive, then rank in the archive.
+
+    Hits of different archives often tie on score, so both the streamed
+    first page and the pages taken from the buffers break ties this way.
+    """
+    return hit["score"], hit["shard"], hit["rank"]
+
+
+class SearchSession:
+    """Results of one query merged across every searchable archive.
+
+    Each archive keeps a buffer of its hits in score order. Pages are taken
+    by merging the buffers, and a buffer that runs dry is refilled with the
+    archive's next hits, so later pages continue the same ranking without
+    running the query on every archive again.
+    """
+
+    def __init__(self, q: str, limit: int = SEARCH_LIMIT):
+        self.id = secrets.token_urlsafe(16)
+        self.q = q
+        self.limit = limit
+        self.terms = [
+            t for t in _TERMS.findall(normalize_key(q)) if t not in _OPERATORS
+        ]
+        self.shards = [
+            _Shard(index, zim_id, backend)
+            for index, (zim_id, backend) in enumerate(search_targets())
+        ]
+        self.lock = Lock()
+
+    def _submit(self, shard: _Shard):
+        if shard.future is None:
+            shard.future = _POOL.submit(
+                shard.backend.search, shard.zim_id, self.q, self.limit, shard.fetched
+            )
+        return shard.future
+
+    def _settle(self, shard: _Shard):
+        """Wait for the query of *shard* and buffer its hits."""
+        future, shard.future = shard.future, None
+        try:
+            hits = future.result()
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Search query failed on {shard.zim_id}: {e}")
+            hits = []
+        for rank, hit in enumerate(hits, shard.fetched):
+            hit["shard"] = shard.index
+            hit["rank"] = rank
+        shard.buffer.extend(hits)
+        shard.fetched += len(hits)
+        shard.done = len(hits) < self.limit
+
+    def _refill(self, shards: list[_Shard]):
+        for shard in shards:
+            self._submit(shard)
+        for shard in shards:
+            self._settle(shard)
+
+    def _take(self, shards: list[_Shard]) -> list[dict]:
+        """Merge the next page out of the buffers of *shards*."""
+        page = []
+        while len(page) < self.limit:
+            live = [s for s in shards if s.buffer]
+            if not live:
+                break
+            best = min(live, key=lambda s: _order(s.buffer[0]))
+            page.append(best.buffer.popleft())
+            if not best.buffer and not best.done:
+                self._refill([best])
+        return page
+
+    def _is_strong(self, hit: dict) -> bool:
+        """Return whether the title of *hit* contains every query term."""
+        title = normalize_key(hit["title"])
+        return bool(self.terms) and all(t in title for t in self.terms)
+
+    def next_page(self) -> list[dict]:
+        """Query the archives that need it concurrently and return a page."""
+        with self.lock:
+            self._refill([
+                s for s in self.shards
+                if s.future is not None or (not s.buffer and not s.done)
+            ])
+            return self._take(self.shards)
+
+    def stream(self):
+        """Yield first-page hits as archives answer.
+
+        A hit is yielded when it enters the running top ``limit``, so the
+        best matches of a fast archive show up before slow archives finish.
+        Once ``limit`` hits whose titles contain every query term are in,
+        archives still waiting for a worker are skipped and their hits
+        move to later pages. The first page is consumed from the session.
+        """
+        with self.lock:
+            futures = {self._submit(shard): shard for shard in self.shards}
+            pending = set(futures)
+            top = []
+            strong = 0
+            try:
+                while pending and strong < self.limit:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        shard = futures[future]
+                        self._settle(shard)
+                        for hit in shard.buffer:
+                            # A max-heap of the running top, by merge order
+                            key = tuple(-k for k in _order(hit))
+                            if len(top) < self.limit:
+                                heapq.heappush(top, key)
+                            elif key > top[0]:
+                                heapq.heapreplace(top, key)
+                            else:
+                                break
+                            strong += self._is_strong(hit)
+                            yield hit
+            finally:
+                for future in pending:
+                    if future.cancel():
+                        futures[future].future = None
+            self._take([s for s in self.shards if s.future is None])
+
+    def exhausted(self) -> bool:
+        return all(s.done and not s.buffer and s.future is None for s in self.shards)
+
+    def size(self) -> int:
+        """Approximate bytes held by the buffered hits."""
+        return sum(
+            200 + len(h["title"]) + len(h["path"]) + len(h["snippet"])
+            for s in self.shards
+            for h in s.buffer
+        )
+
+
+# Sessions of recent queries keyed by their cursor
+SESSIONS = SizedLRU(SEARCH_SESSION_BYTES, sizeof=lambda session: session.size())
+
+
+def _keep(session: SearchSession) -> str | None:
+    """Store *session* and return its cursor, or None once it is exhausted."""
+    if session.exhausted():
+        SESSIONS.discard(lambda key: key == session.id)
+        return None
+    # Storing again updates the size of the session's buffers
+    SESSIONS.put(session.id, session)
+    return session.id
+
+
+@router.get("/search")
+def search_articles(
+    q: str | None = Query(None, min_length=1),
+    cursor: str | None = None,
+    limit: int = Query(SEARCH_LIMIT, ge=1, le=200),
+):
+    """Return a page of hits merged across archives by score.
+
+    Pass the returned ``cursor`` instead of *q* to get the next page.
+    """
+    if cursor:
+        session = SESSIONS.get(cursor)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Search cursor expired")
+    elif q:
+        session = SearchSession(q, limit)
+    else:
+        raise HTTPException(status_code=400, detail="Missing query")
+    results = session.next_page()
+    return {"results": results, "cursor": _keep(session)}
 
 
 @router.get("/search/stream")
-def search_stream(q: str = Query(..., min_length=1)):
-    """Yield search results sequentially for each ZIM archive."""
+def search_stream(
+    q: str = Query(..., min_length=1), limit: int = Query(SEARCH_LIMIT, ge=1, le=200)
+):
+    """Stream first-page hits from all archives as they answer.
+
+    Each ``data`` event is a hit that entered the running top *limit*;
+    clients keep hits sorted by score, ``shard`` and ``rank`` and trimmed
+    to *limit*. The ``end`` event carries the cursor for ``/search``, or
+    null when nothing is left.
+    """
+    session = SearchSession(q, limit)
 
     def generate():
+        for hit in session.stream():
+            yield f"data: {json.dumps(hit)}\n\n"
+        cursor = _keep(session)
+        yield f"event: end\ndata: {json.dumps({'cursor': cursor})}\n\n"
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
+
+
+@router.get("/search/suggest")
+def search_suggest(
+    q: str = Query(..., min_length=1), limit: int = Query(SUGGEST_LIMIT, ge=1, le=50)
+):
+    """Return titles starting with *q* across all loaded archives.
+
+    Each shard keeps its titles sorted by normalized key, so a lookup is a
+    short B-tree range scan and the per-archive lists merge in order.
+    """
+    prefix = normalize_key(q)
+    if not prefix:
+        return {"suggestions": []}
+    per_zim = []
+    for zim, backend in search_targets():
         try:
-            conn = sqlite3.connect(FTS_DB_PATH, timeout=30)
-            conn.execute("PRAGMA journal_mode=WAL")
-            conn.row_factory = sqlite3.Row
-            cur = conn.cursor()
-            zims = [m["file"] for m in get_zim_metadata()]
-            for zim in zims:
-                cur.execute(
-                    "SELECT zim_id, title, path FROM articles WHERE zim_id=? AND articles MATCH ? LIMIT 50",
-                    (zim, q),
-                )
-                for row in cur.fetchall():
-                    data = {
-                        "zim_id": row["zim_id"],
-                        "title": row["title"],
-                        "path": row["path"],
-                    }
-                    yield f"data: {json.dumps(data)}\n\n"
+            per_zim.append(backend.suggest(zim, prefix, limit))
         except sqlite3.OperationalError as e:
-            logger.warning(f"Search query failed: {e}")
-        finally:
-            yield "event: end\ndata: done\n\n"
-            if 'conn' in locals():
-                conn.close()
+            logger.warning(f"Suggest query failed on {zim}: {e}")
 
-    return StreamingResponse(generate(), media_type="text/event-stream")
+    suggestions = []
+    for _, zim_id, title, path in heapq.merge(*per_zim, key=_suggest_order):
+        suggestions.append({"zim_id": zim_id, "title": title, "path": path})
+        if len(suggestions) >= limit:
+            break
+    return {"suggestions": suggestions}
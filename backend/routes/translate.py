@@ -1,11 +1,32 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import re
+from collections import deque
+from functools import partial
+import asyncio
+import json
 import argostranslate.package, argostranslate.translate
-from langdetect import detect, LangDetectException
-from routes.zim_loader import get_article
+from logger import logger
+from routes.config import load_config
+from routes.html_text import html_to_text
+from routes.languages import detect_language, single_language
+from routes.translation_engine import (
+    SEGMENTS,
+    TRANSLATE_WORKERS,
+    TRANSLATORS,
+    get_translator,
+    has_text,
+    split_blocks,
+    submit_block,
+    translate_html,
+)
+from routes.zim_loader import get_article, get_article_meta, get_reader
 
 router = APIRouter()
+
+# Blocks translated ahead of the one being streamed
+STREAM_AHEAD = TRANSLATE_WORKERS * 2
 
 class TranslateRequest(BaseModel):
     text: str
@@ -31,14 +52,30 @@ def list_models():
         for t in lang.translations
     ]
 
+def _translator(from_code: str, to_code: str):
+    TRANSLATORS.resize(int(load_config().get("translation_cache_mb", 1024)) * 1024 * 1024)
+    return get_translator(from_code, to_code)
+
+def _source_language(zim_id: str, path: str, content: str) -> str:
+    """Return the language of an article, detecting it only as a last resort.
+
+    Single-language archives use their ``Language`` metadata and indexed
+    articles the language stored in their shard; other articles are
+    detected from a sample of their text.
+    """
+    reader = get_reader(zim_id)
+    lang = single_language(reader.language) if reader else None
+    if lang:
+        return lang
+    meta = get_article_meta(zim_id, path)
+    if meta and meta["lang"]:
+        return meta["lang"]
+    return detect_language(html_to_text(content))
+
 @router.post("/translate")
 def translate(req: TranslateRequest):
-    installed_languages = argostranslate.translate.get_installed_languages()
-    from_lang = next((l for l in installed_languages if l.code == req.from_lang), None)
-    to_lang = next((l for l in installed_languages if l.code == req.to_lang), None)
-
-    if from_lang and to_lang:
-        translation = from_lang.get_translation(to_lang)
+    translation = _translator(req.from_lang, req.to_lang)
+    if translation:
         translated_text = translation.translate(req.text)
         return {"translated": translated_text}
     else:
@@ -51,19 +88,88 @@ def translate_article(req: TranslateArticleRequest):
     if not article:
         return {"error": "Article not found"}
 
-    text = re.sub("<[^>]+>", " ", article.content or "")
-    try:
-        detected = detect(text)
-    except LangDetectException:
-        detected = "en"
-
-    installed_languages = argostranslate.translate.get_installed_languages()
-    from_lang = next((l for l in installed_languages if l.code == detected), None)
-    to_lang = next((l for l in installed_languages if l.code == req.to_lang), None)
-
-    if from_lang and to_lang:
-        translation = from_lang.get_translation(to_lang)
-        translated_text = translation.translate(text)
-        return {"translated": translated_text}
+    detected = _source_language(req.zim_id, req.path, article.content or "")
+    translation = _translator(detected, req.to_lang)
+    if translation:
+        # Markup is kept and only text nodes are translated
+        translated_html = translate_html(
+            article.content or "", translation, req.zim_id, req.path, req.to_lang
+        )
+        return {"translated": translated_html}
     else:
         return {"error": "Translation language pair not found"}
+
+
+def _save_segments(zim_id: str, path: str, to_lang: str, future):
+    if future.exception() is None:
+        SEGMENTS.save(zim_id, path, to_lang, future.result()[1])
+
+
+def _prepare_stream(zim_id: str, path: str, to_lang: str):
+    article = get_article(zim_id, path)
+    if not article:
+        raise HTTPException(status_code=404, detail="Article not found")
+    content = article.content or ""
+    detected = _source_language(zim_id, path, content)
+    translation = _translator(detected, to_lang)
+    blocks = split_blocks(content, zim_id, path) if translation else []
+    cached = SEGMENTS.load(zim_id, path, to_lang) if translation else {}
+    return detected, translation, blocks, cached
+
+
+@router.get("/translate/article/stream")
+async def translate_article_stream(zim_id: str, path: str, to_lang: str):
+    """Stream a translated article as server-sent events in document order.
+
+    Paragraph-sized blocks are translated in parallel a few ahead of the
+    one being sent, and each event carries the HTML of the next finished
+    blocks. When the client disconnects, blocks not yet started are
+    cancelled.
+    """
+    detected, translation, blocks, cached = await run_in_threadpool(
+        _prepare_stream, zim_id, path, to_lang
+    )
+
+    async def generate():
+        if not translation:
+            yield f"event: error\ndata: {json.dumps('Translation language pair not found')}\n\n"
+            yield "event: end\ndata: done\n\n"
+            return
+        yield f"event: meta\ndata: {json.dumps({'from_lang': detected, 'blocks': len(blocks)})}\n\n"
+        pending = deque()
+        queued = 0
+        buffer = []
+        try:
+            for block in blocks:
+                while queued < len(blocks) and len(pending) < STREAM_AHEAD:
+                    ahead = blocks[queued]
+                    pending.append(
+                        submit_block(ahead, translation, cached) if has_text(ahead) else None
+                    )
+                    queued += 1
+                future = pending.popleft()
+                if future is None:
+                    # Markup-only blocks ride along with the next translated one
+                    buffer.append("".join(piece for _, piece in block))
+                    continue
+                translated, fresh = await asyncio.wrap_future(future)
+                if fresh:
+                    await run_in_threadpool(SEGMENTS.save, zim_id, path, to_lang, fresh)
+                buffer.append(translated)
+                yield f"data: {json.dumps({'html': ''.join(buffer)})}\n\n"
+                buffer = []
+            if buffer:
+                yield f"data: {json.dumps({'html': ''.join(buffer)})}\n\n"
+        except (asyncio.CancelledError, GeneratorExit):
+            logger.info(f"Translation of {zim_id}/{path} cancelled by client")
+            raise
+        finally:
+            for future in pending:
+                if future is not None and not future.cancel():
+                    # Blocks already running still fill the segment cache
+                    future.add_done_callback(
+                        partial(_save_segments, zim_id, path, to_lang)
+                    )
+        yield "event: end\ndata: done\n\n"
+
+    return StreamingResponse(generate(), media_type="text/event-stream")
@@ -0,0 +1,279 @@
+# translation_engine.py - Cached Argos translators and HTML-preserving translation
+import hashlib
+import html
+import os
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from threading import Lock
+import argostranslate.translate
+from routes.lru import SizedLRU
+from routes.sanitizer import sanitize_html
+
+# Cost assumed for translators whose model files cannot be located
+DEFAULT_MODEL_BYTES = 100 * 1024 * 1024
+_TRANSLATORS_LOCK = Lock()
+
+# Sentences per unit of work handed to the translation pool
+TRANSLATE_BATCH = 16
+# CTranslate2 releases the GIL, so threads translate batches in parallel.
+# ARGOS_INTER_THREADS controls how many run at once inside one model.
+TRANSLATE_WORKERS = min(4, os.cpu_count() or 1)
+_POOL = ThreadPoolExecutor(max_workers=TRANSLATE_WORKERS, thread_name_prefix="translate")
+
+SEGMENT_DB_PATH = "./cache/translations.db"
+
+# Text inside these elements is copied through untranslated
+_SKIP_TAGS = {"script", "style", "noscript", "template", "code", "pre"}
+_TOKENS = re.compile(r"(<!--.*?-->|<[^>]*>)", re.DOTALL)
+_TAG_NAME = re.compile(r"<\s*(/?)\s*([a-zA-Z0-9]+)")
+# Closing tags that end a block streamed as one unit
+_BLOCK_TAGS = {
+    "p", "h1", "h2", "h3", "h4", "h5", "h6", "li", "dt", "dd", "tr",
+    "caption", "figcaption", "blockquote", "title", "div", "section",
+}
+_SENTENCES = re.compile(r"(?<=[.!?。])\s+")
+_LETTERS = re.compile(r"[^\W\d_]")
+
+
+def _model_bytes(translation) -> int:
+    """Return the size of the model files behind an Argos translation."""
+    parts = [getattr(translation, name, None) for name in ("t1", "t2")]
+    if any(parts):
+        # Pivot translations chain two package translations
+        return sum(_model_bytes(t) for t in parts if t is not None)
+    path = getattr(getattr(translation, "pkg", None), "package_path", None)
+    if path and os.path.isdir(path):
+        return sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+    return DEFAULT_MODEL_BYTES
+
+
+# Loaded translators keyed by (from_code, to_code). Each entry costs the
+# size of its model files, which is roughly what CTranslate2 keeps in RAM.
+TRANSLATORS = SizedLRU(1024 * 1024 * 1024, sizeof=_model_bytes)
+
+
+def get_translator(from_code: str, to_code: str):
+    """Return a translation object for a language pair, or None.
+
+    Translators are kept loaded across requests; ``get_installed_languages``
+    builds fresh objects whose models load again on first use.
+    """
+    key = (from_code, to_code)
+    translator = TRANSLATORS.get(key)
+    if translator is not None:
+        return translator
+    with _TRANSLATORS_LOCK:
+        translator = TRANSLATORS.get(key)
+        if translator is not None:
+            return translator
+        installed = argostranslate.translate.get_installed_languages()
+        from_lang = next((l for l in installed if l.code == from_code), None)
+        to_lang = next((l for l in installed if l.code == to_code), None)
+        if not from_lang or not to_lang:
+            return None
+        translator = from_lang.get_translation(to_lang)
+        if translator is not None:
+            TRANSLATORS.put(key, translator)
+        return translator
+
+
+class SegmentStore:
+    """Persistent cache of translated sentences per article and language."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS segments (
+                    zim_id TEXT, path TEXT, lang TEXT, source_hash TEXT,
+                    translated TEXT,
+                    PRIMARY KEY (zim_id, path, lang, source_hash)
+                ) WITHOUT ROWID
+                """
+            )
+        return self._conn
+
+    def load(self, zim_id: str, path: str, lang: str) -> dict:
+        """Return ``{source_hash: translated}`` for one article."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT source_hash, translated FROM segments "
+                "WHERE zim_id = ? AND path = ? AND lang = ?",
+                (zim_id, path, lang),
+            )
+            return dict(rows.fetchall())
+
+    def save(self, zim_id: str, path: str, lang: str, segments: dict):
+        """Store ``{source_hash: translated}`` entries for one article."""
+        if not segments:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?, ?)",
+                [(zim_id, path, lang, h, t) for h, t in segments.items()],
+            )
+            conn.commit()
+
+
+SEGMENTS = SegmentStore(SEGMENT_DB_PATH)
+
+
+def segment_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def split_html(content: str) -> list[tuple[bool, str]]:
+    """Split HTML into ``(translatable, piece)`` tuples in document order.
+
+    Markup and text inside skipped elements are returned untranslatable;
+    text nodes containing letters are returned as plain (unescaped) text.
+    Joining the pieces back (escaping translated text) restores the page.
+    """
+    pieces = []
+    skip = []
+    for token in _TOKENS.split(content):
+        if not token:
+            continue
+        if token.startswith("<"):
+            match = _TAG_NAME.match(token)
+            if match:
+                closing, name = match.group(1), match.group(2).lower()
+                if name in _SKIP_TAGS and not token.endswith("/>"):
+                    if closing:
+                        if skip and skip[-1] == name:
+                            skip.pop()
+                    else:
+                        skip.append(name)
+            pieces.append((False, token))
+        elif skip or not _LETTERS.search(token):
+            pieces.append((False, token))
+        else:
+            pieces.append((True, html.unescape(token)))
+    return pieces
+
+
+def split_sentences(text: str) -> list[str]:
+    """Split a text node into sentences; ``_rejoin`` restores its outer whitespace."""
+    stripped = text.strip()
+    if not stripped:
+        return []
+    return [s for s in _SENTENCES.split(stripped) if s]
+
+
+def _translate_batch(translator, sentences: list[str]) -> list[str]:
+    return [translator.translate(s) for s in sentences]
+
+
+def translate_sentences(translator, sentences: list[str]) -> list[str]:
+    """Translate *sentences* in batches spread over the translation pool."""
+    batches = [
+        sentences[i : i + TRANSLATE_BATCH]
+        for i in range(0, len(sentences), TRANSLATE_BATCH)
+    ]
+    results = []
+    for batch in _POOL.map(partial(_translate_batch, translator), batches):
+        results.extend(batch)
+    return results
+
+
+def _rejoin(original: str, translated: list[str]) -> str:
+    """Escape translated sentences and restore the node's outer whitespace."""
+    lead = original[: len(original) - len(original.lstrip())]
+    trail = original[len(original.rstrip()) :]
+    return lead + html.escape(" ".join(translated), quote=False) + trail
+
+
+def translate_html(content: str, translator, zim_id: str, path: str, lang: str) -> str:
+    """Translate the text of an HTML page and keep its markup intact.
+
+    Sentences already translated for this article and language are taken
+    from the segment store; the rest are translated and stored.
+    """
+    # Sanitized like the article page
+    pieces = split_html(sanitize_html(content, zim_id, path))
+    nodes = [split_sentences(text) if ok else [] for ok, text in pieces]
+    cached = SEGMENTS.load(zim_id, path, lang)
+
+    todo = {}
+    for sentences in nodes:
+        for sentence in sentences:
+            h = segment_hash(sentence)
+            if h not in cached and h not in todo:
+                todo[h] = sentence
+    fresh = dict(zip(todo, translate_sentences(translator, list(todo.values()))))
+    SEGMENTS.save(zim_id, path, lang, fresh)
+    cached.update(fresh)
+
+    out = []
+    for (ok, text), sentences in zip(pieces, nodes):
+        if ok and sentences:
+            out.append(_rejoin(text, [cached[segment_hash(s)] for s in sentences]))
+        else:
+            out.append(text)
+    return "".join(out)
+
+
+def split_blocks(content: str, zim_id: str, path: str) -> list[list[tuple[bool, str]]]:
+    """Group the pieces of an HTML page into blocks in document order.
+
+    A block ends after the closing tag of a paragraph-like element, so
+    each block can be translated and shown on its own.
+    """
+    blocks = []
+    current = []
+    for ok, piece in split_html(sanitize_html(content, zim_id, path)):
+        current.append((ok, piece))
+        if not ok:
+            match = _TAG_NAME.match(piece)
+            if match and match.group(1) and match.group(2).lower() in _BLOCK_TAGS:
+                blocks.append(current)
+                current = []
+    if current:
+        blocks.append(current)
+    return blocks
+
+
+def has_text(block: list[tuple[bool, str]]) -> bool:
+    return any(ok for ok, _ in block)
+
+
+def translate_block(block, translator, cached: dict) -> tuple[str, dict]:
+    """Translate one block and return its HTML and the new segments.
+
+    Runs in a pool worker; sentences found in *cached* are reused.
+    """
+    fresh = {}
+    out = []
+    for ok, text in block:
+        sentences = split_sentences(text) if ok else []
+        if not sentences:
+            out.append(text)
+            continue
+        translated = []
+        for sentence in sentences:
+            h = segment_hash(sentence)
+            if h in cached:
+                translated.append(cached[h])
+                continue
+            if h not in fresh:
+                fresh[h] = translator.translate(sentence)
+            translated.append(fresh[h])
+        out.append(_rejoin(text, translated))
+    return "".join(out), fresh
+
+
+def submit_block(block, translator, cached: dict):
+    """Schedule :func:`translate_block` on the translation pool."""
+    return _POOL.submit(translate_block, block, translator, cached)
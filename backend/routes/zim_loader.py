@@ -2,18 +2,35 @@
 import os
 import json
 import sqlite3
-from libzim.reader import Archive
+import time
+import unicodedata
+from collections import deque
+from functools import partial
+from libzim.reader import Archive, get_cluster_cache_max_size
+from libzim.search import Query, Searcher
+from libzim.suggestion import SuggestionSearcher
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from threading import Lock, Thread
 from pathlib import Path
+from urllib.parse import quote
 from logger import logger
 from routes.config import load_config
+from routes.fts_pool import READ_POOL
+from routes.html_text import html_to_text
+from routes.index_scheduler import IndexScheduler, pace
+from routes.languages import detect_language, single_language
+from routes.lru import SizedLRU
+from routes.metrics import ZIM_READ_SECONDS
+from routes.zim_scan import DirentScanner, ScanEntry, UnsupportedArchive
 
 
 class Article:
-    def __init__(self, title: str, url: str, content: str):
+    def __init__(self, title: str, url: str, content: str, entry_id: int | None = None):
         self.title = title
         self.url = url
         self.content = content
+        self.entry_id = entry_id
 
 
 class ZIMReader:
@@ -37,38 +54,163 @@ class ZIMReader:
                 return None
         return None
 
-    def articles(self):
-        for idx in range(self.archive.article_count):
+    def entries(self, start: int = 0, stop: int | None = None):
+        """Yield a ``ScanEntry`` per HTML entry with ids in ``[start, stop)``.
+
+        Only directory entries are read, so no cluster is decompressed.
+        Archives the scanner cannot read, such as split ones, are walked
+        through libzim instead, still without loading content.
+        """
+        try:
+            scanner = DirentScanner(self.archive.filename)
+        except (OSError, UnsupportedArchive):
+            scanner = None
+        if scanner is not None:
+            with scanner:
+                yield from scanner.html_entries(start, stop)
+            return
+        stop = self.archive.entry_count if stop is None else stop
+        for idx in range(start, min(stop, self.archive.entry_count)):
+            try:
+                entry = self.archive._get_entry_by_id(idx)
+                if entry.is_redirect:
+                    continue
+                if not entry.get_item().mimetype.startswith("text/html"):
+                    continue
+                # Without cluster numbers, id order is the best guess
+                yield ScanEntry(idx, entry.path, entry.title, idx, 0)
+            except Exception:
+                continue
+
+    def articles(self, start: int = 0, stop: int | None = None):
+        """Yield the HTML articles with ids in ``[start, stop)`` in id order.
+
+        Content is loaded window by window in cluster order, so each
+        cluster is decompressed once per window instead of whenever the
+        path order returns to it. Archives that fit in libzim's cluster
+        cache never decompress a cluster twice, so they are read in id
+        order without scanning their directory first.
+        """
+        stop = self.archive.entry_count if stop is None else stop
+        if self.archive.filesize <= get_cluster_cache_max_size():
+            yield from self._articles_by_id(start, min(stop, self.archive.entry_count))
+            return
+        for window in range(start, stop, ARTICLE_SCAN_WINDOW):
+            entries = list(self.entries(window, min(window + ARTICLE_SCAN_WINDOW, stop)))
+            entries.sort(key=lambda e: (e.cluster, e.blob))
+            articles = []
+            for scan in entries:
+                try:
+                    item = self.archive._get_entry_by_id(scan.entry_id).get_item()
+                    content = str(item.content, "utf-8", "ignore")
+                except Exception:
+                    continue
+                articles.append(Article(scan.title, scan.path, content, scan.entry_id))
+            articles.sort(key=lambda a: a.entry_id)
+            yield from articles
+
+    def _articles_by_id(self, start: int, stop: int):
+        for idx in range(start, stop):
             try:
                 entry = self.archive._get_entry_by_id(idx)
                 if entry.is_redirect:
                     continue
                 item = entry.get_item()
-                if not item.mimetype.startswith("text"):
+                if not item.mimetype.startswith("text/html"):
                     continue
-                content = item.content.tobytes().decode("utf-8", "ignore")
-                yield Article(entry.title, entry.path, content)
+                content = str(item.content, "utf-8", "ignore")
             except Exception:
                 continue
+            yield Article(entry.title, entry.path, content, idx)
+
+    @property
+    def has_native_search(self) -> bool:
+        """Whether the archive ships its own full-text or title index."""
+        return self.archive.has_fulltext_index or self.archive.has_title_index
+
+    def _entries(self, paths):
+        hits = []
+        for path in paths:
+            try:
+                hits.append((self.archive.get_entry_by_path(path).title, path))
+            except KeyError:
+                continue
+        return hits
+
+    def search(self, query: str, limit: int, start: int = 0):
+        """Return ``(title, path)`` hits from the archive's embedded index.
+
+        Falls back to title suggestions for archives without a full-text
+        index. *start* skips that many hits, for paging.
+        """
+        try:
+            if self.archive.has_fulltext_index:
+                search = Searcher(self.archive).search(Query().set_query(query))
+                return self._entries(search.getResults(start, limit))
+            return self.suggest(query, limit, start)
+        except Exception:
+            return []
+
+    def suggest(self, prefix: str, limit: int, start: int = 0):
+        """Return ``(title, path)`` title suggestions for *prefix*."""
+        try:
+            results = SuggestionSearcher(self.archive).suggest(prefix)
+            return self._entries(results.getResults(start, limit))
+        except Exception:
+            return []
+
+    def get_entry(self, path: str):
+        """Return the entry at *path* without following redirects, or None."""
+        try:
+            with ZIM_READ_SECONDS.time("lookup"):
+                return self.archive.get_entry_by_path(path)
+        except KeyError:
+            return None
 
     def get_article(self, path: str):
         try:
-            entry = self.archive.get_entry_by_path(path)
-            item = entry.get_item()
+            with ZIM_READ_SECONDS.time("lookup"):
+                entry = self.archive.get_entry_by_path(path)
+                item = entry.get_item()
             if not item.mimetype.startswith("text"):
                 return None
-            content = item.content.tobytes().decode("utf-8", "ignore")
+            with ZIM_READ_SECONDS.time("content"):
+                content = item.content.tobytes().decode("utf-8", "ignore")
             return Article(entry.title, entry.path, content)
         except Exception:
             return None
 
+# The registry is copy-on-write: readers use ZIM_INDEX and ZIM_META without
+# locking, and writers build replacements and rebind them under ZIM_LOCK.
+# Replaced readers stay open while in-flight requests still reference them.
 ZIM_INDEX = {}
-ZIM_META = []
+ZIM_META = ()
 ZIM_LOCK = Lock()
-FTS_LOCK = Lock()
 CACHE_PATH = "./cache/zim_index.json"
-FTS_DB_PATH = "./cache/search_index.db"
-
+# Each archive gets its own FTS shard so archives can be indexed in
+# parallel and added or removed without touching the others.
+SHARD_DIR = "./cache/index"
+LEGACY_FTS_DB_PATH = "./cache/search_index.db"
+
+# Sanitized article bytes keyed by (zim_id, path, archive mtime)
+ARTICLE_CACHE = SizedLRU(256 * 1024 * 1024)
+
+# Bulk indexing defaults; the batch size can be overridden in the config
+INDEX_BATCH_SIZE = 5000
+INDEX_CHECKPOINT_BATCHES = 20
+INDEX_CACHE_KB = 65536
+INDEX_PAGE_SIZE = 8192
+# Body text kept per article when content indexing is enabled
+INDEX_BODY_CHARS = 20000
+# Bumped whenever the shard layout changes so old shards get rebuilt
+SHARD_SCHEMA = 5
+# Text sampled per article when detecting languages of multilingual archives
+INDEX_LANG_SAMPLE_CHARS = 500
+# Entries whose content is read in cluster order at a time
+ARTICLE_SCAN_WINDOW = 4096
+# Archives with fewer entries are never split across scan processes
+INDEX_SPLIT_MIN_ENTRIES = 50000
+
 def save_cache(meta):
     os.makedirs("./cache", exist_ok=True)
     with open(CACHE_PATH, "w") as f:
@@ -80,90 +222,426 @@ def try_load_cache():
             return json.load(f)
     return []
 
-def search_index_has_entries(zim_name: str) -> bool:
-    if not os.path.exists(FTS_DB_PATH):
+def normalize_key(text: str) -> str:
+    """Return the casefolded, accent-stripped form of *text* used for prefix lookups."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+def shard_path(zim_name: str) -> str:
+    """Return the path of the FTS shard database for an archive."""
+    return os.path.join(SHARD_DIR, f"{zim_name}.db")
+
+def _remove_db(path: str):
+    """Delete an SQLite database file and its WAL files."""
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+def remove_shard(zim_name: str):
+    """Delete the shard database of an archive and its WAL files."""
+    base = shard_path(zim_name)
+    READ_POOL.invalidate(base)
+    _remove_db(base)
+
+def index_options(config: dict) -> dict:
+    """Return the indexing settings from *config* passed to pool workers."""
+    return {
+        "batch_size": int(config.get("index_batch_size", INDEX_BATCH_SIZE)),
+        "content": bool(config.get("index_content", False)),
+        "content_max_bytes": int(config.get("index_content_max_mb", 1024)) * 1024 * 1024,
+        "max_rows_per_sec": int(config.get("index_max_rows_per_sec", 0)),
+    }
+
+def uses_native_search(reader: "ZIMReader", config: dict) -> bool:
+    """Decide whether an archive is searched through its embedded index.
+
+    Title-only indexes are not used when body indexing is enabled, since
+    they cannot answer content queries.
+    """
+    if config.get("search_backend", "auto") != "auto":
         return False
-    # Allow some time to acquire the write lock and use WAL mode so
-    # search queries can run while indexing is in progress.
-    conn = sqlite3.connect(FTS_DB_PATH, timeout=30)
-    conn.execute("PRAGMA journal_mode=WAL")
-    cur = conn.cursor()
-    cur.execute("SELECT 1 FROM articles WHERE zim_id=? LIMIT 1", (zim_name,))
-    row = cur.fetchone()
-    conn.close()
-    return row is not None
+    if reader.archive.has_fulltext_index:
+        return True
+    return reader.archive.has_title_index and not config.get("index_content", False)
+
+def read_shard_info(zim_name: str) -> dict:
+    """Return the ``index_info`` rows of a shard, or {} if unreadable."""
+    path = shard_path(zim_name)
+    if not os.path.exists(path):
+        return {}
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        rows = conn.execute("SELECT key, value FROM index_info").fetchall()
+    except sqlite3.DatabaseError:
+        rows = []
+    finally:
+        conn.close()
+    return dict(rows)
+
+def search_index_has_entries(zim_name: str, reader: "ZIMReader", options: dict) -> bool:
+    """Return whether the shard of *zim_name* is a complete build of *reader*.
+
+    The stored fingerprint covers the schema, the archive UUID and size and
+    the settings, so a shard left by a replaced archive is stale.
+    """
+    info = read_shard_info(zim_name)
+    return (
+        info.get("fingerprint") == _index_fingerprint(reader, options)
+        and info.get("complete") == "1"
+    )
 
-def index_up_to_date(zim_path: Path, meta: dict | None) -> bool:
+def index_up_to_date(zim_path: Path, meta: dict | None, options: dict, reader: "ZIMReader") -> bool:
     if not meta:
         return False
+    stat = zim_path.stat()
+    # A file that was only touched keeps its UUID, so its index stays valid
+    same_file = meta.get("mtime") == stat.st_mtime or meta.get("uuid") == str(reader.archive.uuid)
     return (
-        meta.get("mtime") == zim_path.stat().st_mtime
-        and meta.get("size") == zim_path.stat().st_size
-        and search_index_has_entries(zim_path.name)
+        same_file
+        and meta.get("size") == stat.st_size
+        and search_index_has_entries(zim_path.name, reader, options)
     )
 
-def _index_thread(zim_name: str, reader: "ZIMReader", meta: dict, cache: dict):
-    # Indexing can take time and only one thread should write to the
-    # search database at once to avoid locking errors.
-    with FTS_LOCK:
-        count = rebuild_search_index(zim_name, reader)
+def _build_shard(zim_path: str, zim_name: str, options: dict) -> int:
+    """Index one archive into its shard; runs inside a pool worker."""
+    return rebuild_search_index(zim_name, ZIMReader(zim_path), options)
+
+# Queues stale archives and runs their builds in a process pool
+SCHEDULER = IndexScheduler(_build_shard)
+
+def _scan_rows(reader, start: int, stop: int, need_text: bool, lang: str | None) -> list:
+    """Return the index rows of the HTML entries with ids in ``[start, stop)``.
+
+    Rows are ``(entry_id, title, path, body, lang)``. Without *need_text*
+    only directory entries are read and the language is *lang*.
+    """
+    if not need_text:
+        return [(e.entry_id, e.title, e.path, "", lang) for e in reader.entries(start, stop)]
+    rows = []
+    for art in reader.articles(start, stop):
+        text = html_to_text(art.content)
+        rows.append((
+            art.entry_id,
+            art.title,
+            art.url,
+            text[:INDEX_BODY_CHARS],
+            lang or detect_language(text, sample_chars=INDEX_LANG_SAMPLE_CHARS),
+        ))
+    return rows
+
+# Readers opened by scan processes, one per archive
+_SCAN_READERS = {}
+
+def _scan_file_rows(zim_path: str, start: int, stop: int, need_text: bool, lang) -> list:
+    """Run :func:`_scan_rows` on a range of an archive inside a scan process."""
+    reader = _SCAN_READERS.get(zim_path)
+    if reader is None:
+        reader = _SCAN_READERS[zim_path] = ZIMReader(zim_path)
+    return _scan_rows(reader, start, stop, need_text, lang)
+
+def _scan_windows(reader, first_entry: int, window: int, workers: int, need_text, lang):
+    """Yield the rows of consecutive id windows from *first_entry* on.
+
+    With several *workers*, windows are handed to a process pool and
+    yielded in order, keeping a couple of windows per process in flight.
+    *need_text* is called per window so the scan can drop to directory
+    entries once content is no longer needed.
+    """
+    total = reader.archive.entry_count
+    ranges = [(start, min(start + window, total)) for start in range(first_entry, total, window)]
+    if workers <= 1:
+        for start, stop in ranges:
+            yield stop - 1, _scan_rows(reader, start, stop, need_text(), lang)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+        pending = deque()
+        for start, stop in ranges:
+            future = pool.submit(
+                _scan_file_rows, reader.archive.filename, start, stop, need_text(), lang
+            )
+            pending.append((stop - 1, future))
+            if len(pending) >= workers * 2:
+                last, future = pending.popleft()
+                yield last, future.result()
+        while pending:
+            last, future = pending.popleft()
+            yield last, future.result()
+
+def _publish(index: dict):
+    """Swap in a new registry. Must be called with ``ZIM_LOCK`` held."""
+    global ZIM_INDEX, ZIM_META
+    ZIM_INDEX = index
+    ZIM_META = tuple(z["meta"] for z in index.values())
+
+def _finish_index(zim_name: str, meta: dict, cache: dict, future):
+    """Record the outcome of a finished indexing job."""
+    error = future.exception()
     with ZIM_LOCK:
-        meta["count"] = count
-        cache[zim_name] = meta
-        if zim_name in ZIM_INDEX:
-            ZIM_INDEX[zim_name]["meta"]["count"] = count
-        save_cache(list(cache.values()))
-    logger.info(f"Indexed {zim_name} with {count} articles")
-
-def rebuild_search_index(zim_id, reader):
-    """Rebuild the FTS search index for a ZIM reader.
+        if error is None:
+            count = future.result()
+            current = ZIM_INDEX.get(zim_name)
+            if current:
+                meta = current["meta"]
+                updated = {"reader": current["reader"], "meta": {**meta, "count": count}}
+                _publish({**ZIM_INDEX, zim_name: updated})
+            cache[zim_name] = {**meta, "count": count}
+            save_cache(list(cache.values()))
+    if error is None:
+        READ_POOL.invalidate(shard_path(zim_name))
+        logger.info(f"Indexed {zim_name} with {count} articles")
+        return
+    logger.error(f"Indexing {zim_name} failed: {error}")
 
-    Articles are streamed lazily from the reader to avoid large
-    memory usage when indexing massive collections.
+def _configure_index_connection(conn, fresh: bool):
+    """Apply bulk-load pragmas to a connection used for indexing.
 
-    Returns the number of indexed articles.
+    ``page_size`` only takes effect before the first table is created, so
+    it is applied to fresh databases only.
     """
-    os.makedirs("./cache", exist_ok=True)
-    conn = sqlite3.connect(FTS_DB_PATH, timeout=30)
+    if fresh:
+        conn.execute(f"PRAGMA page_size={INDEX_PAGE_SIZE}")
     conn.execute("PRAGMA journal_mode=WAL")
+    # NORMAL is still crash-safe in WAL mode, it only skips the fsync per commit
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{INDEX_CACHE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+def _index_fingerprint(reader, options: dict) -> str:
+    """Identify the archive and settings a partial build belongs to."""
+    archive = reader.archive
+    return f"{SHARD_SCHEMA}:{archive.uuid}:{archive.filesize}:{int(options['content'])}"
+
+def _open_build(build_path: str, fingerprint: str):
+    """Open the build database of a shard, resuming a matching partial build.
+
+    Returns the connection and the ``index_info`` rows of the build. A
+    build left behind for another archive version or other settings is
+    discarded and a fresh database is created.
+    """
+    if os.path.exists(build_path):
+        conn = sqlite3.connect(build_path, timeout=30)
+        try:
+            info = dict(conn.execute("SELECT key, value FROM index_info"))
+        except sqlite3.DatabaseError:
+            info = {}
+        if info.get("fingerprint") == fingerprint:
+            _configure_index_connection(conn, fresh=False)
+            return conn, info
+        conn.close()
+        _remove_db(build_path)
+
+    conn = sqlite3.connect(build_path, timeout=30)
+    _configure_index_connection(conn, fresh=True)
     cur = conn.cursor()
+    cur.execute("CREATE TABLE index_info (key TEXT PRIMARY KEY, value TEXT)")
     cur.execute(
-        """
-        CREATE VIRTUAL TABLE IF NOT EXISTS articles USING fts5(
-            zim_id, title, path
-        )
-        """
+        "CREATE VIRTUAL TABLE articles USING fts5(title, path UNINDEXED, body)"
+    )
+    # Per-article facts computed once so requests need not derive them
+    cur.execute(
+        "CREATE TABLE article_meta (path TEXT PRIMARY KEY, lang TEXT) WITHOUT ROWID"
+    )
+    # Rank by BM25 with title matches weighted well above body matches
+    cur.execute(
+        "INSERT INTO articles(articles, rank) VALUES('rank', 'bm25(10.0, 0.0, 1.0)')"
+    )
+    # Merge small segments incrementally while inserting
+    cur.execute("INSERT INTO articles(articles, rank) VALUES('automerge', 8)")
+    cur.execute(
+        "INSERT INTO index_info (key, value) VALUES ('fingerprint', ?)",
+        (fingerprint,),
     )
-    cur.execute("DELETE FROM articles WHERE zim_id = ?", (zim_id,))
-    count = 0
-    for art in reader.articles():
-        cur.execute(
-            "INSERT INTO articles (zim_id, title, path) VALUES (?, ?, ?)",
-            (zim_id, art.title, art.url),
-        )
-        count += 1
     conn.commit()
-    conn.close()
+    return conn, {"fingerprint": fingerprint}
+
+
+def rebuild_search_index(zim_id, reader, options: dict | None = None):
+    """Rebuild the FTS search index for a ZIM reader.
+
+    Entries are scanned in windows of ``options["batch_size"]`` entry ids
+    and each window's rows are written with ``executemany``. Every batch
+    is committed together with a checkpoint of the last entry id, and the
+    WAL checkpointed periodically so it stays bounded on very large
+    archives. Segments are merged once at the end.
+
+    Only directory entries are read when article text is not needed,
+    i.e. for title-only indexes of single-language archives. Otherwise content
+    is read in cluster order, and large archives split their windows
+    across ``options["scan_workers"]`` processes.
+
+    An interrupted build is resumed from its checkpoint as long as the
+    archive and settings are unchanged. The shard is only published once
+    the ``complete`` sentinel has been written. After every batch the
+    build is paced by the scheduler (see ``index_scheduler.pace``), which
+    also pauses or cancels it.
+
+    The ``article_meta`` table records the language of every article.
+    Archives whose ``Language`` metadata names a single language skip
+    per-article detection.
+
+    With ``options["content"]`` set, the plain text of each article body
+    is indexed as well until ``options["content_max_bytes"]`` of text has
+    been written for the archive; later articles are indexed by title.
+
+    Returns the number of indexed articles.
+    """
+    if options is None:
+        options = index_options(load_config())
+    batch_size = max(1, options["batch_size"])
+    with_content = options["content"]
+    content_budget = options["content_max_bytes"]
+
+    # Build into a temporary file so searches keep using the previous
+    # shard until the new one is complete.
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    final_path = shard_path(zim_id)
+    build_path = final_path + ".building"
+    conn, info = _open_build(build_path, _index_fingerprint(reader, options))
+    cur = conn.cursor()
+
+    start = time.monotonic()
+    count = int(info.get("count", 0))
+    resumed_count = count
+    batches = 0
+    # Time spent paused does not count towards the reported rate
+    paused = 0.0
+    window_start = start
+    body_bytes = int(info.get("body_bytes", 0))
+    with_content = with_content and body_bytes <= content_budget
+    first_entry = int(info.get("last_entry", -1)) + 1
+    complete = info.get("complete") == "1"
+    if "last_entry" in info:
+        logger.info(f"Indexing {zim_id}: resuming at entry {first_entry} ({count} rows)")
+
+    # Single-language archives skip per-article language detection, and
+    # when titles are all that is indexed their content is never read.
+    archive_lang = single_language(reader.language)
+    total = reader.archive.entry_count
+    workers = options.get("scan_workers", 1) if total >= INDEX_SPLIT_MIN_ENTRIES else 1
+
+    def need_text() -> bool:
+        return with_content or archive_lang is None
+
+    def take_body(body: str) -> str:
+        nonlocal body_bytes, with_content
+        if not with_content:
+            return ""
+        body_bytes += len(body.encode("utf-8"))
+        if body_bytes > content_budget:
+            with_content = False
+            logger.info(
+                f"Indexing {zim_id}: content size cap reached, "
+                "indexing remaining articles by title only"
+            )
+        return body
+
+    try:
+        windows = () if complete else _scan_windows(
+            reader, first_entry, batch_size, workers, need_text, archive_lang
+        )
+        for last_entry, batch in windows:
+            cur.executemany(
+                "INSERT INTO articles (title, path, body) VALUES (?, ?, ?)",
+                [(title, path, take_body(body)) for _, title, path, body, *_ in batch],
+            )
+            cur.executemany(
+                "INSERT OR REPLACE INTO article_meta (path, lang) VALUES (?, ?)",
+                ((row[2], row[4]) for row in batch),
+            )
+            count += len(batch)
+            rate = (count - resumed_count) / max(time.monotonic() - start - paused, 1e-6)
+            # The checkpoint commits atomically with the rows it covers; the
+            # entry total and rate let the server report progress.
+            cur.executemany(
+                "INSERT OR REPLACE INTO index_info (key, value) VALUES (?, ?)",
+                [
+                    ("last_entry", str(last_entry)),
+                    ("count", str(count)),
+                    ("body_bytes", str(body_bytes)),
+                    ("entries", str(total)),
+                    ("rate", f"{rate:.1f}"),
+                ],
+            )
+            conn.commit()
+            batches += 1
+            if batches % INDEX_CHECKPOINT_BATCHES == 0:
+                cur.execute("PRAGMA wal_checkpoint(PASSIVE)")
+                logger.info(f"Indexing {zim_id}: {count} rows ({rate:.0f} rows/s)")
+            paused += pace(
+                time.monotonic() - window_start, len(batch), options.get("max_rows_per_sec", 0)
+            )
+            window_start = time.monotonic()
+
+        if not complete:
+            cur.execute("INSERT INTO articles(articles) VALUES('optimize')")
+            # Sorted title table for search-as-you-type; inserting in key order
+            # appends to the B-tree instead of splitting pages at random.
+            conn.create_function("normalize_key", 1, normalize_key, deterministic=True)
+            cur.execute(
+                """
+                CREATE TABLE titles (
+                    key TEXT, title TEXT, path TEXT, PRIMARY KEY (key, path)
+                ) WITHOUT ROWID
+                """
+            )
+            cur.execute(
+                """
+                INSERT INTO titles (key, title, path)
+                SELECT normalize_key(title), title, path FROM articles ORDER BY 1, 3
+                """
+            )
+            cur.executemany(
+                "INSERT OR REPLACE INTO index_info (key, value) VALUES (?, ?)",
+                [
+                    ("schema", str(SHARD_SCHEMA)),
+                    ("content", str(int(options["content"]))),
+                    ("count", str(count)),
+                    ("complete", "1"),
+                ],
+            )
+            conn.commit()
+        cur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        # The finished shard is read-only, so drop WAL before publishing it
+        cur.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        conn.close()
+    # The swap is atomic, so searches see either the old or the new shard;
+    # pooled connections notice the new inode and reopen
+    os.replace(build_path, final_path)
+    READ_POOL.invalidate(final_path)
+
+    elapsed = max(time.monotonic() - start - paused, 1e-6)
+    logger.info(
+        f"Indexed {zim_id}: {count} rows in {elapsed:.1f}s "
+        f"({count / elapsed:.0f} rows/s)"
+    )
     return count
 
 def load_zim_files(blocking: bool = False):
     """Load ZIM archives and rebuild their search indexes.
 
-    When *blocking* is False, search index creation occurs in background
-    threads so server startup is not delayed.
+    Reloads are incremental: archives whose size and mtime are unchanged
+    keep their open reader, and only new or modified files are opened.
+    Stale archives are queued on the indexing scheduler, which builds
+    their shards in a process pool. When *blocking* is False the builds
+    run in the background so server startup is not delayed.
     """
-    global ZIM_INDEX, ZIM_META
-
     cached = {m["file"]: m for m in try_load_cache()}
     meta_cache: dict[str, dict] = cached.copy()
+    stale = []
+    index = {}
 
+    # ZIM_LOCK only serializes writers; requests keep reading the previous
+    # registry until the new one is published.
     with ZIM_LOCK:
-        ZIM_INDEX.clear()
-        ZIM_META.clear()
-
         config = load_config()
         base_dir = Path(config.get("zim_dir", "/app/data/zim"))
         overrides = config.get("zim_overrides", {})
+        options = index_options(config)
+        SCHEDULER.configure(config)
 
         dirs = [base_dir]
         if not base_dir.exists():
@@ -174,12 +652,22 @@ def load_zim_files(blocking: bool = False):
                 continue
             for zim_path in directory.glob("*.zim"):
                 try:
-                    reader = ZIMReader(str(zim_path))
+                    stat = zim_path.stat()
+                    mtime = stat.st_mtime
+                    size = stat.st_size
+                    loaded = ZIM_INDEX.get(zim_path.name)
+                    if (
+                        loaded
+                        and loaded["meta"]["mtime"] == mtime
+                        and loaded["meta"]["size"] == size
+                    ):
+                        reader = loaded["reader"]
+                    else:
+                        reader = ZIMReader(str(zim_path))
                     over = overrides.get(zim_path.name, {})
 
                     cached_meta = cached.get(zim_path.name)
-                    mtime = zim_path.stat().st_mtime
-                    size = zim_path.stat().st_size
+                    uuid = str(reader.archive.uuid)
 
                     zim_meta = {
                         "file": zim_path.name,
@@ -188,43 +676,190 @@ def load_zim_files(blocking: bool = False):
                         "count": cached_meta.get("count", 0) if cached_meta else 0,
                         "mtime": mtime,
                         "size": size,
+                        "uuid": uuid,
                         "main_page": reader.main_page,
                     }
 
                     if "image" in over:
                         zim_meta["image"] = over["image"]
 
-                    ZIM_INDEX[zim_path.name] = {
+                    native = uses_native_search(reader, config)
+                    zim_meta["search"] = "libzim" if native else "sqlite"
+                    if native:
+                        zim_meta["count"] = reader.archive.article_count
+
+                    index[zim_path.name] = {
                         "reader": reader,
                         "meta": zim_meta,
                     }
-                    ZIM_META.append(zim_meta)
                     meta_cache[zim_path.name] = zim_meta
 
-                    if index_up_to_date(zim_path, cached_meta):
-                        logger.info(f"Loaded {zim_path.name} (index up-to-date)")
+                    if native:
+                        status = "embedded search index"
+                    elif index_up_to_date(zim_path, cached_meta, options, reader):
+                        status = "index up-to-date"
                     else:
-                        if blocking:
-                            _index_thread(zim_path.name, reader, zim_meta, meta_cache)
-                        else:
-                            Thread(
-                                target=_index_thread,
-                                args=(zim_path.name, reader, zim_meta, meta_cache),
-                                daemon=True,
-                            ).start()
-                        logger.info(f"Loaded {zim_path.name}; indexing queued")
+                        stale.append((zim_path, zim_meta))
+                        status = "indexing queued"
+                    if not loaded or loaded["reader"] is not reader:
+                        logger.info(f"Loaded {zim_path.name} ({status})")
                 except Exception as e:
                     logger.error(f"Failed to load {zim_path.name}: {e}")
 
+        for zim_path, zim_meta in stale:
+            SCHEDULER.submit(
+                zim_path, options, partial(_finish_index, zim_path.name, zim_meta, meta_cache)
+            )
+
+        for name in ZIM_INDEX.keys() - index.keys():
+            logger.info(f"Unloaded {name}")
+        _publish(index)
+        ARTICLE_CACHE.resize(int(config.get("article_cache_mb", 256)) * 1024 * 1024)
+        ARTICLE_CACHE.discard(
+            lambda key: key[0] not in index
+            or index[key[0]]["meta"]["mtime"] != key[2]
+        )
+
+        if base_dir.exists():
+            _prune_shards(
+                {name for name, z in index.items() if z["meta"]["search"] == "sqlite"}
+            )
         save_cache(list(meta_cache.values()))
 
+    if blocking:
+        SCHEDULER.wait([zim_path.name for zim_path, _ in stale])
+
+def _prune_shards(loaded: set):
+    """Remove shards of archives that are gone or no longer use SQLite search."""
+    if os.path.exists(LEGACY_FTS_DB_PATH):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(LEGACY_FTS_DB_PATH + suffix):
+                os.remove(LEGACY_FTS_DB_PATH + suffix)
+        logger.info("Removed legacy single-file search index")
+    if not os.path.isdir(SHARD_DIR):
+        return
+    indexing = SCHEDULER.active()
+    for name in os.listdir(SHARD_DIR):
+        if name.endswith(".zim.db.building"):
+            zim_name = name[: -len(".db.building")]
+            if zim_name not in loaded and zim_name not in indexing:
+                _remove_db(os.path.join(SHARD_DIR, name))
+                logger.info(f"Removed partial search shard for {zim_name}")
+            continue
+        if not name.endswith(".zim.db"):
+            continue
+        zim_name = name[: -len(".db")]
+        if zim_name not in loaded and zim_name not in indexing:
+            remove_shard(zim_name)
+            logger.info(f"Removed search shard for {zim_name}")
+
+# Readers below take no lock: rebinding the registry globals is atomic and
+# the published dicts are never mutated.
+
 def get_zim_metadata():
-    with ZIM_LOCK:
-        return ZIM_META or try_load_cache()
+    return list(ZIM_META) or try_load_cache()
 
+def get_loaded_meta(zim_id):
+    return ZIM_INDEX.get(zim_id, {}).get("meta")
+
+def get_reader(zim_id):
+    return ZIM_INDEX.get(zim_id, {}).get("reader")
+
+def get_article_meta(zim_id, path):
+    """Return the precomputed ``lang`` of an article.
+
+    Returns None for archives without a SQLite shard or unknown paths.
+    """
+    db_path = shard_path(zim_id)
+    if not os.path.exists(db_path):
+        return None
+    try:
+        with READ_POOL.connection(db_path) as conn:
+            row = conn.execute(
+                "SELECT lang FROM article_meta WHERE path = ?", (path,)
+            ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return dict(row) if row else None
+
+def index_progress(names=None) -> dict:
+    """Return the last build checkpoint of the archives *names*.
+
+    *names* defaults to the archives queued or being indexed. Values are
+    ``{"rows", "entries", "last_entry", "rate"}`` as committed by the
+    worker building the shard; archives without a partial build, such as
+    those not started yet, report nothing.
+    """
+    progress = {}
+    for zim_name in SCHEDULER.active() if names is None else names:
+        build_path = shard_path(zim_name) + ".building"
+        if not os.path.exists(build_path):
+            continue
+        try:
+            uri = f"file:{quote(os.path.abspath(build_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=1)
+            try:
+                info = dict(conn.execute("SELECT key, value FROM index_info"))
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            continue
+        if "last_entry" in info:
+            progress[zim_name] = {
+                "rows": int(info["count"]),
+                "entries": int(info.get("entries", 0)),
+                "last_entry": int(info["last_entry"]),
+                "rate": float(info.get("rate", 0)),
+            }
+    return progress
+
 def get_article(zim_id, path):
-    with ZIM_LOCK:
-        reader = ZIM_INDEX.get(zim_id, {}).get("reader")
-        if reader:
-            return reader.get_article(path)
+    reader = ZIM_INDEX.get(zim_id, {}).get("reader")
+    if reader:
+        return reader.get_article(path)
     return None
+
+def _scan_zim_dir() -> dict:
+    """Return ``{name: (size, mtime)}`` for the archives in the ZIM directory."""
+    base_dir = Path(load_config().get("zim_dir", "/app/data/zim"))
+    if not base_dir.exists():
+        return {}
+    snapshot = {}
+    for zim_path in base_dir.glob("*.zim"):
+        try:
+            stat = zim_path.stat()
+        except FileNotFoundError:
+            continue
+        snapshot[zim_path.name] = (stat.st_size, stat.st_mtime)
+    return snapshot
+
+def _watch_zim_dir(last: dict):
+    pending = None
+    while True:
+        interval = load_config().get("zim_watch_interval", 10)
+        time.sleep(interval if interval > 0 else 60)
+        if interval <= 0:
+            continue
+        try:
+            snapshot = _scan_zim_dir()
+        except Exception as e:
+            logger.error(f"ZIM directory scan failed: {e}")
+            continue
+        if snapshot == last:
+            pending = None
+            continue
+        # Wait for one unchanged scan so files still being copied are skipped
+        if snapshot != pending:
+            pending = snapshot
+            continue
+        logger.info("ZIM directory changed; reloading")
+        last = snapshot
+        pending = None
+        load_zim_files()
+
+def start_zim_watcher():
+    """Poll the ZIM directory and reload when archives are added or changed.
+
+    The interval comes from ``zim_watch_interval`` in seconds; 0 disables it.
+    """
+    Thread(target=_watch_zim_dir, args=(_scan_zim_dir(),), daemon=True).start()
@@ -1,40 +1,219 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import HTMLResponse, StreamingResponse
-import io
-import pdfkit
-import re
-from routes.zim_loader import get_zim_metadata, get_article
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, Response, StreamingResponse
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+import asyncio
+import hashlib
+import os
+from routes.config import load_config
+from routes.metrics import ZIM_READ_SECONDS
+from routes.pdf_export import PdfQueueFull, get_job, submit_pdf
+from routes.sanitizer import SANITIZER_VERSION, sanitize_html
+from routes.zim_loader import ARTICLE_CACHE, SCHEDULER, get_zim_metadata, get_loaded_meta, get_reader
 
 router = APIRouter()
+
+# Size of the memoryview slices written to the socket for raw resources
+RESOURCE_CHUNK = 256 * 1024
 
 @router.get("/zim/list")
 def list_zims():
     return {"zims": get_zim_metadata()}
 
 
-@router.get("/article/{zim_id}/{path:path}", response_class=HTMLResponse)
-def get_article_html(zim_id: str, path: str):
-    article = get_article(zim_id, path)
-    if article:
-        sanitized = re.sub(r"<script.*?>.*?</script>", "", article.content or "", flags=re.DOTALL | re.IGNORECASE)
-        return HTMLResponse(
-            sanitized,
-            headers={"Content-Security-Policy": "default-src 'self'"}
-        )
-    raise HTTPException(status_code=404, detail="Article not found")
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """Evaluate the conditional request headers against an article version."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return etag in tags or "*" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _submit_pdf(zim_id: str, path: str):
+    meta = get_loaded_meta(zim_id)
+    reader = get_reader(zim_id)
+    if not meta or not reader or reader.get_entry(path) is None:
+        raise HTTPException(status_code=404, detail="Article not found")
+    cache_bytes = int(load_config().get("pdf_cache_mb", 512)) * 1024 * 1024
+    try:
+        return submit_pdf(reader, meta, zim_id, path, cache_bytes)
+    except PdfQueueFull:
+        raise HTTPException(status_code=503, detail="PDF export queue is full")
+
+
+def _pdf_file(job):
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error or "PDF export failed")
+    if job.status != "done" or not os.path.exists(job.file_path):
+        raise HTTPException(status_code=409, detail="PDF is not ready")
+    # Serving refreshes the file's age for cache eviction
+    os.utime(job.file_path)
+    filename = job.path.split("/")[-1] or "article"
+    return FileResponse(job.file_path, media_type="application/pdf", filename=f"{filename}.pdf")
+
+
+# PDF routes are registered before the article route, whose catch-all
+# path would otherwise swallow the trailing "/pdf".
+@router.post("/article/{zim_id}/{path:path}/pdf")
+def create_pdf_job(zim_id: str, path: str):
+    """Queue a PDF export and return its job for status polling."""
+    return _submit_pdf(zim_id, path).to_dict()
+
+
+@router.get("/pdf/jobs/{job_id}")
+def pdf_job_status(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+
+@router.get("/pdf/jobs/{job_id}/file")
+def pdf_job_file(job_id: str):
+    job = get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _pdf_file(job)
 
 
 @router.get("/article/{zim_id}/{path:path}/pdf")
-def get_article_pdf(zim_id: str, path: str):
-    """Return the requested article rendered as a PDF file."""
-    article = get_article(zim_id, path)
-    if not article:
+async def get_article_pdf(zim_id: str, path: str):
+    """Return the requested article rendered as a PDF file.
+
+    Waits for the queued render without holding a worker thread.
+    """
+    job = await run_in_threadpool(_submit_pdf, zim_id, path)
+    if job.future is not None:
+        await asyncio.wrap_future(job.future)
+    return _pdf_file(job)
+
+
+@router.get("/article/{zim_id}/{path:path}", response_class=HTMLResponse)
+def get_article_html(zim_id: str, path: str, request: Request):
+    meta = get_loaded_meta(zim_id)
+    reader = get_reader(zim_id)
+    if not meta or not reader:
+        raise HTTPException(status_code=404, detail="Article not found")
+    SCHEDULER.note_request(zim_id)
+
+    entry = reader.get_entry(path)
+    if entry is None:
         raise HTTPException(status_code=404, detail="Article not found")
+    if entry.is_redirect:
+        target = entry.get_redirect_entry().path
+        return RedirectResponse(f"/article/{zim_id}/{quote(target)}", status_code=301)
+    if not entry.get_item().mimetype.startswith("text"):
+        # Images, scripts and media linked relatively from article pages
+        return RedirectResponse(f"/resource/{zim_id}/{quote(path)}", status_code=301)
+
+    mtime = meta["mtime"]
+    key = (zim_id, path, mtime, SANITIZER_VERSION)
+    etag = '"%s"' % hashlib.blake2b(repr(key).encode(), digest_size=16).hexdigest()
+    headers = {
+        "Content-Security-Policy": "default-src 'self'",
+        "ETag": etag,
+        "Last-Modified": formatdate(mtime, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    if _not_modified(request, etag, mtime):
+        return Response(status_code=304, headers=headers)
+
+    body = ARTICLE_CACHE.get(key)
+    if body is None:
+        article = reader.get_article(path)
+        if not article:
+            raise HTTPException(status_code=404, detail="Article not found")
+        body = sanitize_html(article.content or "", zim_id, path).encode("utf-8")
+        ARTICLE_CACHE.put(key, body)
+    return Response(body, media_type="text/html; charset=utf-8", headers=headers)
+
+
+def _parse_range(header: str | None, size: int):
+    """Return ``(start, end)`` for a single ``bytes=`` range, None to send
+    the whole body, or raise 416 for an unsatisfiable range."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_s, _, end_s = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_s:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(end_s), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416, headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+@router.get("/resource/{zim_id}/{path:path}")
+def get_resource(zim_id: str, path: str, request: Request):
+    """Stream any entry of an archive, such as images, CSS, JS or video.
+
+    The item's memoryview is sliced and written directly, without copying
+    the blob, and single byte ranges are honoured for media seeking. A
+    range sent with an ``If-Range`` that is not the current ETag gets the
+    whole body, and requests for several ranges get it too.
+    """
+    reader = get_reader(zim_id)
+    entry = reader.get_entry(path) if reader else None
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    if entry.is_redirect:
+        target = entry.get_redirect_entry().path
+        return RedirectResponse(f"/resource/{zim_id}/{quote(target)}", status_code=301)
+
+    item = entry.get_item()
+    if item.mimetype.startswith("text/html"):
+        # Pages go through the sanitizing article route
+        return RedirectResponse(f"/article/{zim_id}/{quote(path)}", status_code=301)
+    with ZIM_READ_SECONDS.time("content"):
+        content = item.content
+    size = len(content)
+    etag = f'"{reader.archive.uuid}-{entry._index}"'
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "ETag": etag,
+        "X-Content-Type-Options": "nosniff",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range != etag:
+        # The client's partial copy is of another version, or dated
+        range_header = None
+    byte_range = _parse_range(range_header, size)
+    status = 200
+    start, end = 0, size - 1
+    if byte_range:
+        start, end = byte_range
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    def stream():
+        # The generator holds the item, keeping the blob alive while streaming
+        view = content
+        for offset in range(start, end + 1, RESOURCE_CHUNK):
+            yield view[offset:min(offset + RESOURCE_CHUNK, end + 1)]
 
-    pdf_bytes = pdfkit.from_string(article.content or "", False)
-    filename = path.split("/")[-1] or "article"
     return StreamingResponse(
-        io.BytesIO(pdf_bytes),
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename={filename}.pdf"},
+        stream(), status_code=status, media_type=item.mimetype, headers=headers
     )
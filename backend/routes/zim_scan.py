@@ -0,0 +1,132 @@
+# zim_scan.py - Metadata-only scan of ZIM directory entries
+import mmap
+import struct
+
+ZIM_MAGIC = 72173914
+_HEADER = struct.Struct("<IHH16sIIQQQQIIQ")
+_DIRENT = struct.Struct("<HBcI")
+_CLUSTER_BLOB = struct.Struct("<II")
+_POINTER = struct.Struct("<Q")
+
+
+class UnsupportedArchive(Exception):
+    """Raised for archives the scanner cannot read, such as split files."""
+
+
+class ScanEntry:
+    __slots__ = ("entry_id", "path", "title", "cluster", "blob")
+
+    def __init__(self, entry_id: int, path: str, title: str, cluster: int, blob: int):
+        self.entry_id = entry_id
+        self.path = path
+        self.title = title
+        self.cluster = cluster
+        self.blob = blob
+
+
+class DirentScanner:
+    """Read the directory entries of a ZIM file without touching clusters.
+
+    Directory entries hold the path, title, mimetype and cluster position
+    of every entry, so redirects and non-HTML entries can be filtered
+    without decompressing any content. Entry ids match libzim's, counting
+    from the first user entry.
+    """
+
+    def __init__(self, filename: str):
+        self._file = open(filename, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as e:
+            self._file.close()
+            raise UnsupportedArchive(f"Cannot map {filename}: {e}") from e
+        try:
+            self._read_header()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_header(self):
+        if len(self._map) < _HEADER.size:
+            raise UnsupportedArchive("File is too small for a ZIM header")
+        (magic, major, minor, _, entry_count, _, path_ptr_pos, _, _,
+         mime_list_pos, _, _, _) = _HEADER.unpack_from(self._map, 0)
+        if magic != ZIM_MAGIC or major not in (5, 6):
+            raise UnsupportedArchive("Not a single-file ZIM archive")
+        if path_ptr_pos + 8 * entry_count > len(self._map):
+            raise UnsupportedArchive("Truncated path pointer list")
+        self.mimetypes = self._read_mimetypes(mime_list_pos)
+        self._pointer_pos = path_ptr_pos
+        self._count = entry_count
+        # Newer archives keep user content in namespace C, apart from
+        # metadata; libzim numbers entries from the first C entry.
+        self.new_scheme = major == 6 and minor >= 1
+        self.first = 0
+        self.end = entry_count
+        if self.new_scheme:
+            self.first = self._namespace_start(b"C")
+            self.end = self._namespace_start(b"D")
+
+    def _read_mimetypes(self, pos: int) -> list[str]:
+        mimetypes = []
+        while True:
+            end = self._map.find(b"\0", pos)
+            if end <= pos:
+                return mimetypes
+            mimetypes.append(self._map[pos:end].decode("utf-8"))
+            pos = end + 1
+
+    def _dirent_pos(self, index: int) -> int:
+        return _POINTER.unpack_from(self._map, self._pointer_pos + 8 * index)[0]
+
+    def _namespace_start(self, namespace: bytes) -> int:
+        """Return the index of the first entry at or after *namespace*."""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _DIRENT.unpack_from(self._map, self._dirent_pos(mid))[2] < namespace:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    @property
+    def entry_count(self) -> int:
+        return self.end - self.first
+
+    def html_entries(self, start: int = 0, stop: int | None = None):
+        """Yield a :class:`ScanEntry` per HTML entry with ids in ``[start, stop)``."""
+        data = self._map
+        pointer_pos = self._pointer_pos + 8 * self.first
+        html = {
+            i for i, mimetype in enumerate(self.mimetypes)
+            if mimetype.startswith("text/html")
+        }
+        stop = self.entry_count if stop is None else min(stop, self.entry_count)
+        for entry_id in range(max(start, 0), stop):
+            pos = _POINTER.unpack_from(data, pointer_pos + 8 * entry_id)[0]
+            mime, _, namespace, _ = _DIRENT.unpack_from(data, pos)
+            # Redirects and deleted entries use reserved mimetype indexes
+            if mime not in html:
+                continue
+            cluster, blob = _CLUSTER_BLOB.unpack_from(data, pos + 8)
+            pos += 16
+            end = data.find(b"\0", pos)
+            path = data[pos:end].decode("utf-8", "replace")
+            pos = end + 1
+            end = data.find(b"\0", pos)
+            title = data[pos:end].decode("utf-8", "replace") if end > pos else path
+            if not self.new_scheme:
+                # Old archives expose paths with their namespace prefix
+                path = f"{namespace.decode()}/{path}"
+            yield ScanEntry(entry_id, path, title, cluster, blob)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,27 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+os.environ.setdefault("SECRET_KEY", "test")
+# The server keeps its config, log and caches under the working directory
+os.chdir(tempfile.mkdtemp(prefix="mnemo-tests-"))
+
+
+@pytest.fixture(scope="session")
+def make_zim(tmp_path_factory):
+    """Return a function writing a small synthetic archive and its path."""
+    sys.path.insert(0, os.path.join(BACKEND, "benchmarks"))
+    from synthetic_zim import generate
+
+    directory = tmp_path_factory.mktemp("zim")
+
+    def make(name: str, entries: int = 40, seed: int = 0, fulltext: bool = False) -> str:
+        path = str(directory / name)
+        generate(path, entries, seed=seed, body_words=40, fulltext=fulltext)
+        return path
+
+    return make
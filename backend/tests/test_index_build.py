@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from routes import zim_loader
+from routes.index_scheduler import IndexCancelled
+from routes.zim_loader import (
+    ZIMReader,
+    _open_build,
+    get_article_meta,
+    index_up_to_date,
+    rebuild_search_index,
+    search_index_has_entries,
+    shard_path,
+)
+
+OPTIONS = {
+    "batch_size": 8,
+    "content": False,
+    "content_max_bytes": 1 << 20,
+    "max_rows_per_sec": 0,
+    "scan_workers": 1,
+}
+
+
+@pytest.fixture(autouse=True)
+def shard_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(zim_loader, "SHARD_DIR", str(tmp_path / "index"))
+
+
+@pytest.fixture(scope="module")
+def archives(make_zim):
+    # Two writes of the same content differ only in their UUID
+    return make_zim("a.zim"), make_zim("b.zim")
+
+
+def titles(name: str) -> list:
+    conn = sqlite3.connect(shard_path(name))
+    try:
+        return conn.execute("SELECT path FROM titles ORDER BY path").fetchall()
+    finally:
+        conn.close()
+
+
+def test_complete_shard_matches_only_its_archive(archives):
+    reader = ZIMReader(archives[0])
+    rebuild_search_index("a.zim", reader, OPTIONS)
+    assert search_index_has_entries("a.zim", reader, OPTIONS)
+    assert not search_index_has_entries("a.zim", ZIMReader(archives[1]), OPTIONS)
+    assert not search_index_has_entries("a.zim", reader, {**OPTIONS, "content": True})
+
+
+def test_replaced_archive_is_stale(archives):
+    old = ZIMReader(archives[0])
+    rebuild_search_index("a.zim", old, OPTIONS)
+    # The replacement has the same size and mtime but another UUID
+    stat = os.stat(archives[0])
+    meta = {"mtime": stat.st_mtime, "size": stat.st_size, "uuid": str(old.archive.uuid)}
+    assert index_up_to_date(Path(archives[0]), meta, OPTIONS, old)
+    assert not index_up_to_date(Path(archives[0]), meta, OPTIONS, ZIMReader(archives[1]))
+
+
+def test_build_resumes_only_for_the_same_fingerprint(tmp_path):
+    path = str(tmp_path / "x.zim.db.building")
+    conn, info = _open_build(path, "5:one")
+    conn.execute("INSERT INTO index_info (key, value) VALUES ('last_entry', '7')")
+    conn.commit()
+    conn.close()
+
+    conn, info = _open_build(path, "5:one")
+    conn.close()
+    assert info["last_entry"] == "7"
+
+    conn, info = _open_build(path, "5:two")
+    conn.close()
+    assert info == {"fingerprint": "5:two"}
+
+
+def test_interrupted_build_resumes_without_duplicates(archives, monkeypatch):
+    reader = ZIMReader(archives[0])
+    expected = rebuild_search_index("a.zim", reader, OPTIONS)
+    expected_titles = titles("a.zim")
+    os.remove(shard_path("a.zim"))
+
+    def cancel(*args):
+        raise IndexCancelled()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(zim_loader, "pace", cancel)
+        with pytest.raises(IndexCancelled):
+            rebuild_search_index("a.zim", reader, OPTIONS)
+    assert os.path.exists(shard_path("a.zim") + ".building")
+    assert not os.path.exists(shard_path("a.zim"))
+
+    assert rebuild_search_index("a.zim", reader, OPTIONS) == expected
+    assert titles("a.zim") == expected_titles
+
+
+def test_index_workers_do_not_import_argos(tmp_path):
+    # Pool workers import the module holding the build function afresh
+    code = "import sys, routes.zim_loader; print(sorted(m for m in sys.modules if 'argos' in m))"
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=tmp_path, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    assert result.stdout.strip() == "[]"
+
+
+def test_small_archives_read_articles_in_id_order(archives, monkeypatch):
+    by_id = [(a.entry_id, a.url, a.content) for a in ZIMReader(archives[0]).articles()]
+    assert by_id
+    # Larger archives go through the directory scan in cluster order
+    monkeypatch.setattr(zim_loader, "get_cluster_cache_max_size", lambda: 0)
+    by_cluster = [(a.entry_id, a.url, a.content) for a in ZIMReader(archives[0]).articles()]
+    assert by_cluster == by_id
+
+
+def test_article_meta_records_language(archives):
+    rebuild_search_index("a.zim", ZIMReader(archives[0]), OPTIONS)
+    path = titles("a.zim")[0][0]
+    assert get_article_meta("a.zim", path) == {"lang": "en"}
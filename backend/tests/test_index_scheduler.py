@@ -0,0 +1,101 @@
+import time
+from pathlib import Path
+
+import pytest
+
+from routes.index_scheduler import IndexScheduler, pace
+
+
+def build(path: str, name: str, options: dict) -> int:
+    """Stand-in for a shard build: one paced batch per step."""
+    for step in range(options["steps"]):
+        pace(0.0, 1)
+        Path(path + ".progress").write_text(str(step + 1))
+        time.sleep(0.02)
+    return options["steps"]
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = IndexScheduler(build)
+    scheduler.configure({"index_workers": 1, "index_nice": 0, "index_latency_target_ms": 0})
+    yield scheduler
+    scheduler.cancel()
+    if scheduler._pool is not None:
+        scheduler._pool.shutdown(cancel_futures=True)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = tmp_path / "a.zim"
+    path.write_bytes(b"zim")
+    return path
+
+
+def progress(archive: Path) -> int:
+    try:
+        return int(Path(f"{archive}.progress").read_text() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def wait_for(check, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def state(scheduler, name: str) -> str:
+    return {job["zim"]: job["state"] for job in scheduler.snapshot()}[name]
+
+
+def test_paused_build_holds_until_resumed(scheduler, archive):
+    done = []
+    assert scheduler.submit(archive, {"steps": 40}, done.append)
+    wait_for(lambda: progress(archive) > 0)
+    assert scheduler.pause("a.zim")
+    assert state(scheduler, "a.zim") == "paused"
+    # At most the batch in flight completes after the pause
+    time.sleep(0.3)
+    held = progress(archive)
+    time.sleep(0.5)
+    assert progress(archive) == held < 40
+
+    assert scheduler.resume("a.zim")
+    scheduler.wait(["a.zim"])
+    assert state(scheduler, "a.zim") == "done"
+    assert progress(archive) == 40
+    assert [future.result() for future in done] == [40]
+
+
+def test_cancelled_build_stays_cancelled_until_resumed(scheduler, archive):
+    done = []
+    assert scheduler.submit(archive, {"steps": 1000}, done.append)
+    wait_for(lambda: progress(archive) > 0)
+    assert scheduler.cancel("a.zim")
+    scheduler.wait(["a.zim"])
+    assert state(scheduler, "a.zim") == "cancelled"
+    assert progress(archive) < 1000
+    # Cancelled builds do not report an outcome
+    assert done == []
+    # Until the archive changes, it is not queued again on its own
+    assert not scheduler.submit(archive, {"steps": 1000}, done.append)
+
+    stopped = progress(archive)
+    assert scheduler.resume("a.zim")
+    wait_for(lambda: progress(archive) != stopped)
+    assert scheduler.cancel("a.zim")
+    scheduler.wait(["a.zim"])
+    assert state(scheduler, "a.zim") == "cancelled"
+
+
+def test_queue_pause_and_cancel_before_start(scheduler, archive):
+    assert scheduler.pause()
+    assert scheduler.submit(archive, {"steps": 1}, lambda future: None)
+    time.sleep(0.3)
+    assert state(scheduler, "a.zim") == "paused"
+    assert scheduler.cancel()
+    assert state(scheduler, "a.zim") == "cancelled"
+    assert progress(archive) == 0
+    assert scheduler._pool is None
@@ -0,0 +1,101 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import llm
+
+TOKENS = ["Kiwix ", "works ", "offline."]
+
+
+class StubLLM(BaseHTTPRequestHandler):
+    """OpenAI-compatible chat completions and Ollama generate endpoints."""
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((self.path, request))
+        if self.path == "/fail/chat/completions":
+            self.send_error(500, "model crashed")
+            return
+        self.send_response(200)
+        self.end_headers()
+        if self.path == "/v1/chat/completions":
+            for token in TOKENS:
+                chunk = {"choices": [{"delta": {"content": token}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+        else:
+            for token in TOKENS:
+                self.wfile.write(json.dumps({"response": token, "done": False}).encode() + b"\n")
+            self.wfile.write(json.dumps({"response": "", "done": True}).encode() + b"\n")
+        # Anything after the final chunk must not be relayed
+        self.wfile.write(b"data: ignored\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubLLM)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def stream(stub, monkeypatch):
+    """Return a function posting a question and returning the SSE events."""
+    monkeypatch.setattr(llm, "retrieve", lambda *args: ("", [{"title": "T", "url": "u"}]))
+    monkeypatch.setattr(llm, "_CLIENT", None)
+    monkeypatch.setattr(llm, "_LIMIT", None)
+    app = FastAPI()
+    app.include_router(llm.router)
+
+    def post(path: str) -> list[tuple[str, str]]:
+        url = f"http://127.0.0.1:{stub.server_port}{path}"
+        monkeypatch.setattr(llm, "load_config", lambda: {"llm_enabled": True, "llm_url": url})
+        with TestClient(app) as client:
+            body = client.post("/llm/stream", json={"query": "Does it work?"}).text
+            client.portal.call(llm.close_client)
+        events = []
+        for block in body.strip().split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in block.split("\n"))
+            events.append((fields.get("event", "message"), fields["data"]))
+        return events
+
+    return post
+
+
+def tokens(events) -> list[str]:
+    return [json.loads(data)["token"] for event, data in events if event == "message"]
+
+
+def test_openai_stream_is_relayed(stream, stub):
+    events = stream("/v1/chat/completions")
+    assert events[0] == ("sources", json.dumps([{"title": "T", "url": "u"}]))
+    assert tokens(events) == TOKENS
+    assert events[-1] == ("end", "done")
+    assert len(events) == len(TOKENS) + 2
+    path, request = stub.requests[-1]
+    assert request["stream"] is True
+    assert request["messages"][0]["content"].endswith("Does it work?")
+
+
+def test_ollama_stream_is_relayed(stream, stub):
+    events = stream("/api/generate")
+    assert tokens(events) == TOKENS
+    assert events[-1] == ("end", "done")
+    assert stub.requests[-1][1]["prompt"].endswith("Does it work?")
+
+
+def test_upstream_error_is_reported(stream):
+    events = stream("/fail/chat/completions")
+    assert [event for event, _ in events] == ["sources", "error", "end"]
+    assert "500" in json.loads(events[1][1])
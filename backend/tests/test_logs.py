@@ -0,0 +1,118 @@
+import asyncio
+import json
+import logging
+import os
+from logging.handlers import RotatingFileHandler
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import logger
+from routes import logs
+
+
+def record(stamp: str, level: str, text: str) -> str:
+    return f"2024-01-01 12:00:{stamp},000 [{level}] {text}\n"
+
+
+@pytest.fixture
+def log_file(tmp_path, monkeypatch):
+    path = tmp_path / "server.log"
+    monkeypatch.setattr(logs, "LOG_FILE", str(path))
+    monkeypatch.setattr(logs, "LOG_BACKUPS", 2)
+    monkeypatch.setattr(logs, "STREAM_POLL", 0.01)
+    monkeypatch.setattr(logs, "get_session_username", lambda request: "admin")
+    return path
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(logs.router)
+    return TestClient(app)
+
+
+def test_tail_filters_and_reads_rotated_files(log_file, client):
+    (log_file.parent / "server.log.1").write_text(
+        record("01", "ERROR", "old failure") + "Traceback (most recent call last):\n"
+        + record("02", "INFO", "old info")
+    )
+    log_file.write_text(record("03", "INFO", "started") + record("04", "ERROR", "new failure"))
+
+    tail = client.get("/admin/logs", params={"lines": 2}).json()["logs"]
+    assert tail == record("03", "INFO", "started") + record("04", "ERROR", "new failure")
+
+    errors = client.get("/admin/logs", params={"level": "error"}).json()["logs"]
+    assert errors == (
+        record("01", "ERROR", "old failure") + "Traceback (most recent call last):\n"
+        + record("04", "ERROR", "new failure")
+    )
+    since = client.get("/admin/logs", params={"since": "2024-01-01T12:00:02"}).json()["logs"]
+    assert "old failure" not in since and "old info" in since
+    assert client.get("/admin/logs", params={"level": "loud"}).status_code == 400
+
+
+def test_logs_require_admin(log_file, client, monkeypatch):
+    log_file.write_text(record("01", "INFO", "started"))
+    monkeypatch.setattr(logs, "get_session_username", lambda request: "guest")
+    assert client.get("/admin/logs").status_code == 403
+    assert client.get("/admin/logs/stream").status_code == 403
+
+
+def test_stream_follows_appends_and_rotation(log_file):
+    log_file.write_text(record("01", "INFO", "backlog") + record("02", "DEBUG", "hidden"))
+
+    async def read():
+        response = await logs.stream_logs(None, lines=10, level="info")
+        events = response.body_iterator
+        received = [await anext(events)]
+        with open(log_file, "a") as f:
+            f.write(record("03", "ERROR", "appended") + "  detail line\n")
+            f.write(record("04", "DEBUG", "filtered"))
+        received.append(await anext(events))
+        # Rotate, then write to the new file
+        os.replace(log_file, f"{log_file}.1")
+        log_file.write_text(record("05", "WARNING", "after rotation"))
+        received.append(await anext(events))
+        await events.aclose()
+        return received
+
+    events = asyncio.run(asyncio.wait_for(read(), 10))
+    assert [json.loads(event.removeprefix("data: ")) for event in events] == [
+        [record("01", "INFO", "backlog").strip()],
+        [record("03", "ERROR", "appended").strip(), "  detail line"],
+        [record("05", "WARNING", "after rotation").strip()],
+    ]
+
+
+def test_only_the_server_rotates(tmp_path, monkeypatch):
+    path = str(tmp_path / "server.log")
+    monkeypatch.setattr(logger, "LOG_FILE", path)
+    monkeypatch.setattr(logger, "LOG_MAX_BYTES", 200)
+    monkeypatch.setattr(logger, "LOG_BACKUPS", 3)
+    monkeypatch.setenv(logger.LOG_OWNER_ENV, str(os.getpid()))
+    server = logger.file_handler()
+    # An indexing process inherits the server's pid
+    monkeypatch.setenv(logger.LOG_OWNER_ENV, "1")
+    worker = logger.file_handler()
+    assert isinstance(server, RotatingFileHandler)
+    assert not isinstance(worker, RotatingFileHandler)
+
+    def emit(handler, msg):
+        handler.emit(logging.makeLogRecord({"msg": msg}))
+
+    try:
+        for i in range(10):
+            emit(worker, f"worker {i:02} " + "x" * 40)
+        assert not os.path.exists(path + ".1")
+        # The server's next record rotates the file the worker filled
+        emit(server, "server")
+        emit(worker, "worker after rotation")
+    finally:
+        server.close()
+        worker.close()
+    with open(path + ".1") as f:
+        assert len(f.read().splitlines()) == 10
+    with open(path) as f:
+        assert f.read().splitlines() == ["server", "worker after rotation"]
@@ -0,0 +1,20 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import metrics_routes
+
+
+def test_metrics_scrape_runs_off_the_event_loop():
+    app = FastAPI()
+    app.include_router(metrics_routes.router)
+    with TestClient(app) as client:
+        response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    # The scrape itself holds one of anyio's worker threads
+    busy = next(
+        line for line in response.text.splitlines()
+        if line.startswith('mnemo_pool_busy{pool="anyio"}')
+    )
+    assert int(busy.split()[-1]) >= 1
+    assert "mnemo_index_jobs" in response.text
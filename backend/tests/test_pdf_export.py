@@ -0,0 +1,105 @@
+from concurrent.futures import Future
+
+import pytest
+
+from routes import pdf_export
+from routes.pdf_export import PdfQueueFull, submit_pdf
+
+
+class IdlePool:
+    """Executor that accepts jobs but never runs them."""
+
+    def submit(self, fn, *args):
+        return Future()
+
+
+@pytest.fixture(autouse=True)
+def idle_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_export, "_POOL", IdlePool())
+    monkeypatch.setattr(pdf_export, "JOBS", {})
+    monkeypatch.setattr(pdf_export, "PDF_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(pdf_export, "PDF_MAX_PENDING", 2)
+
+
+def submit(path: str):
+    meta = {"uuid": "u", "size": 1}
+    return submit_pdf(None, meta, "a.zim", path, 1 << 20)
+
+
+def test_queue_admits_exactly_the_limit():
+    submit("A/1")
+    submit("A/2")
+    with pytest.raises(PdfQueueFull):
+        submit("A/3")
+    assert len(pdf_export.JOBS) == 2
+
+
+def test_queued_article_and_cached_pdf_are_not_refused():
+    first = submit("A/1")
+    submit("A/2")
+    assert submit("A/1") is first
+    cached = pdf_export.pdf_key({"uuid": "u", "size": 1}, "A/3")
+    open(f"{pdf_export.PDF_CACHE_DIR}/{cached}.pdf", "wb").close()
+    assert submit("A/3").status == "done"
+
+
+class Item:
+    def __init__(self, content: bytes, mimetype: str):
+        self.content = content
+        self.mimetype = mimetype
+
+
+class Entry:
+    is_redirect = False
+
+    def __init__(self, path: str, item: Item):
+        self.path = path
+        self.item = item
+
+    def get_item(self):
+        return self.item
+
+
+class Reader:
+    """Archive holding an image and two stylesheets under ``-/``."""
+
+    files = {
+        "-/bg.png": Item(b"png", "image/png"),
+        "-/style.css": Item(
+            b'@import "base.css"; .a { background: url(bg.png) }', "text/css"
+        ),
+        "-/base.css": Item(
+            b"@import url(http://evil.test/x.css); .b { background: url('http://evil.test/b.png') }",
+            "text/css",
+        ),
+    }
+
+    def get_entry(self, path):
+        item = self.files.get(path)
+        return Entry(path, item) if item else None
+
+
+def test_inlining_leaves_no_network_references():
+    page = """<html><head>
+<link rel="stylesheet" href="../-/style.css">
+<link rel="icon" href="http://evil.test/favicon.ico">
+<style>@import url("http://evil.test/s.css"); p { background: url(http://evil.test/p.png) }
+.c { background: url(../-/bg.png) }</style>
+</head><body>
+<div style="background-image: url(http://evil.test/d.png)">x</div>
+<video poster="http://evil.test/poster.jpg" src=http://evil.test/v.mp4></video>
+<iframe src="http://evil.test/frame"><p>fallback</p></iframe>
+<embed src="http://evil.test/plugin.swf">
+<img src="../-/bg.png" srcset="http://evil.test/2x.png 2x" alt="bg">
+<a href="http://example.org/">link</a>
+</body></html>"""
+    out = pdf_export.inline_resources(Reader(), "A/Page", page)
+    assert "evil.test" not in out
+    assert "<iframe" not in out and "fallback" not in out and "<embed" not in out
+    png = "data:image/png;base64,cG5n"
+    # The image, the page's style block and the linked stylesheet's url()
+    assert out.count(png) == 3
+    assert '<img src="%s" alt="bg">' % png in out
+    assert ".b {" in out and ".a {" in out
+    # Links are navigation, not fetched when rendering
+    assert '<a href="http://example.org/">' in out
@@ -0,0 +1,111 @@
+import re
+import time
+
+import pytest
+
+from routes.sanitizer import sanitize_html
+
+HANDLER = re.compile(r"<[^>]*\son[a-z]+\s*=", re.IGNORECASE)
+
+
+def clean(content: str) -> str:
+    return sanitize_html(content, "wiki", "A/Page")
+
+
+def assert_safe(out: str):
+    assert not HANDLER.search(out)
+    assert "javascript:" not in out.lower()
+    assert "<script" not in out.lower()
+
+
+def test_quoted_attributes():
+    out = clean("""<p class="a" title='b > c' onclick="x()">t</p>""")
+    assert out == '<p class="a" title="b &gt; c">t</p>'
+
+
+def test_unquoted_attributes():
+    out = clean("<a href=Other title=x onmouseover=alert(1)>t</a>")
+    assert out == '<a href="/article/wiki/A/Other" title="x">t</a>'
+
+
+def test_apostrophe_in_unquoted_value():
+    out = clean("<img src=x onerror=alert(1) alt=it's>")
+    assert_safe(out)
+    assert out == (
+        '<img src="/resource/wiki/A/x" alt="it&#x27;s" loading="lazy" decoding="async">'
+    )
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        '<img src="x onerror=alert(1)>',
+        "<img src=x onerror=alert(1) alt='",
+        "<img src=x alt=\"a\"onerror=alert(1)>",
+        "<img/src=x/onerror=alert(1)>",
+        "<img src=x =onerror=alert(1) \"onerror=alert(1)>",
+        "<<img src=x onerror=alert(1)>",
+        "<a href=' javascript:alert(1)'>x</a>",
+        "<a href=\"jav&#x09;ascript:alert(1)\">x</a>",
+        "<SCRIPT>alert(1)</SCRIPT >",
+        "<script>alert(1)</script foo><b>",
+        "<script>alert(1)",
+        "<!--<img src=x onerror=alert(1)>",
+        "<style></style x><img src=x onerror=alert(1)></style>",
+        "<svg><style><img src=x onerror=alert(1)></style></svg>",
+        "<svg><a><animate attributeName=href values=javascript:alert(1) /></a></svg>",
+    ],
+)
+def test_malformed_markup_is_safe(content):
+    assert_safe(clean(content))
+
+
+def test_stray_less_than_is_escaped():
+    assert clean("1 < 2 and <3 </ x>") == "1 &lt; 2 and &lt;3 &lt;/ x>"
+
+
+def test_unterminated_tag_is_dropped():
+    assert clean("text <img src=x onerror=alert(1)") == "text "
+
+
+def test_dropped_elements_and_comments():
+    out = clean("<!DOCTYPE html><!-- c --><iframe src=x>in</iframe><base href=/><p>ok</p>")
+    assert out == "<!DOCTYPE html><p>ok</p>"
+
+
+def test_raw_text_is_kept_but_cannot_open_tags():
+    assert clean("<style>a > b {}</style>") == "<style>a > b {}</style>"
+    assert clean("<textarea><b></textarea>") == "<textarea>&lt;b></textarea>"
+
+
+def test_links_and_resources_are_rewritten():
+    out = clean('<a href="../B/Other#s">x</a><img srcset="i.png 1x, //cdn/i.png 2x">')
+    assert '<a href="/article/wiki/B/Other#s">' in out
+    assert 'srcset="/resource/wiki/A/i.png 1x, //cdn/i.png 2x"' in out
+
+
+@pytest.mark.parametrize("unit", ['<a x="', "<a '", "<!--", "<script", "<script></script"])
+def test_hostile_input_stays_linear(unit):
+    start = time.perf_counter()
+    clean(unit * 50000)
+    assert time.perf_counter() - start < 2
+
+
+@pytest.mark.parametrize(
+    "href, expected",
+    [
+        ("Other", "/article/wiki/A/Other"),
+        ("Sub/Other", "/article/wiki/A/Sub/Other"),
+        ("./Other", "/article/wiki/A/Other"),
+        ("Sub/../Other", "/article/wiki/A/Other"),
+        ("Other?x=1", "/article/wiki/A/Other?x=1"),
+    ],
+)
+def test_plain_links_match_full_rewrite(href, expected):
+    assert clean(f'<a href="{href}">x</a>') == f'<a href="{expected}">x</a>'
+    assert clean(f'<A HREF="{href}">x</a>') == f'<a href="{expected}">x</a>'
+
+
+def test_plain_tags_pass_through():
+    content = '<div class="infobox"><p>Text <b>bold</b></p><br></div>'
+    assert clean(content) == content
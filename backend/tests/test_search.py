@@ -0,0 +1,135 @@
+import sqlite3
+import time
+
+import pytest
+
+from routes import search, zim_loader
+from routes.search import BACKENDS, SearchSession, rank_score, search_suggest
+from routes.zim_loader import ZIMReader, normalize_key, rebuild_search_index
+
+OPTIONS = {
+    "batch_size": 64,
+    "content": False,
+    "content_max_bytes": 1 << 20,
+    "max_rows_per_sec": 0,
+    "scan_workers": 1,
+}
+
+
+@pytest.fixture(autouse=True)
+def shard_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(zim_loader, "SHARD_DIR", str(tmp_path / "index"))
+
+
+@pytest.fixture
+def targets(monkeypatch):
+    """Set the archives searched, bypassing the check for their shards."""
+    def use(*names):
+        monkeypatch.setattr(
+            search, "search_targets", lambda: [(name, BACKENDS["sqlite"]) for name in names]
+        )
+    return use
+
+
+def test_missing_shard_raises_operational_error():
+    with pytest.raises(sqlite3.OperationalError):
+        BACKENDS["sqlite"].suggest("missing.zim", "ka")
+    with pytest.raises(sqlite3.OperationalError):
+        BACKENDS["sqlite"].search("missing.zim", "ka*")
+
+
+def test_search_skips_missing_shard(targets):
+    targets("missing.zim")
+    session = SearchSession("ka*")
+    assert session.next_page() == []
+    assert session.exhausted()
+
+
+def test_suggest_skips_missing_shard(make_zim, targets):
+    rebuild_search_index("a.zim", ZIMReader(make_zim("a.zim")), OPTIONS)
+    targets("missing.zim", "a.zim")
+    title = BACKENDS["sqlite"].suggest("a.zim", "", 1)[0][2]
+    suggestions = search_suggest(q=title, limit=5)["suggestions"]
+    assert {"zim_id": "a.zim", "title": title} in [
+        {"zim_id": s["zim_id"], "title": s["title"]} for s in suggestions
+    ]
+
+
+def test_rebuild_keeps_shard_searchable(make_zim, targets, monkeypatch):
+    reader = ZIMReader(make_zim("a.zim"))
+    rebuild_search_index("a.zim", reader, OPTIONS)
+    targets("a.zim")
+    title = BACKENDS["sqlite"].suggest("a.zim", "", 1)[0][2]
+    seen = []
+    replace = zim_loader.os.replace
+
+    def swap(src, dst):
+        # Searches just before the swap still find the previous shard
+        seen.append(search_suggest(q=title, limit=1)["suggestions"])
+        replace(src, dst)
+
+    monkeypatch.setattr(zim_loader.os, "replace", swap)
+    rebuild_search_index("a.zim", reader, {**OPTIONS, "content": True})
+    assert seen and seen[0]
+    assert search_suggest(q=title, limit=1)["suggestions"] == seen[0]
+
+
+def test_archives_merge_by_rank(make_zim, targets):
+    for name in ("a.zim", "b.zim"):
+        rebuild_search_index(name, ZIMReader(make_zim(name)), OPTIONS)
+    targets("a.zim", "b.zim")
+    word = BACKENDS["sqlite"].suggest("a.zim", "", 1)[0][2].split()[0]
+    hits = BACKENDS["sqlite"].search("a.zim", word, 3, 1)
+    assert [hit["score"] for hit in hits] == [rank_score(rank) for rank in (1, 2, 3)][: len(hits)]
+
+    page = SearchSession(word, 4).next_page()
+    # Each archive's best hit comes before either second best
+    assert [hit["zim_id"] for hit in page[:2]] == ["a.zim", "b.zim"]
+    assert [hit["score"] for hit in page[:2]] == [rank_score(0)] * 2
+
+
+def test_libzim_suggestions_match_sqlite_order(make_zim, monkeypatch):
+    reader = ZIMReader(make_zim("native.zim", fulltext=True))
+    monkeypatch.setattr(search, "get_reader", lambda zim_id: reader)
+    rebuild_search_index("native.zim", reader, OPTIONS)
+    # A word from inside a title: libzim also matches titles that do not
+    # start with it
+    titles = [row[2] for row in BACKENDS["sqlite"].suggest("native.zim", "", 40)]
+    for prefix in {normalize_key(t.split()[1])[:3] for t in titles} | {"a", "ka"}:
+        native = BACKENDS["libzim"].suggest("native.zim", prefix, 5)
+        assert native == BACKENDS["sqlite"].suggest("native.zim", prefix, 5)
+
+
+class TiedBackend:
+    """Three hits per archive, answering later for archives earlier in the list."""
+
+    delays = {"a.zim": 0.2, "b.zim": 0.1, "c.zim": 0}
+
+    def search(self, zim_id, q, limit, offset=0):
+        time.sleep(self.delays[zim_id])
+        return [
+            {"zim_id": zim_id, "title": f"{zim_id} {rank}", "path": str(rank),
+             "score": rank_score(rank), "snippet": ""}
+            for rank in range(offset, min(offset + limit, 3))
+        ]
+
+
+def test_tied_hits_are_each_served_once(monkeypatch):
+    backend = TiedBackend()
+    monkeypatch.setattr(
+        search, "search_targets", lambda: [(name, backend) for name in backend.delays]
+    )
+    # No title has every term, so the stream waits for every archive
+    session = SearchSession("word OR zzzzq", 1)
+    streamed = list(session.stream())
+    assert streamed[0]["zim_id"] == "c.zim"
+    # Keep the best streamed hit, as the client does
+    pages = [sorted(streamed, key=search._order)[:1]]
+    while not session.exhausted():
+        pages.append(session.next_page())
+
+    served = [(hit["zim_id"], hit["path"]) for page in pages for hit in page]
+    assert sorted(served) == sorted(
+        (name, str(rank)) for name in backend.delays for rank in range(3)
+    )
+    assert served[:3] == [("a.zim", "0"), ("b.zim", "0"), ("c.zim", "0")]
@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import os
+from collections import defaultdict
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import config, zim_loader
+
+# A ZIM header followed by filler
+DATA = b"ZIM\x04\x06\x00\x01\x00" + bytes(range(256)) * 1024
+
+
+@pytest.fixture
+def zim_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "load_config", lambda: {"zim_dir": str(tmp_path)})
+    monkeypatch.setattr(config, "get_session_username", lambda request: "admin")
+    monkeypatch.setattr(config, "_UPLOAD_HASHES", {})
+    # Locks bind to the event loop of the test that first waits on them
+    monkeypatch.setattr(config, "_UPLOAD_LOCKS", defaultdict(asyncio.Lock))
+    monkeypatch.setattr(zim_loader, "load_zim_files", lambda: None)
+    return tmp_path
+
+
+@pytest.fixture
+def app(zim_dir):
+    app = FastAPI()
+    app.include_router(config.router)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    with TestClient(app) as client:
+        yield client
+
+
+def put(client, offset: int, body: bytes):
+    return client.put(
+        f"/admin/upload-zim/a.zim?offset={offset}&total={len(DATA)}", content=body
+    )
+
+
+def test_upload_resumes_at_stored_offset(client, zim_dir):
+    half = len(DATA) // 2
+    assert put(client, 0, DATA[:half]).json()["offset"] == half
+    assert client.get("/admin/upload-zim/a.zim").json()["offset"] == half
+    progress = client.get("/admin/upload-progress").json()["uploads"]["a.zim"]
+    assert progress["received"] == half and progress["progress"] == 50
+
+    assert put(client, half, DATA[half:]).json()["offset"] == len(DATA)
+    digest = hashlib.sha256(DATA).hexdigest()
+    done = client.post(f"/admin/upload-zim/a.zim/complete?sha256={digest}")
+    assert done.status_code == 200 and done.json()["sha256"] == digest
+    assert (zim_dir / "a.zim").read_bytes() == DATA
+    assert not os.path.exists(zim_dir / ".a.zim.part")
+
+
+def test_offset_mismatch_reports_stored_offset(client):
+    put(client, 0, DATA[:100])
+    response = put(client, 50, DATA[50:])
+    assert response.status_code == 409
+    assert response.json()["detail"]["offset"] == 100
+
+
+def test_checksum_is_verified(client, zim_dir):
+    put(client, 0, DATA)
+    response = client.post("/admin/upload-zim/a.zim/complete?sha256=" + "0" * 64)
+    assert response.status_code == 400
+    assert not os.listdir(zim_dir)
+
+
+def test_checksum_after_restart_hashes_the_file(client, zim_dir):
+    put(client, 0, DATA[:100])
+    # A restarted server no longer has the running hash
+    config._UPLOAD_HASHES.clear()
+    put(client, 100, DATA[100:])
+    done = client.post("/admin/upload-zim/a.zim/complete")
+    assert done.json()["sha256"] == hashlib.sha256(DATA).hexdigest()
+
+
+def test_progress_requires_admin(client, monkeypatch):
+    monkeypatch.setattr(config, "get_session_username", lambda request: "reader")
+    assert client.get("/admin/upload-progress").status_code == 403
+
+
+def test_concurrent_puts_are_serialized(app, zim_dir):
+    async def body(byte: int):
+        for _ in range(2 * byte):
+            yield bytes([byte]) * config.UPLOAD_CHUNK
+            await asyncio.sleep(0)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await asyncio.gather(*(
+                client.put("/admin/upload-zim/a.zim?offset=0", content=body(byte))
+                for byte in (2, 1)
+            ))
+
+    asyncio.run(run())
+    data = (zim_dir / ".a.zim.part").read_bytes()
+    # One upload restarted the file after the other, without interleaving
+    assert data in (bytes([1]) * 2 * config.UPLOAD_CHUNK, bytes([2]) * 4 * config.UPLOAD_CHUNK)
+    assert config._UPLOAD_HASHES["a.zim"][1].hexdigest() == hashlib.sha256(data).hexdigest()
@@ -0,0 +1,113 @@
+import shutil
+
+import pytest
+
+from routes import zim_loader
+from routes.zim_loader import load_zim_files
+
+
+class Scheduler:
+    """Accepts builds without running them."""
+
+    def configure(self, config):
+        pass
+
+    def submit(self, zim_path, options, on_done):
+        return True
+
+    def active(self):
+        return set()
+
+    def wait(self, names):
+        pass
+
+
+@pytest.fixture
+def zim_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "zim"
+    directory.mkdir()
+    config = {"zim_dir": str(directory), "zim_watch_interval": 0.01}
+    monkeypatch.setattr(zim_loader, "load_config", lambda: config)
+    monkeypatch.setattr(zim_loader, "SHARD_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(zim_loader, "CACHE_PATH", str(tmp_path / "zim_index.json"))
+    monkeypatch.setattr(zim_loader, "SCHEDULER", Scheduler())
+    monkeypatch.setattr(zim_loader, "ZIM_INDEX", {})
+    monkeypatch.setattr(zim_loader, "ZIM_META", ())
+    return directory
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    """Names of the archives opened, in order."""
+    names = []
+    reader = zim_loader.ZIMReader
+
+    def open_reader(path):
+        names.append(path.rsplit("/", 1)[-1])
+        return reader(path)
+
+    monkeypatch.setattr(zim_loader, "ZIMReader", open_reader)
+    return names
+
+
+def registry() -> tuple:
+    return sorted(zim_loader.ZIM_INDEX), sorted(m["file"] for m in zim_loader.ZIM_META)
+
+
+def test_added_and_removed_archives_update_the_registry(zim_dir, opened, make_zim):
+    shutil.copy(make_zim("a.zim"), zim_dir)
+    load_zim_files()
+    assert registry() == (["a.zim"], ["a.zim"])
+    first = zim_loader.ZIM_INDEX
+    reader = zim_loader.get_reader("a.zim")
+
+    shutil.copy(make_zim("b.zim", seed=1), zim_dir)
+    load_zim_files()
+    assert registry() == (["a.zim", "b.zim"], ["a.zim", "b.zim"])
+    # The unchanged archive keeps its reader; only the new one is opened
+    assert opened == ["a.zim", "b.zim"]
+    assert zim_loader.get_reader("a.zim") is reader
+    # The registry is replaced, never mutated under readers
+    assert sorted(first) == ["a.zim"]
+
+    (zim_dir / "a.zim").unlink()
+    load_zim_files()
+    assert registry() == (["b.zim"], ["b.zim"])
+    assert opened == ["a.zim", "b.zim"]
+    assert zim_loader.get_reader("a.zim") is None
+
+
+def test_replaced_archive_is_reopened(zim_dir, opened, make_zim):
+    shutil.copy(make_zim("a.zim"), zim_dir)
+    load_zim_files()
+    reader = zim_loader.get_reader("a.zim")
+    shutil.copy(make_zim("a2.zim", entries=60), zim_dir / "a.zim")
+    load_zim_files()
+    assert opened == ["a.zim", "a.zim"]
+    assert zim_loader.get_reader("a.zim") is not reader
+    assert zim_loader.get_loaded_meta("a.zim")["size"] == (zim_dir / "a.zim").stat().st_size
+
+
+class Reloaded(Exception):
+    pass
+
+
+def test_watcher_reloads_once_the_directory_settles(zim_dir, make_zim, monkeypatch):
+    scans = []
+    scan = zim_loader._scan_zim_dir
+
+    def record():
+        scans.append(scan())
+        return scans[-1]
+
+    def reload():
+        raise Reloaded()
+
+    monkeypatch.setattr(zim_loader, "_scan_zim_dir", record)
+    monkeypatch.setattr(zim_loader, "load_zim_files", reload)
+    shutil.copy(make_zim("a.zim"), zim_dir)
+    with pytest.raises(Reloaded):
+        zim_loader._watch_zim_dir({})
+    # The change is seen, then confirmed by an identical scan
+    assert len(scans) == 2 and scans[0] == scans[1]
+    assert list(scans[0]) == ["a.zim"]
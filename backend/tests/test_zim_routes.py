@@ -0,0 +1,98 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import zim_routes
+from routes.zim_loader import ARTICLE_CACHE, ZIMReader
+
+
+@pytest.fixture(scope="module")
+def archive(make_zim):
+    from synthetic_zim import Corpus
+
+    return make_zim("routes.zim"), Corpus.path(Corpus().title(0))
+
+
+@pytest.fixture
+def client(archive, monkeypatch):
+    reader = ZIMReader(archive[0])
+    meta = {"file": "routes.zim", "mtime": 1700000000.0}
+    monkeypatch.setattr(zim_routes, "get_reader", lambda zim_id: reader)
+    monkeypatch.setattr(zim_routes, "get_loaded_meta", lambda zim_id: meta)
+    ARTICLE_CACHE.clear()
+    app = FastAPI()
+    app.include_router(zim_routes.router)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_article_revalidates_with_etag(client, archive):
+    url = f"/article/routes.zim/{archive[1]}"
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == "no-cache"
+    again = client.get(url, headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+    assert again.headers["etag"] == first.headers["etag"]
+
+
+def test_new_sanitizer_version_changes_etag(client, archive, monkeypatch):
+    url = f"/article/routes.zim/{archive[1]}"
+    etag = client.get(url).headers["etag"]
+    monkeypatch.setattr(zim_routes, "SANITIZER_VERSION", zim_routes.SANITIZER_VERSION + 1)
+    # Pages cleaned by older rules are neither revalidated nor served from cache
+    monkeypatch.setattr(zim_routes, "sanitize_html", lambda content, zim_id, path: "new")
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.text == "new"
+
+
+def test_missing_article_is_404_before_revalidation(client):
+    response = client.get("/article/routes.zim/No_Such_Page", headers={"If-None-Match": "*"})
+    assert response.status_code == 404
+
+
+STYLE = "body{font-family:serif}" * 200
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=0-9", 0, 9),
+    ("bytes=100-", 100, len(STYLE) - 1),
+    ("bytes=-10", len(STYLE) - 10, len(STYLE) - 1),
+    # A suffix longer than the body is the whole body
+    (f"bytes=-{len(STYLE) + 5}", 0, len(STYLE) - 1),
+    ("bytes=4590-999999", 4590, len(STYLE) - 1),
+])
+def test_resource_serves_single_ranges(client, header, start, end):
+    response = client.get("/resource/routes.zim/-/style.css", headers={"Range": header})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(STYLE)}"
+    assert response.headers["content-length"] == str(end - start + 1)
+    assert response.text == STYLE[start:end + 1]
+
+
+@pytest.mark.parametrize("header", ["bytes=0-1,5-6", "items=0-5", "bytes=x-y"])
+def test_resource_ignores_ranges_it_does_not_serve(client, header):
+    response = client.get("/resource/routes.zim/-/style.css", headers={"Range": header})
+    assert response.status_code == 200
+    assert response.text == STYLE
+
+
+@pytest.mark.parametrize("header", [f"bytes={len(STYLE)}-", "bytes=-0", "bytes=20-10"])
+def test_unsatisfiable_range_is_416(client, header):
+    response = client.get("/resource/routes.zim/-/style.css", headers={"Range": header})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(STYLE)}"
+
+
+def test_if_range_sends_the_range_only_for_the_current_etag(client):
+    url = "/resource/routes.zim/-/style.css"
+    etag = client.get(url).headers["etag"]
+    current = client.get(url, headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert current.status_code == 206
+    assert current.text == STYLE[:10]
+    for stale in ('"other"', "Wed, 21 Oct 2015 07:28:00 GMT"):
+        response = client.get(url, headers={"Range": "bytes=0-9", "If-Range": stale})
+        assert response.status_code == 200
+        assert response.text == STYLE
@@ -6,7 +6,7 @@ import ZimBrowserTabs from './components/ZimBrowserTabs.jsx';
 export default function App() {
   const tabsRef = useRef(null);
   const [page, setPage] = useState('home');
-  const [searchData, setSearchData] = useState({ query: '', results: [], answer: '' });
+  const [searchData, setSearchData] = useState({ query: '', results: [], answer: '', cursor: null });
 
   const openTab = (zimId, path, title) => {
     if (tabsRef.current && tabsRef.current.openTab) {
@@ -14,8 +14,8 @@ export default function App() {
     }
   };
 
-  const handleSearch = (query, results, answer) => {
-    setSearchData({ query, results, answer });
+  const handleSearch = (query, results, answer, cursor) => {
+    setSearchData({ query, results, answer, cursor });
     setPage('results');
   };
 
@@ -29,6 +29,7 @@ export default function App() {
           initialQuery={searchData.query}
           initialResults={searchData.results}
           initialAnswer={searchData.answer}
+          initialCursor={searchData.cursor}
           onHome={goHome}
           onOpenArticle={openTab}
         />
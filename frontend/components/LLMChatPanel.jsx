@@ -1,32 +1,88 @@
-import React, { useState, useEffect } from 'react';
-import { apiFetch } from '../api';
+import React, { useState, useEffect, useRef } from 'react';
+import { apiFetch, API_BASE } from '../api';
+
+// Read a server-sent event stream from a fetch response, calling onEvent
+// with (event, data) for every complete event.
+async function readEvents(res, onEvent) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let end;
+    while ((end = buffer.indexOf('\n\n')) >= 0) {
+      const block = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      onEvent(event, data);
+    }
+  }
+}
 
 export default function LLMChatPanel() {
   const [chat, setChat] = useState([]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
   const [llmEnabled, setLlmEnabled] = useState(false);
+  const controllerRef = useRef(null);
 
   useEffect(() => {
     apiFetch('/admin/config')
       .then(res => res.json())
       .then(cfg => setLlmEnabled(cfg.llm_enabled));
+    // Cancel a running answer when the panel goes away
+    return () => controllerRef.current && controllerRef.current.abort();
   }, []);
 
+  const appendAnswer = (text) => {
+    setChat(prev => {
+      const last = prev[prev.length - 1];
+      return [...prev.slice(0, -1), { ...last, ai: last.ai + text }];
+    });
+  };
+
+  const setSources = (sources) => {
+    setChat(prev => {
+      const last = prev[prev.length - 1];
+      return [...prev.slice(0, -1), { ...last, sources }];
+    });
+  };
+
   const sendMessage = async () => {
-    if (!llmEnabled) return;
+    if (!llmEnabled || loading || !input.trim()) return;
+    const controller = new AbortController();
+    controllerRef.current = controller;
     setLoading(true);
-    const res = await apiFetch('/llm/query', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ query: input })
-    });
-    const data = await res.json();
-    setChat([...chat, { user: input, ai: data.answer || 'No response' }]);
+    setChat(prev => [...prev, { user: input, ai: '' }]);
     setInput('');
+    try {
+      const res = await apiFetch('/llm/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ query: input }),
+        signal: controller.signal
+      });
+      if (!res.ok) throw new Error(res.statusText);
+      await readEvents(res, (event, data) => {
+        if (event === 'message') appendAnswer(JSON.parse(data).token);
+        else if (event === 'sources') setSources(JSON.parse(data));
+        else if (event === 'error') appendAnswer(`\nLLM query failed: ${JSON.parse(data)}`);
+      });
+    } catch (e) {
+      if (e.name !== 'AbortError') appendAnswer(`\nLLM query failed: ${e.message}`);
+    }
     setLoading(false);
   };
 
+  const stop = () => controllerRef.current && controllerRef.current.abort();
+
   if (!llmEnabled) return null;
 
   return (
@@ -41,14 +97,25 @@ export default function LLMChatPanel() {
           placeholder="Ask something..."
         />
       </div>
-      <button onClick={sendMessage} disabled={loading} className="px-4 py-2 bg-indigo-600 text-white rounded">
-        {loading ? 'Thinking...' : 'Ask'}
+      <button onClick={loading ? stop : sendMessage} className="px-4 py-2 bg-indigo-600 text-white rounded">
+        {loading ? 'Stop' : 'Ask'}
       </button>
       <div className="mt-4 space-y-4">
         {chat.map((msg, i) => (
           <div key={i} className="border rounded p-2 bg-gray-50">
             <div><strong>You:</strong> {msg.user}</div>
-            <div><strong>AI:</strong> {msg.ai}</div>
+            <div className="whitespace-pre-wrap"><strong>AI:</strong> {msg.ai || (loading && i === chat.length - 1 ? 'Thinking...' : 'No response')}</div>
+            {msg.sources && msg.sources.length > 0 && (
+              <ol className="mt-2 text-sm list-decimal list-inside">
+                {msg.sources.map(src => (
+                  <li key={src.url}>
+                    <a href={`${API_BASE}${src.url}`} target="_blank" rel="noreferrer" className="text-indigo-600 underline">
+                      {src.title}
+                    </a>
+                  </li>
+                ))}
+              </ol>
+            )}
           </div>
         ))}
       </div>
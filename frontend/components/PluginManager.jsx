@@ -1,5 +1,11 @@
-import React, { useEffect, useState } from 'react';
-import { apiFetch } from '../api';
+import React, { useEffect, useRef, useState } from 'react';
+import { apiFetch, API_BASE } from '../api';
+
+// Log lines kept in the live view
+const LOG_LINES = 500;
+// Bytes of a ZIM file sent per resumable upload request
+const UPLOAD_SLICE = 64 * 1024 * 1024;
+const LOG_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR'];
 
 export default function PluginManager() {
   const [zimDir, setZimDir] = useState('');
@@ -18,8 +24,10 @@ export default function PluginManager() {
   const [newUserName, setNewUserName] = useState('');
   const [newUserPass, setNewUserPass] = useState('');
   const [message, setMessage] = useState('');
-  const [logs, setLogs] = useState('');
+  const [logs, setLogs] = useState(null);
+  const [logLevel, setLogLevel] = useState('INFO');
   const [argosProgress, setArgosProgress] = useState(null);
+  const [uploadProgress, setUploadProgress] = useState(null);
 
   useEffect(() => {
     apiFetch('/admin/config')
@@ -42,6 +50,21 @@ export default function PluginManager() {
       .then(r => r.json())
       .then(d => setZims(d.zims || []));
   }, []);
+
+  const logStream = useRef(null);
+  const logView = useRef(null);
+
+  const stopLogs = () => {
+    if (logStream.current) logStream.current.close();
+    logStream.current = null;
+  };
+
+  // Close the live log stream when the panel goes away
+  useEffect(() => stopLogs, []);
+
+  useEffect(() => {
+    if (logView.current) logView.current.scrollTop = logView.current.scrollHeight;
+  }, [logs]);
 
   const saveConfig = async () => {
     const move = (zimDir !== origZimDir) || (iconDir !== origIconDir);
@@ -118,10 +141,70 @@ export default function PluginManager() {
     }, 1000);
   };
 
-  const loadLogs = async () => {
-    const res = await apiFetch('/admin/logs', { credentials: 'include' });
+  // Archives can be tens of gigabytes, so they are sent in slices that the
+  // server appends as they arrive. A previous attempt resumes at the offset
+  // the server already stored.
+  const uploadZim = async (file) => {
+    const url = `/admin/upload-zim/${encodeURIComponent(file.name)}`;
+    const status = await apiFetch(url, { credentials: 'include' });
+    const stored = await status.json();
+    if (!status.ok) throw new Error(stored.detail);
+    // A longer part file is left over from another file of the same name
+    let offset = stored.offset <= file.size ? stored.offset : 0;
+    setUploadProgress(Math.floor((offset * 100) / (file.size || 1)));
+    while (offset < file.size) {
+      const end = Math.min(offset + UPLOAD_SLICE, file.size);
+      const res = await apiFetch(`${url}?offset=${offset}&total=${file.size}`, {
+        method: 'PUT',
+        credentials: 'include',
+        body: file.slice(offset, end)
+      });
+      const data = await res.json();
+      if (res.status === 409) {
+        offset = data.detail.offset;
+      } else if (!res.ok) {
+        throw new Error(data.detail);
+      } else {
+        offset = data.offset;
+      }
+      setUploadProgress(Math.floor((offset * 100) / file.size));
+    }
+    const res = await apiFetch(`${url}/complete`, { method: 'POST', credentials: 'include' });
     const data = await res.json();
-    setLogs(data.logs || '');
+    if (!res.ok) throw new Error(data.detail);
+    return data;
+  };
+
+  // The server sends the last lines first, then new lines as they are logged
+  const openLogs = (level) => {
+    stopLogs();
+    const params = new URLSearchParams({ level, lines: LOG_LINES });
+    const es = new EventSource(`${API_BASE}/admin/logs/stream?${params}`, { withCredentials: true });
+    logStream.current = es;
+    // A reconnect starts over with the last lines
+    es.onopen = () => setLogs([]);
+    es.onmessage = (e) => {
+      const lines = JSON.parse(e.data);
+      setLogs(prev => [...(prev || []), ...lines].slice(-LOG_LINES));
+    };
+    es.onerror = () => {
+      // Refused streams are not retried by the browser
+      if (es.readyState === EventSource.CLOSED) stopLogs();
+    };
+  };
+
+  const toggleLogs = () => {
+    if (logStream.current) {
+      stopLogs();
+      setLogs(null);
+    } else {
+      openLogs(logLevel);
+    }
+  };
+
+  const changeLogLevel = (level) => {
+    setLogLevel(level);
+    if (logStream.current) openLogs(level);
   };
 
   const addUser = async () => {
@@ -201,22 +284,30 @@ export default function PluginManager() {
         ))}
         <input type="file" id="zim-upload" accept=".zim" className="hidden" onChange={e => {
           const file = e.target.files?.[0];
+          e.target.value = '';
           if (!file) return;
-          const form = new FormData();
-          form.append('file', file);
-          apiFetch('/admin/upload-zim', { method: 'POST', credentials: 'include', body: form })
-            .then(r => r.json())
+          uploadZim(file)
             .then(d => {
               setMessage(d.message);
               fetch('/zim/list').then(r => r.json()).then(v => {
                 setZims(v.zims || []);
                 window.dispatchEvent(new Event('zim-updated'));
               });
-            });
+            })
+            .catch(err => setMessage(err.message))
+            .finally(() => setUploadProgress(null));
         }} />
         <button onClick={() => document.getElementById('zim-upload').click()} className="mt-2 px-4 py-1 bg-blue-500 text-white rounded">
           Add ZIM File
         </button>
+        {uploadProgress !== null && (
+          <div className="w-full bg-gray-200 rounded h-2 mt-2">
+            <div
+              className="bg-blue-500 h-2 rounded"
+              style={{ width: `${uploadProgress}%` }}
+            ></div>
+          </div>
+        )}
       </div>
       <div className="mb-4">
         <label className="inline-flex items-center gap-2">
@@ -318,15 +409,25 @@ export default function PluginManager() {
           </div>
         )}
         <button
-          onClick={loadLogs}
+          onClick={toggleLogs}
           className="px-4 py-2 bg-gray-600 text-white rounded"
         >
-          Refresh Logs
+          {logs ? 'Hide Logs' : 'Show Logs'}
         </button>
+        <select
+          className="p-2 border rounded dark:bg-gray-800 dark:text-white"
+          value={logLevel}
+          onChange={e => changeLogLevel(e.target.value)}
+        >
+          {LOG_LEVELS.map(level => <option key={level} value={level}>{level}</option>)}
+        </select>
       </div>
       {logs && (
-        <pre className="mt-4 p-2 bg-gray-100 dark:bg-gray-900 text-xs overflow-auto h-60 whitespace-pre-wrap">
-          {logs}
+        <pre
+          ref={logView}
+          className="mt-4 p-2 bg-gray-100 dark:bg-gray-900 text-xs overflow-auto h-60 whitespace-pre-wrap"
+        >
+          {logs.join('\n')}
         </pre>
       )}
       {message && <div className="mt-2 text-green-600">{message}</div>}
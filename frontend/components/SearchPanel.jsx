@@ -1,9 +1,12 @@
 import React, { useState, useEffect } from 'react';
 import { apiFetch } from '../api';
 
+export const PAGE_SIZE = 50;
+
 export default function SearchPanel({ onSearch, incremental }) {
   const [query, setQuery] = useState('');
   const [llmEnabled, setLlmEnabled] = useState(false);
+  const [suggestions, setSuggestions] = useState([]);
 
   useEffect(() => {
     apiFetch('/admin/config')
@@ -11,6 +14,19 @@ export default function SearchPanel({ onSearch, incremental }) {
       .then(cfg => setLlmEnabled(cfg.llm_enabled));
   }, []);
 
+  useEffect(() => {
+    if (!query.trim()) {
+      setSuggestions([]);
+      return;
+    }
+    const controller = new AbortController();
+    apiFetch(`/search/suggest?q=${encodeURIComponent(query)}`, { signal: controller.signal })
+      .then(res => res.json())
+      .then(data => setSuggestions(data.suggestions || []))
+      .catch(() => {});
+    return () => controller.abort();
+  }, [query]);
+
   const runSearch = async () => {
     let answer = '';
     if (llmEnabled) {
@@ -24,23 +40,31 @@ export default function SearchPanel({ onSearch, incremental }) {
     }
 
     if (incremental) {
-      if (onSearch) onSearch(query, [], answer);
-      const es = new EventSource(`/search/stream?q=${encodeURIComponent(query)}`);
+      if (onSearch) onSearch(query, [], answer, null);
+      const es = new EventSource(
+        `/search/stream?q=${encodeURIComponent(query)}&limit=${PAGE_SIZE}`
+      );
       let results = [];
       es.onmessage = (e) => {
-        if (e.data === 'done') return;
-        const item = JSON.parse(e.data);
-        results.push(item);
-        if (onSearch) onSearch(query, [...results], answer);
+        // Hits arrive as archives answer; keep the best page in the
+        // server's merge order, which breaks score ties by archive and rank
+        results = [...results, JSON.parse(e.data)]
+          .sort((a, b) => a.score - b.score || a.shard - b.shard || a.rank - b.rank)
+          .slice(0, PAGE_SIZE);
+        if (onSearch) onSearch(query, results, answer, null);
       };
-      es.addEventListener('end', () => es.close());
+      es.addEventListener('end', (e) => {
+        es.close();
+        const { cursor } = JSON.parse(e.data);
+        if (onSearch) onSearch(query, results, answer, cursor);
+      });
       es.onerror = () => es.close();
       return;
     }
 
-    const res = await apiFetch(`/search?q=${encodeURIComponent(query)}`);
+    const res = await apiFetch(`/search?q=${encodeURIComponent(query)}&limit=${PAGE_SIZE}`);
     const data = await res.json();
-    if (onSearch) onSearch(query, data.results || [], answer);
+    if (onSearch) onSearch(query, data.results || [], answer, data.cursor);
   };
 
   return (
@@ -52,7 +76,13 @@ export default function SearchPanel({ onSearch, incremental }) {
           value={query}
           onChange={e => setQuery(e.target.value)}
           onKeyDown={e => e.key === 'Enter' && runSearch()}
+          list="search-suggestions"
         />
+        <datalist id="search-suggestions">
+          {suggestions.map(s => (
+            <option key={`${s.zim_id}:${s.path}`} value={s.title} />
+          ))}
+        </datalist>
         <button onClick={runSearch} className="px-4 py-2 bg-blue-600 text-white rounded">
           Search
         </button>
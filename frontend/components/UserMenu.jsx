@@ -16,14 +16,31 @@ export default function UserMenu() {
   const [showPass, setShowPass] = useState(false);
   const [error, setError] = useState('');
 
-  const exportPdf = () => {
+  // Queue the export, poll the job and download the file once rendered
+  const exportPdf = async () => {
     const tab = window.activeZimTab;
-    if (tab) {
-      window.open(`${API_BASE}/article/${tab.zimId}/${tab.path}/pdf`, '_blank');
-      setOpen(false);
-    } else {
+    if (!tab) {
       alert('No page selected');
+      return;
+    }
+    setOpen(false);
+    const res = await apiFetch(`/article/${tab.zimId}/${tab.path}/pdf`, { method: 'POST' });
+    if (!res.ok) {
+      alert('PDF export is busy, try again later');
+      return;
+    }
+    let job = await res.json();
+    while (job.status === 'queued' || job.status === 'rendering') {
+      await new Promise(resolve => setTimeout(resolve, 1000));
+      job = await (await apiFetch(`/pdf/jobs/${job.job}`)).json();
+    }
+    if (job.status !== 'done') {
+      alert(`PDF export failed: ${job.error || 'unknown error'}`);
+      return;
     }
+    const link = document.createElement('a');
+    link.href = `${API_BASE}/pdf/jobs/${job.job}/file`;
+    link.click();
   };
 
   const fetchStatus = async () => {
@@ -1,4 +1,4 @@
-import React, { useState, forwardRef, useImperativeHandle } from 'react';
+import React, { useState, useRef, useEffect, forwardRef, useImperativeHandle } from 'react';
 import { apiFetch, API_BASE } from '../api';
 
 const ZimBrowserTabs = forwardRef((props, ref) => {
@@ -8,6 +8,18 @@ const ZimBrowserTabs = forwardRef((props, ref) => {
   const [models, setModels] = useState([]);
   const [toLang, setToLang] = useState('');
   const [targetTab, setTargetTab] = useState(null);
+  // iframes and running translation streams by tab id
+  const frames = useRef({});
+  const streams = useRef({});
+
+  const stopStream = (id) => {
+    if (streams.current[id]) {
+      streams.current[id].close();
+      delete streams.current[id];
+    }
+  };
+
+  useEffect(() => () => Object.keys(streams.current).forEach(stopStream), []);
 
   const openTab = (zimId, path, title) => {
     const id = `${zimId}:${path}`;
@@ -26,6 +38,7 @@ const ZimBrowserTabs = forwardRef((props, ref) => {
   useImperativeHandle(ref, () => ({ openTab }));
 
   const closeTab = (id) => {
+    stopStream(id);
     setTabs(tabs.filter(t => t.id !== id));
     if (active === id && tabs.length > 1) {
       const next = tabs.find(t => t.id !== id);
@@ -46,18 +59,40 @@ const ZimBrowserTabs = forwardRef((props, ref) => {
     setShowTranslate(true);
   };
 
-  const runTranslate = async () => {
+  // Translated blocks are written into a blank iframe as they arrive so
+  // the reader can start before the whole page is done.
+  const runTranslate = () => {
     if (!targetTab || !toLang) return;
-    const res = await apiFetch('/translate/article', {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ zim_id: targetTab.zimId, path: targetTab.path, to_lang: toLang })
-    });
-    const data = await res.json();
-    if (data.translated) {
-      setTabs(tabs.map(t => t.id === targetTab.id ? { ...t, translated: data.translated } : t));
-    }
+    const tab = targetTab;
+    stopStream(tab.id);
+    setTabs(tabs.map(t => t.id === tab.id ? { ...t, live: true } : t));
     setShowTranslate(false);
+
+    const params = new URLSearchParams({ zim_id: tab.zimId, path: tab.path, to_lang: toLang });
+    const es = new EventSource(`${API_BASE}/translate/article/stream?${params}`);
+    streams.current[tab.id] = es;
+    let doc = null;
+    const finish = () => {
+      stopStream(tab.id);
+      if (doc) doc.close();
+    };
+    es.addEventListener('meta', () => {
+      const frame = frames.current[tab.id];
+      if (!frame) return;
+      doc = frame.contentDocument;
+      doc.open();
+      doc.write(`<base href="${API_BASE}/article/${tab.zimId}/${tab.path}">`);
+    });
+    es.onmessage = (e) => {
+      if (doc) doc.write(JSON.parse(e.data).html);
+    };
+    es.addEventListener('error', (e) => {
+      finish();
+      if (e.data) alert(JSON.parse(e.data));
+      // Fall back to the original page if nothing was translated
+      if (!doc) setTabs(prev => prev.map(t => t.id === tab.id ? { ...t, live: false } : t));
+    });
+    es.addEventListener('end', finish);
   };
 
   return (
@@ -86,8 +121,9 @@ const ZimBrowserTabs = forwardRef((props, ref) => {
         <div key={tab.id} className={tab.id === active ? "p-4" : "hidden"}>
           <iframe
             title={tab.title}
-            src={tab.translated ? undefined : `${API_BASE}/article/${tab.zimId}/${tab.path}`}
-            srcDoc={tab.translated ? `<html><body>${tab.translated}</body></html>` : undefined}
+            key={tab.live ? `${tab.id}:live` : tab.id}
+            ref={el => { frames.current[tab.id] = el; }}
+            src={tab.live ? undefined : `${API_BASE}/article/${tab.zimId}/${tab.path}`}
             className="w-full h-[80vh] border"
           />
         </div>
@@ -1,16 +1,35 @@
 import React, { useState } from 'react';
 import SearchPanel from '../components/SearchPanel';
 import Header from '../components/Header';
+import { apiFetch } from '../api';
 
-export default function SearchResults({ initialQuery, initialResults, initialAnswer, onHome, onOpenArticle }) {
+export default function SearchResults({ initialQuery, initialResults, initialAnswer, initialCursor, onHome, onOpenArticle }) {
   const [query, setQuery] = useState(initialQuery || '');
   const [results, setResults] = useState(initialResults || []);
   const [answer, setAnswer] = useState(initialAnswer || '');
+  const [cursor, setCursor] = useState(initialCursor || null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
-  const handleSearch = (q, res, ans) => {
+  const handleSearch = (q, res, ans, next) => {
     setQuery(q);
     setResults(res);
     setAnswer(ans);
+    setCursor(next || null);
+  };
+
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const res = await apiFetch(`/search?cursor=${encodeURIComponent(cursor)}`);
+      const data = res.ok ? await res.json() : { results: [], cursor: null };
+      setResults(prev => {
+        const seen = new Set(prev.map(r => `${r.zim_id}:${r.path}`));
+        return [...prev, ...data.results.filter(r => !seen.has(`${r.zim_id}:${r.path}`))];
+      });
+      setCursor(data.cursor);
+    } finally {
+      setLoadingMore(false);
+    }
   };
 
   return (
@@ -38,9 +57,24 @@ export default function SearchResults({ initialQuery, initialResults, initialAns
             >
               {r.title}
             </a>
+            {r.snippet && (
+              <p
+                className="text-sm text-gray-600 dark:text-gray-300"
+                dangerouslySetInnerHTML={{ __html: r.snippet }}
+              />
+            )}
           </li>
         ))}
       </ul>
+      {cursor && (
+        <button
+          onClick={loadMore}
+          disabled={loadingMore}
+          className="px-4 py-2 bg-blue-600 text-white rounded disabled:opacity-50"
+        >
+          {loadingMore ? 'Loading...' : 'Load more'}
+        </button>
+      )}
     </div>
   );
 }